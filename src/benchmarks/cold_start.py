@@ -0,0 +1,136 @@
+"""
+Холодный старт: сколько стоит импорт пакета, открытие базы и первый запрос в свежем процессе.
+
+Запуск из src/:
+    python -m benchmarks.cold_start                 # база из синтетического корпуса, HashEmbedder
+    python -m benchmarks.cold_start --data data --model --runs 5
+Каждый прогон идёт в отдельном интерпретаторе; в отчёт попадают медианы по прогонам,
+пиковый RSS и список тяжёлых модулей, которые оказались загружены после каждой стадии.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "faiss", "fitz", "docx", "easyocr", "pymorphy2")
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def _child(data_path: str, model: bool, dim: int, query: str) -> Dict:
+    """Одна попытка холодного старта; выполняется в свежем процессе."""
+    stages, modules = {}, {}
+    start = time.perf_counter()
+    from data_manager.data_manager import DatabaseManager
+    stages["import"] = time.perf_counter() - start
+    modules["import"] = _loaded()
+
+    start = time.perf_counter()
+    if model:
+        db = DatabaseManager(data_path=data_path)
+    else:
+        from embedding.hash_embedder import HashEmbedder
+        db = DatabaseManager(data_path=data_path, embedder=HashEmbedder(dim=dim))
+    documents = len(db.manifest)
+    stages["open_database"] = time.perf_counter() - start
+    modules["open_database"] = _loaded()
+
+    start = time.perf_counter()
+    chunks = len(db.retriever.collector)
+    stages["load_index"] = time.perf_counter() - start
+    modules["load_index"] = _loaded()
+
+    start = time.perf_counter()
+    db.query(query, top_k=5)
+    stages["first_query"] = time.perf_counter() - start
+    modules["first_query"] = _loaded()
+
+    from benchmarks.common import peak_rss_mb
+    return {"stages": stages, "modules": modules, "documents": documents, "chunks": chunks, "peak_rss_mb": peak_rss_mb()}
+
+
+def build_database(data_path: str, docs: int = 50, dim: int = 384) -> None:
+    """Синтетическая база для замеров (HashEmbedder, без сети)."""
+    from benchmarks.common import synthetic_corpus
+    from data_manager.data_manager import DatabaseManager
+    from embedding.hash_embedder import HashEmbedder
+
+    corpus = os.path.join(data_path, "corpus")
+    synthetic_corpus(corpus, docs=docs, words_per_doc=1000)
+    DatabaseManager(data_path=data_path, embedder=HashEmbedder(dim=dim)).ingest_folder(corpus)
+
+
+def measure(data_path: Optional[str] = None, model: bool = False, runs: int = 3, dim: int = 384, docs: int = 50, query: str = "тестовый запрос") -> Dict:
+    tmp = None
+    if data_path is None:
+        tmp = tempfile.TemporaryDirectory()
+        data_path = tmp.name
+        build_database(data_path, docs=docs, dim=dim)
+
+    args = [sys.executable, "-m", "benchmarks.cold_start", "--child", "--data", data_path, "--dim", str(dim), "--query", query]
+    if model:
+        args.append("--model")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(args, cwd=SRC_DIR, check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    if tmp is not None:
+        tmp.cleanup()
+
+    last = samples[-1]
+    return {
+        "stages": {
+            name: {"seconds": float(np.median([s["stages"][name] for s in samples])), "items": runs, "throughput": 0.0}
+            for name in last["stages"]
+        },
+        "total_seconds": float(np.median([sum(s["stages"].values()) for s in samples])),
+        "modules_after": last["modules"],
+        "documents": last["documents"],
+        "chunks": last["chunks"],
+        "peak_rss_mb": max(s["peak_rss_mb"] or 0.0 for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер холодного старта Text2Sci")
+    parser.add_argument("--data", default=None, help="папка базы (по умолчанию — синтетическая во временной папке)")
+    parser.add_argument("--model", action="store_true", help="настоящая модель из реестра вместо HashEmbedder")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384, help="размерность HashEmbedder")
+    parser.add_argument("--query", default="тестовый запрос")
+    parser.add_argument("--json", default=None, help="куда сохранить отчёт")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import contextlib
+        import io
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = _child(args.data, args.model, args.dim, args.query)
+        print(json.dumps(report))
+        return
+
+    from benchmarks.common import print_report
+
+    report = measure(args.data, model=args.model, runs=args.runs, dim=args.dim, docs=args.docs, query=args.query)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Общие помощники бенчмарков: таймеры, перцентили, пиковая память, синтетический корпус."""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_SYLLABLES = [
+    "ка", "ло", "ми", "ре", "ст", "ва", "но", "ти", "за", "пр", "ен", "ос", "ур", "да", "ко",
+    "ли", "ма", "не", "ро", "су", "те", "ча", "ше", "бы", "гу", "ди", "жа", "зо", "хи", "цу",
+]
+
+
+class StageTimer:
+    """Копит время и число обработанных элементов по стадиям."""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "items": 0})
+        entry["seconds"] += elapsed
+        entry["items"] += items
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {**entry, "throughput": entry["items"] / entry["seconds"] if entry["seconds"] else 0.0}
+            for name, entry in self.stages.items()
+        }
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"p50_ms": 0.0, "p99_ms": 0.0}
+    return {"p50_ms": float(np.percentile(samples_ms, 50)), "p99_ms": float(np.percentile(samples_ms, 99))}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса в МБ (None, если платформа не даёт его узнать)."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def synthetic_words(vocab_size: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    words = set()
+    while len(words) < vocab_size:
+        words.add("".join(rng.choice(_SYLLABLES, size=rng.integers(2, 5))))
+    return sorted(words)
+
+
+def synthetic_corpus(folder: str, docs: int = 100, words_per_doc: int = 2000, vocab_size: int = 5000, seed: int = 0) -> List[str]:
+    """
+    Пишет docs .txt-файлов из псевдослов (частоты по Ципфу, предложения по 5-20 слов).
+    Возвращает пути к файлам.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vocab = np.array(synthetic_words(vocab_size, seed))
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+
+    paths = []
+    for d in range(docs):
+        words = vocab[rng.choice(vocab_size, size=words_per_doc, p=weights)]
+        sentences, pos = [], 0
+        while pos < len(words):
+            length = int(rng.integers(5, 21))
+            sentence = " ".join(words[pos:pos + length])
+            sentences.append(sentence[0].upper() + sentence[1:] + ".")
+            pos += length
+        path = os.path.join(folder, f"doc_{d:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+        paths.append(path)
+    return paths
+
+
+def print_report(report: Dict):
+    print("\n=== Стадии ===")
+    for name, entry in report["stages"].items():
+        print(f"{name:<14} {entry['seconds']:>9.3f} с  {entry['items']:>9} шт.  {entry['throughput']:>12.1f} шт./с")
+    for key, value in report.items():
+        if key != "stages":
+            print(f"{key:<14} {value}")
@@ -0,0 +1,133 @@
+"""
+Микробенчмарк предобработки: очистка, разбиение на предложения, лемматизация.
+
+Запуск из src/:
+    python -m benchmarks.preprocess_bench --docs 50 --words-per-doc 4000
+    python -m benchmarks.preprocess_bench --repeat 5 --json out.json
+Каждая стадия меряется в двух вариантах: legacy_* — прежняя реализация (несколько re.sub
+с разбором шаблона при каждом вызове, parse по каждому слову чанка), без префикса — текущая.
+Лемматизация меряется на холодном кеше лемм (первая загрузка базы) и на тёплом (*_warm).
+"""
+
+import argparse
+import json
+import re
+import tempfile
+from typing import Dict, List
+
+from benchmarks.common import StageTimer, peak_rss_mb, print_report, synthetic_corpus
+from preprocess.chunker import TextPreprocessor
+from preprocess.lemma_cache import LemmaCache
+
+
+# ------------------ Прежняя реализация (для сравнения) ------------------
+def legacy_clean_text(text: str, lover: bool = True, links: bool = True, cut: bool = True) -> str:
+    text = text.replace("ё", "е").replace("Ё", "Е")
+    if lover:
+        text = text.lower()
+    if links:
+        text = re.sub(r"http\S+|www\S+", "", text)
+    text = re.sub(r"\s+", " ", text)
+    if cut:
+        text = re.sub(r"[^a-zа-я0-9.,!?;:\-()\s]", "", text)
+    return text.strip()
+
+
+def legacy_split_sentences(text: str) -> List[str]:
+    text = re.sub(r"(?<=\d)\.(?=\d)", "<DOT>", text)
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+    return [s.replace("<DOT>", ".").strip() for s in sentences if s.strip()]
+
+
+def legacy_lemmatize(texts: List[str], morph, cache: LemmaCache) -> List[str]:
+    result = []
+    for text in texts:
+        lemmas = []
+        for token in text.split():
+            lemma = cache.get(token)
+            if lemma is None:
+                parsed = morph.parse(token)
+                lemma = parsed[0].normal_form if parsed else token
+                cache.put(token, lemma)
+            lemmas.append(lemma)
+        result.append(" ".join(lemmas))
+    return result
+
+
+def run_benchmark(docs: int = 50, words_per_doc: int = 4000, chunk_size: int = 300, repeat: int = 3, lemmatize: bool = True, seed: int = 0) -> Dict:
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        texts = []
+        for path in synthetic_corpus(corpus_dir, docs=docs, words_per_doc=words_per_doc, seed=seed):
+            with open(path, "r", encoding="utf-8") as f:
+                # ссылки, ё и спецсимволы, чтобы очистке было что делать
+                texts.append(f.read().replace(". ", ". См. https://example.org/x «Ёж» 3.14 — ", 50))
+
+    pre_raw = TextPreprocessor(use_lemmatization=False, chunk_size=chunk_size, lemma_cache=LemmaCache())
+    documents = [pre_raw.process(text, links=False, lover=False, cut=False) for text in texts]
+
+    for _ in range(repeat):
+        with timer.stage("legacy_clean", len(texts)):
+            legacy = [legacy_clean_text(text) for text in texts]
+        with timer.stage("clean", len(texts)):
+            cleaned = [pre_raw.clean_text(text) for text in texts]
+        with timer.stage("legacy_split", len(texts)):
+            for text in legacy:
+                legacy_split_sentences(text)
+        with timer.stage("split", len(texts)):
+            for text in cleaned:
+                pre_raw.split_sentences(text)
+
+    if lemmatize:
+        chunks = sum(len(chunks) for chunks in documents)
+        for _ in range(repeat):
+            morph = TextPreprocessor(lemma_cache=LemmaCache()).morph
+            cache = LemmaCache()
+            with timer.stage("legacy_lemmas", chunks):
+                for doc_chunks in documents:
+                    legacy_lemmatize([legacy_clean_text(c) for c in doc_chunks], morph, cache)
+            pre_proc = TextPreprocessor(morph=morph, lemma_cache=LemmaCache())
+            with timer.stage("lemmas", chunks):
+                for doc_chunks in documents:
+                    pre_proc.lemmatize_many([pre_proc.clean_text(c) for c in doc_chunks])
+            # тёплый кеш: parse не зовётся, остаются очистка и обращения к кешу
+            with timer.stage("legacy_warm", chunks):
+                for doc_chunks in documents:
+                    legacy_lemmatize([legacy_clean_text(c) for c in doc_chunks], morph, cache)
+            with timer.stage("lemmas_warm", chunks):
+                for doc_chunks in documents:
+                    pre_proc.lemmatize_many([pre_proc.clean_text(c) for c in doc_chunks])
+
+    return {
+        "stages": timer.report(),
+        "docs": len(texts),
+        "chunks": sum(len(chunks) for chunks in documents),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк предобработки текста Text2Sci")
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--words-per-doc", type=int, default=4000)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-lemmatize", action="store_true")
+    parser.add_argument("--json", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        docs=args.docs,
+        words_per_doc=args.words_per_doc,
+        chunk_size=args.chunk_size,
+        repeat=args.repeat,
+        lemmatize=not args.no_lemmatize,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
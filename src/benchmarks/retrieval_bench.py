@@ -0,0 +1,170 @@
+"""
+Бенчмарк всего пути: извлечение -> чанки -> лемматизация -> encode -> добавление в индекс -> поиск -> выдача.
+
+Запуск из src/:
+    python -m benchmarks.retrieval_bench --docs 200 --index hnsw
+    python -m benchmarks.retrieval_bench --docs 1000 --index ivf_pq --nlist 256 --nprobe 16 --json out.json
+По умолчанию используется HashEmbedder, поэтому бенчмарк не требует сети и модели.
+recall@k считается против точного поиска IndexFlatIP по тем же эмбеддингам.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from benchmarks.common import StageTimer, peak_rss_mb, percentiles, print_report, synthetic_corpus
+from embedding.embedder import BACKENDS
+from embedding.hash_embedder import HashEmbedder
+from extract.text_extractor import DocumentExtractor
+from preprocess.chunker import TextPreprocessor
+from retrieval.index_factory import IndexSpec
+from retrieval.retriever import VectorRetriever, Chunk
+
+
+def run_benchmark(
+    docs: int = 100,
+    words_per_doc: int = 2000,
+    queries: int = 200,
+    top_k: int = 10,
+    spec: Optional[IndexSpec] = None,
+    embedder=None,
+    lemmatize: bool = True,
+    embed_batch: int = 256,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    corpus_dir: Optional[str] = None,
+    seed: int = 0,
+) -> Dict:
+    embedder = embedder or HashEmbedder()
+    timer = StageTimer()
+    tmp = None
+    if corpus_dir is None:
+        tmp = tempfile.TemporaryDirectory()
+        corpus_dir = tmp.name
+
+    paths = synthetic_corpus(corpus_dir, docs=docs, words_per_doc=words_per_doc, seed=seed)
+    extractor = DocumentExtractor()
+    pre_raw = TextPreprocessor(use_lemmatization=False)
+    pre_proc = TextPreprocessor(use_lemmatization=lemmatize)
+
+    raw_chunks, chunks = [], []
+    for path in paths:
+        with timer.stage("extract", 1):
+            text = extractor.extract(path)
+        with timer.stage("chunk", 1):
+            doc_chunks = pre_raw.process(text, links=False, lover=False, cut=False)
+        raw_chunks.extend(doc_chunks)
+        chunks.extend(Chunk(text=c, file_path=path) for c in doc_chunks)
+
+    with timer.stage("lemmatize", len(raw_chunks)):
+        processed = [pre_proc.clean_text(c) for c in raw_chunks]
+        if lemmatize:
+            processed = [pre_proc.lemmatize_text(c) for c in processed]
+
+    blocks = []
+    for start in range(0, len(processed), embed_batch):
+        batch = processed[start:start + embed_batch]
+        with timer.stage("encode", len(batch)):
+            blocks.append(embedder.encode(batch))
+    embeddings = np.vstack(blocks).astype("float32")
+
+    retriever = VectorRetriever(dim=embeddings.shape[1], spec=spec)
+    with timer.stage("index_add", len(embeddings)):
+        for start in range(0, len(embeddings), embed_batch):
+            retriever.add_embeddings(embeddings[start:start + embed_batch], chunks[start:start + embed_batch])
+        retriever.train()
+
+    # запросы — случайные предложения из корпуса
+    rng = np.random.default_rng(seed + 1)
+    query_texts = []
+    for row in rng.choice(len(processed), size=min(queries, len(processed)), replace=False):
+        sentences = pre_proc.split_sentences(processed[row])
+        query_texts.append(sentences[int(rng.integers(len(sentences)))])
+    with timer.stage("encode_query", len(query_texts)):
+        query_vectors = embedder.encode(query_texts).astype("float32")
+
+    latencies = []
+    approx = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        results = retriever.search(vector, top_k=top_k, nprobe=nprobe, ef_search=ef_search)
+        latencies.append((time.perf_counter() - start) * 1000)
+        approx.append([r["chunk_id"] for r in results])
+    with timer.stage("search_raw", len(query_vectors)):
+        retriever.index.search(query_vectors, top_k)
+    with timer.stage("search_batch", len(query_vectors)):
+        retriever.search_batch(query_vectors, top_k=top_k, nprobe=nprobe, ef_search=ef_search)
+
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+    _, truth = exact.search(query_vectors, top_k)
+    recall = float(np.mean([len(set(a) & set(t)) / top_k for a, t in zip(approx, truth)]))
+
+    if tmp is not None:
+        tmp.cleanup()
+
+    return {
+        "stages": timer.report(),
+        "index": retriever.spec.factory_string(),
+        "chunks": len(chunks),
+        "queries": len(query_texts),
+        "search_latency": percentiles(latencies),
+        f"recall@{top_k}": recall,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пайплайна Text2Sci на синтетическом корпусе")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--words-per-doc", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index", default="hnsw", choices=IndexSpec.KINDS)
+    parser.add_argument("--factory", default=None, help="строка фабрики FAISS вместо --index")
+    parser.add_argument("--m", type=int, default=32)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--pq-bits", type=int, default=8)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--dim", type=int, default=384, help="размерность HashEmbedder")
+    parser.add_argument("--model", action="store_true", help="настоящая модель из реестра вместо HashEmbedder")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS, help="бэкенд инференса модели (с --model)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--no-lemmatize", action="store_true")
+    parser.add_argument("--json", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+
+    if args.model:
+        from resources.registry import registry
+        embedder = registry.embedder(backend=args.backend, batch_size=args.batch_size, threads=args.threads)
+    else:
+        embedder = HashEmbedder(dim=args.dim)
+    spec = IndexSpec(args.index, m=args.m, nlist=args.nlist, pq_m=args.pq_m, pq_bits=args.pq_bits, factory=args.factory)
+
+    report = run_benchmark(
+        docs=args.docs,
+        words_per_doc=args.words_per_doc,
+        queries=args.queries,
+        top_k=args.top_k,
+        spec=spec,
+        embedder=embedder,
+        lemmatize=not args.no_lemmatize,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,533 @@
 import os
 import shutil
 import pickle
-from typing import List, Dict, Tuple
+from typing import List, Dict, Set, Tuple, Iterable, Iterator, Optional, Union
 import numpy as np
 
 from embedding.embedder import TextEmbedder
-from retrieval.retriever import VectorRetriever, Chunk
+from retrieval.retriever import COLLECTOR_DIR, VectorRetriever, Chunk, default_paths
+from retrieval.index_factory import IndexSpec
+from retrieval.sharded import ShardedRetriever, is_sharded, load_retriever, remove_retriever_files, replace_retriever_files
+from retrieval.lexical import LexicalIndex, lexical_path
+from retrieval.embedding_store import EmbeddingStore
 from extract.text_extractor import DocumentExtractor
+from extract.ocr import PageOCR
 from preprocess.chunker import TextPreprocessor
+from preprocess.token_counter import TokenCounter
+from data_manager.pipeline import ParallelPreparer, Prepared, iter_document, prepare_document
+from data_manager.manifest import DocumentManifest, MANIFEST_FILE, CHANGED, DUPLICATE, UNCHANGED
+from resources.registry import registry
+from resources.metrics import COUNT_BUCKETS, Metrics, metrics
+
+metrics.set_buckets("chunks_per_document", COUNT_BUCKETS)
+
+
+# ------------------ Отчёт о пакетной загрузке ------------------
+class IngestReport:
+    """
+    Результат пакетной загрузки: сколько чанков дал каждый файл, какие файлы упали,
+    какие пропущены как неизменившиеся и какие заменили свою прежнюю версию.
+    """
+
+    def __init__(self):
+        self.added: Dict[str, int] = {}
+        self.failed: Dict[str, str] = {}
+        self.skipped: List[str] = []
+        self.replaced: List[str] = []
+
+    @property
+    def total_chunks(self) -> int:
+        return sum(self.added.values())
+
+    def to_dict(self):
+        return {
+            "added": dict(self.added),
+            "failed": dict(self.failed),
+            "skipped": list(self.skipped),
+            "replaced": list(self.replaced),
+            "total_chunks": self.total_chunks,
+        }
+
+    def __repr__(self):
+        return (
+            f"IngestReport(added={len(self.added)}, replaced={len(self.replaced)}, skipped={len(self.skipped)}, "
+            f"failed={len(self.failed)}, chunks={self.total_chunks})"
+        )
+
 
 class DatabaseManager:
-    def __init__(self, data_path: str = "data", dim: int = 768):
+    """
+    База документов: загрузка, удаление, перестройка индекса и поиск.
+    Нарезка: chunk_size слов на чанк (по умолчанию) или chunk_tokens токенов модели эмбеддингов;
+    chunk_tokens="model" — столько, сколько модель обрабатывает без обрезки (max_seq_length).
+    chunk_overlap — перекрытие соседних чанков в тех же единицах.
+    """
+
+    def __init__(
+        self,
+        data_path: str = "data",
+        dim: int = 768,
+        embedder: Optional[TextEmbedder] = None,
+        index_spec: Optional[IndexSpec] = None,
+        shards: int = 1,
+        ocr_workers: int = 0,
+        chunk_size: int = 300,
+        chunk_tokens: Union[int, str, None] = None,
+        chunk_overlap: int = 0,
+    ):
         self.raw_path = os.path.join(data_path, "articles_raw")
-        self.texts_path = os.path.join(data_path, "articles_texts.pkl")
-        self.index_path = os.path.join(data_path, "articles.index")
+        self.index_path, self.texts_path = default_paths(data_path)
+        self.lexical_path = lexical_path(self.index_path)
+        self.embeddings_path = os.path.join(data_path, "embeddings")
+        self.lemma_cache_path = os.path.join(data_path, "lemma_cache.pkl")
+        self.ocr_cache_path = os.path.join(data_path, "ocr_cache")
+        self.manifest = DocumentManifest(os.path.join(data_path, MANIFEST_FILE))
 
         os.makedirs(self.raw_path, exist_ok=True)
 
-        self.embedder = TextEmbedder()
-        self.retriever = None
-        self.texts: List[Chunk] = []
+        self.embedder = embedder or registry.embedder()
+        self.model_name = getattr(self.embedder, "model_name", type(self.embedder).__name__)
+        self.extractor = DocumentExtractor(ocr=PageOCR(cache_dir=self.ocr_cache_path, workers=ocr_workers))
+        self.chunking = self._chunking(chunk_size, chunk_tokens, chunk_overlap)
+        self.raw_preprocessor = TextPreprocessor(use_lemmatization=False, **self.chunking)
+        self.preprocessor = TextPreprocessor(use_lemmatization=True)
+        self.preprocessor._lemma_cache.load(self.lemma_cache_path)
+        self.index_spec = index_spec
+        self.shards = shards
+        # индекс открывается при первом обращении: манифест и статистика его не требуют
+        self._retriever = None
+        self._lexical: Optional[LexicalIndex] = None
+        self._embeddings: Optional[EmbeddingStore] = None
 
-        test_emb = self.embedder.encode(["тест"])
-        real_dim = test_emb.shape[1]
+    def _chunking(self, chunk_size: int, chunk_tokens: Union[int, str, None], overlap: int) -> Dict:
+        """Параметры TextPreprocessor для нарезки; они же уходят в процессы пула."""
+        chunking = {"chunk_size": chunk_size, "overlap": overlap}
+        if chunk_tokens is None:
+            return chunking
+        counter = TokenCounter.for_embedder(self.embedder)
+        if chunk_tokens == "model":
+            chunk_tokens = counter.max_tokens()
+            if chunk_tokens is None:
+                raise ValueError("Не удалось определить max_seq_length модели: задайте chunk_tokens числом")
+        # эмбеддер кодирует очищенный и лемматизированный текст — по нему и считаем токены
+        chunking.update(max_tokens=int(chunk_tokens), token_counter=counter, count_processed=True)
+        return chunking
 
-        if os.path.exists(self.index_path) and os.path.exists(self.texts_path):
-            self.retriever = VectorRetriever.load(self.index_path, self.texts_path)
-            self.texts = self.retriever.collector
-        else:
-            self.retriever = VectorRetriever(dim=real_dim)
+    @property
+    def retriever(self):
+        if self._retriever is None:
+            if is_sharded(self.index_path) or (os.path.exists(self.index_path) and os.path.exists(self.texts_path)):
+                self._retriever = load_retriever(self.index_path, self.texts_path, spec=self.index_spec)
+            else:
+                # размерность берётся из метаданных модели, без прогона encode
+                dim = self.embedder.get_embedding_dim()
+                if self.shards > 1:
+                    # новая база из нескольких шардов (см. retrieval/sharded.py)
+                    self._retriever = ShardedRetriever(dim=dim, shards=self.shards, spec=self.index_spec)
+                else:
+                    self._retriever = VectorRetriever(dim=dim, spec=self.index_spec)
+            self._retriever.attach_embeddings(self.embeddings)
+        return self._retriever
+
+    @retriever.setter
+    def retriever(self, retriever):
+        self._retriever = retriever
 
+    @property
+    def embeddings(self) -> EmbeddingStore:
+        """Копия всех эмбеддингов на диске (retrieval/embedding_store.py), по строке на чанк."""
+        if self._embeddings is None:
+            self._embeddings = EmbeddingStore(self.embeddings_path, model=self.model_name)
+        return self._embeddings
 
-    def save_file(self, filepath: str) -> str:
+    @property
+    def lexical(self) -> LexicalIndex:
+        """BM25 по леммам чанков (retrieval/lexical.py); у старой базы без него — rebuild_lexical()."""
+        if self._lexical is None:
+            self._lexical = LexicalIndex.load_if_exists(self.lexical_path) or LexicalIndex()
+        return self._lexical
+
+    @property
+    def texts(self):
+        return self.retriever.collector
+
+    def _stored_path(self, filepath: str, content_hash: Optional[str] = None) -> str:
         fname = os.path.basename(filepath)
-        dest_path = os.path.join(self.raw_path, fname)
+        if content_hash:
+            # префикс хеша: одноимённые файлы из разных папок не затирают друг друга
+            fname = f"{content_hash[:16]}_{fname}"
+        return os.path.join(self.raw_path, fname)
+
+    def save_file(self, filepath: str, content_hash: Optional[str] = None) -> str:
+        dest_path = self._stored_path(filepath, content_hash)
         shutil.copy(filepath, dest_path)
         return dest_path
 
+    def _prepare_article(self, filepath: str, content_hash: Optional[str] = None) -> Tuple[List[str], List[Chunk]]:
+        """Копирует, извлекает и чанкует файл. Возвращает тексты для эмбеддера и чанки для коллектора."""
+        file_path = self.save_file(filepath, content_hash)
+        return prepare_document(file_path, self.extractor, self.raw_preprocessor, self.preprocessor)
+
+    def _prepare_serial(self, filepaths: Iterable[str], hashes: Dict[str, str], part_size: int = 256) -> Iterator[Prepared]:
+        """
+        Готовит файлы потоково: большой документ отдаётся частями по part_size чанков,
+        поэтому память не зависит от его размера.
+        """
+        for filepath in filepaths:
+            texts: List[str] = []
+            chunks: List[Chunk] = []
+            try:
+                file_path = self.save_file(filepath, hashes.get(filepath))
+                for processed, chunk in iter_document(file_path, self.extractor, self.raw_preprocessor, self.preprocessor):
+                    texts.append(processed)
+                    chunks.append(chunk)
+                    if len(chunks) >= part_size:
+                        yield filepath, texts, chunks, None, False
+                        texts, chunks = [], []
+            except Exception as e:
+                yield filepath, [], [], e, True
+            else:
+                yield filepath, texts, chunks, None, True
+
+    def _add_prepared(self, processed_chunks: List[str], chunks: List[Chunk]):
+        """Кодирует накопленные чанки одним вызовом encode и добавляет их в индекс одним блоком."""
+        if not chunks:
+            return
+        with metrics.timer("stage_seconds", stage="encode"):
+            embeddings = self.embedder.encode(processed_chunks)
+        start = len(self.retriever.collector)
+        # сначала на диск: фоновая перестройка индекса читает векторы оттуда
+        with metrics.timer("stage_seconds", stage="embedding_store"):
+            self.embeddings.append(start, embeddings)
+        try:
+            with metrics.timer("stage_seconds", stage="index_add"):
+                self.retriever.add_embeddings(embeddings, chunks)
+        except Exception:
+            # индекс не принял векторы: хранилище возвращается к прежнему числу строк,
+            # иначе следующий блок упадёт на "уже записан"
+            self.embeddings.truncate(start)
+            raise
+        # те же лемматизированные тексты — в лексический индекс под теми же номерами
+        with metrics.timer("stage_seconds", stage="lexical_add"):
+            self.lexical.add(start, processed_chunks)
+        metrics.inc("chunks_added_total", len(chunks))
+
+    def _remove_chunks(self, ids: Iterable[int]):
+        ids = list(ids)
+        self.retriever.remove_chunks(ids)
+        self.lexical.remove(ids)
+        metrics.inc("chunks_removed_total", len(ids))
+
     def add_article(self, filepath: str):
-        file_path = self.save_file(filepath)
+        report = self.add_articles([filepath])
+        if filepath in report.failed:
+            raise RuntimeError(f"Не удалось добавить {filepath}: {report.failed[filepath]}")
+
+    def _plan(self, filepaths: Iterable[str], report: IngestReport, hashes: Dict[str, str], force: bool = False) -> Iterator[str]:
+        """Сверяет файлы с манифестом и отдаёт только новые и изменившиеся (при force — и неизменившиеся)."""
+        for filepath in filepaths:
+            try:
+                status, content_hash, _ = self.manifest.check(filepath, self.model_name)
+            except OSError as e:
+                report.failed[filepath] = str(e)
+                continue
+            if force and status == UNCHANGED:
+                status = CHANGED
+            if status in (UNCHANGED, DUPLICATE):
+                report.skipped.append(filepath)
+                continue
+            if status == CHANGED and content_hash in self.manifest.documents and self.manifest.get(filepath).content_hash != content_hash:
+                # новое содержимое уже загружено из другого файла
+                self._forget_document(filepath, keep_path=self.manifest.documents[content_hash].stored_path)
+                self.manifest.paths[os.path.abspath(filepath)] = content_hash
+                report.replaced.append(filepath)
+                continue
+            hashes[filepath] = content_hash
+            yield filepath
+
+    def _forget_document(self, filepath: str, keep_path: Optional[str] = None) -> bool:
+        """Убирает прежнюю версию документа из манифеста, выдачи и articles_raw. True, если она была."""
+        old = self.manifest.forget(filepath)
+        if old is None:
+            return False
+        self._remove_chunks(old.chunk_ids)
+        if old.stored_path != keep_path and os.path.exists(old.stored_path):
+            os.remove(old.stored_path)
+        return True
+
+    def add_articles(self, filepaths: Iterable[str], embed_batch: int = 256, save_every: Optional[int] = None, workers: int = 0, queue_size: int = 8, force: bool = False) -> IngestReport:
+        """
+        Пакетная загрузка файлов.
+        - чанки нескольких документов кодируются одним вызовом encode (не меньше embed_batch штук);
+          без пула большие документы читаются и кодируются потоково, частями по embed_batch чанков
+        - индекс сохраняется один раз в конце или каждые save_every документов
+        - ошибка в одном файле не останавливает загрузку, она попадает в отчёт
+        - при workers > 0 извлечение и лемматизация идут в пуле процессов,
+          а эмбеддер получает готовые документы через очередь на queue_size элементов
+        - файлы сверяются с манифестом: неизменившиеся пропускаются, изменившиеся
+          заменяют свою прежнюю версию; force=True перезагружает и неизменившиеся
+        """
+        try:
+            return self._ingest(filepaths, embed_batch, save_every, workers, queue_size, force)
+        finally:
+            # пул процессов OCR нужен только на время загрузки: иначе его процессы живут до выхода
+            self.extractor.ocr.close()
+
+    def _ingest(self, filepaths: Iterable[str], embed_batch: int, save_every: Optional[int], workers: int, queue_size: int, force: bool) -> IngestReport:
+        report = IngestReport()
+        hashes: Dict[str, str] = {}
+        pending_texts: List[str] = []
+        pending_chunks: List[Chunk] = []
+        # ещё не закодированные чанки по файлам (в порядке поступления)
+        pending_files: Dict[str, int] = {}
+        # большие документы приходят частями: (первый номер чанка, сколько уже в индексе)
+        flushed: Dict[str, Tuple[int, int]] = {}
+        finished: Set[str] = set()
+        # документы, упавшие на середине: их оставшиеся части пропускаются до последней
+        failed: Set[str] = set()
+        added_since_save = 0
 
-        doc_ext = DocumentExtractor()
-        raw_text = doc_ext.extract(file_path)
+        def fail(path: str, error: Exception):
+            report.failed[path] = str(error)
+            finished.discard(path)
+            failed.add(path)
+            if path in pending_files:
+                offset = 0
+                for other, count in pending_files.items():
+                    if other == path:
+                        break
+                    offset += count
+                count = pending_files.pop(path)
+                del pending_texts[offset:offset + count]
+                del pending_chunks[offset:offset + count]
+            if path in flushed:
+                # уже закодированные части документа убираем из выдачи
+                first, total = flushed.pop(path)
+                self._remove_chunks(range(first, first + total))
 
-        pre_raw = TextPreprocessor(use_lemmatization=False)
-        raw_chunks = pre_raw.process(raw_text, links=False, lover=False,cut=False)
+        def complete(path: str):
+            first, total = flushed.pop(path)
+            finished.discard(path)
+            report.added[path] = total
+            metrics.observe("chunks_per_document", total)
+            stored_path = self._stored_path(path, hashes[path])
+            old = self.manifest.get(path)
+            # метки прежней версии документа переходят к новой
+            tags = self.retriever.tags_of(old.chunk_ids) if old is not None else set()
+            if self._forget_document(path, keep_path=stored_path):
+                report.replaced.append(path)
+            self.manifest.record(path, hashes[path], stored_path, range(first, first + total), self.model_name)
+            if tags:
+                self.retriever.tag(range(first, first + total), *tags)
 
-        pre_proc = TextPreprocessor(use_lemmatization=True)
+        def flush():
+            start = len(self.retriever.collector)
+            try:
+                self._add_prepared(pending_texts, pending_chunks)
+            except Exception as e:
+                for path in list(pending_files):
+                    fail(path, e)
+            else:
+                for path, count in pending_files.items():
+                    first, total = flushed.get(path, (start, 0))
+                    flushed[path] = (first, total + count)
+                    start += count
+                for path in [path for path in flushed if path in finished]:
+                    complete(path)
+            pending_texts.clear()
+            pending_chunks.clear()
+            pending_files.clear()
 
-        processed_chunks = [pre_proc.clean_text(chunk) for chunk in raw_chunks]
-        processed_chunks = [pre_proc.lemmatize_text(chunk) for chunk in processed_chunks]
+        # сверка с манифестом меняет манифест, индекс и отчёт — целиком здесь, в главном потоке,
+        # а не в потоке-поставщике пула; дальше уходит готовый список путей
+        planned = list(self._plan(filepaths, report, hashes, force=force))
+        if workers > 0:
+            save_file = lambda path: self.save_file(path, hashes[path])
+            prepared = ParallelPreparer(workers, queue_size, self.lemma_cache_path, self.ocr_cache_path, self.chunking).prepare(planned, save_file)
+        else:
+            prepared = self._prepare_serial(planned, hashes, part_size=embed_batch)
+        # ожидание следующего документа: извлечение, OCR и лемматизация (без пула) или очередь пула
+        prepared = metrics.timed_iter(prepared, "stage_seconds", stage="prepare")
+
+        for filepath, processed_chunks, chunks, error, last in prepared:
+            if filepath in failed:
+                if last:
+                    failed.discard(filepath)
+                continue
+            if error is not None:
+                print(f"[!] Ошибка при добавлении {filepath}: {error}")
+                fail(filepath, error)
+                continue
+
+            pending_texts.extend(processed_chunks)
+            pending_chunks.extend(chunks)
+            pending_files[filepath] = pending_files.get(filepath, 0) + len(chunks)
+            if last:
+                total = flushed.get(filepath, (0, 0))[1] + pending_files[filepath]
+                print(f"[+] Подготовлен файл: {filepath} ({total} чанков)")
+                finished.add(filepath)
+                added_since_save += 1
+
+            if len(pending_chunks) >= embed_batch:
+                flush()
+            if last and save_every and added_since_save >= save_every:
+                flush()
+                self.save_all()
+                added_since_save = 0
+
+        flush()
+        if added_since_save or save_every is None:
+            self.save_all()
+
+        for status in ("added", "failed", "skipped", "replaced"):
+            metrics.inc("documents_total", len(getattr(report, status)), status=status)
+        print(f"[✓] Загрузка завершена: {report}")
+        return report
+
+    def remove_document(self, filepath: str) -> bool:
+        """
+        Удаляет документ из базы: его чанки пропадают из выдачи сразу,
+        векторы вычищаются из индекса при ближайшей перестройке. False, если документа не было.
+        """
+        removed = self._forget_document(filepath)
+        if removed:
+            print(f"[-] Документ удалён: {filepath}")
+        self.save_all()
+        return removed
+
+    def tag_document(self, filepath: str, *tags: str) -> bool:
+        """Ставит метки всем чанкам документа (фильтр {"tags": ...}). False, если документа нет."""
+        record = self.manifest.get(filepath)
+        if record is None:
+            return False
+        self.retriever.tag(record.chunk_ids, *tags)
+        self.save_all()
+        return True
+
+    def untag_document(self, filepath: str, *tags: str) -> bool:
+        record = self.manifest.get(filepath)
+        if record is None:
+            return False
+        self.retriever.untag(record.chunk_ids, *tags)
+        self.save_all()
+        return True
+
+    def resolve_filter(self, filter: Optional[Dict]) -> Optional[Dict]:
+        """Переводит условия documents и added в номера чанков (см. DocumentManifest.resolve_filter)."""
+        return self.manifest.resolve_filter(filter)
+
+    def update_document(self, filepath: str) -> IngestReport:
+        """Перезагружает документ, даже если манифест считает его неизменившимся."""
+        return self.add_articles([filepath], force=True)
 
-        embeddings = self.embedder.encode(processed_chunks)
+    def compact(self):
+        """Перестраивает индекс без удалённых векторов и сохраняет базу."""
+        self.retriever.compact()
+        self.lexical.compact()
+        self.save_all()
 
-        chunks = [Chunk(text=raw_chunk, file_path=file_path) for raw_chunk in raw_chunks]
+    def rebuild_index(self, spec: Optional[IndexSpec] = None, shards: Optional[int] = None, block_size: int = 65536):
+        """
+        Строит индекс заново из сохранённых эмбеддингов, без извлечения и кодирования:
+        другой тип индекса или параметры (spec), другое число шардов (shards).
+        Номера чанков, манифест и лексический индекс не меняются.
+        Без spec индекс строится по тому же IndexSpec, что и сейчас (он сохраняется рядом с индексом).
+        """
+        spec = spec or self.index_spec or self.retriever.spec
+        current = len(self.retriever.shards) if isinstance(self.retriever, ShardedRetriever) else 1
+        if shards is None or shards == current:
+            self.retriever.rebuild(spec, block_size=block_size)
+        else:
+            self._reshard(spec, shards, block_size)
+        self.index_spec = spec
+        self.save_all()
 
-        self.retriever.add_embeddings(embeddings, chunks)
+    def _reshard(self, spec: Optional[IndexSpec], shards: int, block_size: int):
+        """Раскладывает чанки по новому числу шардов; векторы — из хранилища эмбеддингов, блоками."""
+        old = self.retriever
+        old.wait_for_compaction()
+        total = len(old.collector)
+        if not self.embeddings.covers(np.arange(total)):
+            raise ValueError("В хранилище эмбеддингов нет векторов для всех чанков: шарды не перестроить без повторного кодирования")
+        dim = self.embeddings.dim or old.dim
+        new = ShardedRetriever(dim=dim, shards=shards, spec=spec) if shards > 1 else VectorRetriever(dim=dim, spec=spec)
+        new.attach_embeddings(self.embeddings)
+        for rows, vectors in self.embeddings.iter_blocks(np.arange(total), block_size):
+            new.add_embeddings(vectors, [old.collector[int(i)] for i in rows])
+        # метки лежат в хранилищах чанков отдельно от самих чанков — переносим по глобальным номерам
+        for tag, ids in old.collector.tags.items():
+            new.tag(ids, tag)
+        # удалённые чанки сохраняют свои номера, но из нового индекса вычищаются сразу
+        new.remove_chunks(sorted(old.collector.deleted))
+        new.compact()
+        new.wait_for_compaction()
+        # новая раскладка пишется под временными именами и только потом подменяет старую
+        data_path = os.path.dirname(self.index_path)
+        tmp_index, tmp_texts = self.index_path + ".reshard", os.path.join(data_path, COLLECTOR_DIR + ".reshard")
+        remove_retriever_files(tmp_index, tmp_texts)
+        new.save(tmp_index, tmp_texts)
+        replace_retriever_files(tmp_index, tmp_texts, self.index_path, self.texts_path)
+        # чанки старой базы из pickle теперь лежат в папке ChunkStore
+        self.index_path, self.texts_path = default_paths(data_path)
+        self._retriever = load_retriever(self.index_path, self.texts_path, spec=spec)
+        self._retriever.attach_embeddings(self.embeddings)
+        self.shards = shards
+        print(f"[+] База разложена по {shards} шардам")
 
+    def rebuild_lexical(self):
+        """Строит лексический индекс заново по текстам чанков (для баз, созданных до его появления)."""
+        lexical = LexicalIndex()
+        collector = self.retriever.collector
+        lexical.add(0, (self.preprocessor.lemmatize_text(self.preprocessor.clean_text(chunk.text)) for chunk in collector))
+        lexical.remove(collector.deleted)
+        self._lexical = lexical
         self.save_all()
 
+    def ingest_folder(self, folder_path: str, **kwargs) -> IngestReport:
+        """Загружает все файлы из папки (без рекурсии) через add_articles."""
+        filepaths = [
+            os.path.join(folder_path, filename)
+            for filename in sorted(os.listdir(folder_path))
+            if os.path.isfile(os.path.join(folder_path, filename))
+        ]
+        return self.add_articles(filepaths, **kwargs)
+
+    def close(self):
+        """Останавливает пул процессов OCR (если он запускался); база остаётся рабочей."""
+        self.extractor.ocr.close()
+
+    def __enter__(self) -> "DatabaseManager":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
     def save_all(self):
-        """Сохраняет FAISS индекс, тексты и метаданные."""
-        self.retriever.save(self.index_path, self.texts_path)
+        """Сохраняет FAISS индекс, тексты, лексический индекс, метаданные и кеш лемм."""
+        with metrics.timer("stage_seconds", stage="save"):
+            self.retriever.save(self.index_path, self.texts_path)
+            self.lexical.save(self.lexical_path)
+            self.embeddings.flush()
+            self.preprocessor._lemma_cache.save(self.lemma_cache_path)
+            self.manifest.save()
+        self.collect_metrics()
+
+    def collect_metrics(self, metrics: Metrics = metrics):
+        """Размер базы и попадания кеша лемм — текущими значениями (см. resources/metrics.py)."""
+        if not metrics.enabled:
+            return
+        collector = self.retriever.collector
+        metrics.set("chunks", len(collector))
+        metrics.set("deleted_chunks", len(collector.deleted))
+        metrics.set("index_vectors", self.retriever.ntotal)
+        metrics.set("documents", len(self.manifest.documents))
+        metrics.set("cache_hit_rate", self.preprocessor._lemma_cache.hit_rate, cache="lemma")
 
-    def query(self, query_text: str, top_k: int = 5) -> List[Dict]:
-        preprocessor=TextPreprocessor()
-        query_text=preprocessor.process(query_text)
+    def query(self, query_text: str, top_k: int = 5, filter: Optional[Dict] = None) -> List[Dict]:
+        """Поиск по базе; filter — поля чанков (retrieval/metadata.py), documents и added (см. resolve_filter)."""
+        query_text = " ".join(self.preprocessor.process_querry(query_text)) or query_text
         query_vector = self.embedder.encode([query_text])
 
-        results = self.retriever.search(query_vector, top_k=top_k)
+        results = self.retriever.search(query_vector, top_k=top_k, filter=self.resolve_filter(filter))
 
         return results
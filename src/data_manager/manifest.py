@@ -0,0 +1,179 @@
+"""Манифест загруженных документов: по хешу содержимого решаем, что пропустить, а что перезагрузить."""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+# условия фильтра поиска, которые проверяются по манифесту, а не по полям чанков
+MANIFEST_FILTERS = ("documents", "added")
+
+NEW = "new"
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+DUPLICATE = "duplicate"
+
+
+def file_hash(filepath: str, block_size: int = 1 << 20) -> str:
+    """sha256 содержимого файла, читается блоками."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentRecord:
+    """Запись манифеста об одном загруженном документе."""
+
+    def __init__(self, content_hash: str, source_path: str, stored_path: str, mtime: float, size: int, chunk_ids: List[int], model: str, added_at: float = None):
+        self.content_hash = content_hash
+        self.source_path = source_path
+        self.stored_path = stored_path
+        self.mtime = mtime
+        self.size = size
+        self.chunk_ids = chunk_ids
+        self.model = model
+        self.added_at = added_at or time.time()
+
+    def to_dict(self):
+        return {
+            "content_hash": self.content_hash,
+            "source_path": self.source_path,
+            "stored_path": self.stored_path,
+            "mtime": self.mtime,
+            "size": self.size,
+            "chunk_ids": self.chunk_ids,
+            "model": self.model,
+            "added_at": self.added_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DocumentRecord":
+        return cls(**data)
+
+
+class DocumentManifest:
+    """
+    Документы хранятся по хешу содержимого; отдельный словарь ведёт от исходного пути к хешу.
+    Для неизменившегося файла хеш не пересчитывается: хватает совпадения mtime и размера.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.documents: Dict[str, DocumentRecord] = {}
+        self.paths: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.documents = {h: DocumentRecord.from_dict(r) for h, r in data.get("documents", {}).items()}
+            self.paths = data.get("paths", {})
+
+    @staticmethod
+    def _key(filepath: str) -> str:
+        return os.path.abspath(filepath)
+
+    def get(self, filepath: str) -> Optional[DocumentRecord]:
+        content_hash = self.paths.get(self._key(filepath))
+        return self.documents.get(content_hash) if content_hash else None
+
+    def check(self, filepath: str, model: str) -> Tuple[str, str, Optional[DocumentRecord]]:
+        """
+        Сравнивает файл с манифестом. Возвращает (статус, хеш, прежняя запись для этого пути):
+        NEW, UNCHANGED, CHANGED (другое содержимое или другая модель эмбеддингов)
+        или DUPLICATE (то же содержимое уже загружено из другого файла).
+        """
+        stat = os.stat(filepath)
+        record = self.get(filepath)
+        if record is not None and record.model == model and record.size == stat.st_size and record.mtime == stat.st_mtime:
+            return UNCHANGED, record.content_hash, record
+
+        content_hash = file_hash(filepath)
+        if record is not None:
+            if record.content_hash == content_hash and record.model == model:
+                record.mtime = stat.st_mtime
+                return UNCHANGED, content_hash, record
+            return CHANGED, content_hash, record
+
+        existing = self.documents.get(content_hash)
+        if existing is not None and existing.model == model:
+            self.paths[self._key(filepath)] = content_hash
+            return DUPLICATE, content_hash, None
+        return NEW, content_hash, None
+
+    def record(self, filepath: str, content_hash: str, stored_path: str, chunk_ids: List[int], model: str) -> DocumentRecord:
+        stat = os.stat(filepath)
+        record = DocumentRecord(
+            content_hash=content_hash,
+            source_path=self._key(filepath),
+            stored_path=stored_path,
+            mtime=stat.st_mtime,
+            size=stat.st_size,
+            chunk_ids=list(chunk_ids),
+            model=model,
+        )
+        self.documents[content_hash] = record
+        self.paths[self._key(filepath)] = content_hash
+        return record
+
+    def forget(self, filepath: str) -> Optional[DocumentRecord]:
+        """
+        Убирает путь из манифеста. Если на это содержимое больше не ссылается ни один путь,
+        запись удаляется и возвращается (её чанки можно удалять из индекса), иначе — None.
+        """
+        content_hash = self.paths.pop(self._key(filepath), None)
+        if content_hash is None or content_hash in self.paths.values():
+            return None
+        return self.documents.pop(content_hash, None)
+
+    def resolve_filter(self, filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Фильтр для ретривера: условия по манифесту переводятся в номера чанков (ids),
+        остальные поля чанков (retrieval/metadata.py) остаются как есть:
+        - documents — исходный путь или список путей загруженных файлов
+        - added — диапазон (от, до) времени загрузки документа (unix time), None — без границы
+        Условие со значением None не ограничивает выборку.
+        """
+        if not filter or not (set(MANIFEST_FILTERS) & set(filter)):
+            return filter
+        filter = dict(filter)
+        selected: Optional[Set[int]] = None
+        documents = filter.pop("documents", None)
+        if documents is not None:
+            paths = [documents] if isinstance(documents, str) else documents
+            records = [self.get(path) for path in paths]
+            selected = {i for record in records if record is not None for i in record.chunk_ids}
+        added = filter.pop("added", None)
+        if added is not None:
+            lo, hi = added
+            in_range = {
+                i
+                for record in self.documents.values()
+                if (lo is None or record.added_at >= lo) and (hi is None or record.added_at <= hi)
+                for i in record.chunk_ids
+            }
+            selected = in_range if selected is None else selected & in_range
+        if selected is None:
+            return filter
+        if "ids" in filter:
+            ids = filter["ids"]
+            selected &= set(int(i) for i in (ids if isinstance(ids, (list, tuple, set, np.ndarray)) else [ids]))
+        filter["ids"] = sorted(selected)
+        return filter
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"documents": {h: r.to_dict() for h, r in self.documents.items()}, "paths": self.paths},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self.documents)
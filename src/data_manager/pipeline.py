@@ -0,0 +1,167 @@
+"""Конвейер загрузки: извлечение и предобработка в пуле процессов, эмбеддинг в одном потоке."""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from retrieval.retriever import Chunk
+from extract.text_extractor import DocumentExtractor
+from extract.ocr import PageOCR
+from preprocess.chunker import TextPreprocessor
+from resources.registry import registry
+from resources.metrics import metrics
+
+# (исходный путь, тексты для эмбеддера, чанки, ошибка, последняя ли это часть документа)
+Prepared = Tuple[str, List[str], List[Chunk], Optional[Exception], bool]
+
+
+def _iter_chunks(file_path: str, extractor: DocumentExtractor, pre_raw: TextPreprocessor) -> Iterator[Chunk]:
+    """Сырые чанки документа с названием и авторами, страницами, символьным диапазоном и разделом."""
+    meta = extractor.metadata(file_path)
+    for raw_chunk, provenance in pre_raw.process_spans(extractor.iter_parts(file_path)):
+        yield Chunk(text=raw_chunk, file_path=file_path, title=meta.get("title"), authors=meta.get("authors"), **provenance)
+
+
+def _lemmatized(chunks: List[Chunk], pre_proc: TextPreprocessor) -> List[str]:
+    """Очищает и лемматизирует чанки одной пачкой: каждое различное слово разбирается один раз."""
+    with metrics.timer("stage_seconds", stage="lemmatize"):
+        return pre_proc.lemmatize_many([pre_proc.clean_text(chunk.text) for chunk in chunks])
+
+
+def iter_document(
+    file_path: str,
+    extractor: DocumentExtractor,
+    pre_raw: TextPreprocessor,
+    pre_proc: TextPreprocessor,
+    lemma_batch: int = 64,
+) -> Iterator[Tuple[str, Chunk]]:
+    """
+    Потоково извлекает текст и режет его на чанки: (лемматизированный текст для эмбеддера, сырой чанк).
+    Документ целиком в памяти не держится — только текущая страница и до lemma_batch чанков,
+    которые лемматизируются вместе.
+    """
+    batch: List[Chunk] = []
+    for chunk in _iter_chunks(file_path, extractor, pre_raw):
+        batch.append(chunk)
+        if len(batch) >= lemma_batch:
+            yield from zip(_lemmatized(batch, pre_proc), batch)
+            batch = []
+    if batch:
+        yield from zip(_lemmatized(batch, pre_proc), batch)
+
+
+def prepare_document(file_path: str, extractor: DocumentExtractor, pre_raw: TextPreprocessor, pre_proc: TextPreprocessor) -> Tuple[List[str], List[Chunk]]:
+    """
+    Извлекает текст и режет его на чанки: сырые для выдачи, лемматизированные для эмбеддера.
+    Документ и так собирается целиком, поэтому его различные слова лемматизируются за один раз.
+    """
+    chunks = list(_iter_chunks(file_path, extractor, pre_raw))
+    return _lemmatized(chunks, pre_proc), chunks
+
+
+# ------------------ Состояние процесса-воркера ------------------
+_worker_state = None
+
+
+def _init_worker(lemma_cache_path: Optional[str] = None, ocr_cache_path: Optional[str] = None, chunking: Optional[Dict[str, Any]] = None):
+    """
+    Создаёт экстрактор и препроцессоры один раз на процесс, а не на каждый файл.
+    OCR внутри воркера идёт без своего пула: документы и так распознаются параллельно.
+    chunking — параметры нарезки для TextPreprocessor (chunk_size, overlap, max_tokens, token_counter).
+    """
+    global _worker_state
+    registry.preload(embedder=False, ocr=False)
+    if lemma_cache_path:
+        registry.lemma_cache().load(lemma_cache_path)
+    _worker_state = (
+        DocumentExtractor(ocr=PageOCR(cache_dir=ocr_cache_path)),
+        TextPreprocessor(use_lemmatization=False, **(chunking or {})),
+        TextPreprocessor(use_lemmatization=True),
+    )
+
+
+def _prepare_in_worker(file_path: str) -> Tuple[List[str], List[Chunk]]:
+    return prepare_document(file_path, *_worker_state)
+
+
+_DONE = object()
+
+
+class ParallelPreparer:
+    """
+    Готовит документы в пуле процессов и отдаёт их по одному в исходном порядке.
+    Между пулом и потребителем стоит ограниченная очередь: если эмбеддер не успевает,
+    новые файлы не отправляются в пул, и память не растёт.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: int = 8, lemma_cache_path: Optional[str] = None, ocr_cache_path: Optional[str] = None, chunking: Optional[Dict[str, Any]] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.lemma_cache_path = lemma_cache_path
+        self.ocr_cache_path = ocr_cache_path
+        self.chunking = chunking
+
+    def prepare(self, filepaths: Iterable[str], save_file: Callable[[str], str]) -> Iterator[Prepared]:
+        results: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def drain_one(in_flight: deque) -> bool:
+            path, future = in_flight.popleft()
+            try:
+                processed_chunks, chunks = future.result()
+            except Exception as e:
+                return put((path, [], [], e, True))
+            return put((path, processed_chunks, chunks, None, True))
+
+        def produce():
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker, initargs=(self.lemma_cache_path, self.ocr_cache_path, self.chunking)
+                ) as pool:
+                    in_flight: deque = deque()
+                    for path in filepaths:
+                        if stop.is_set():
+                            break
+                        try:
+                            copied = save_file(path)
+                        except Exception as e:
+                            if not put((path, [], [], e, True)):
+                                break
+                            continue
+                        in_flight.append((path, pool.submit(_prepare_in_worker, copied)))
+                        if len(in_flight) >= self.workers * 2 and not drain_one(in_flight):
+                            break
+                    while in_flight and not stop.is_set():
+                        drain_one(in_flight)
+                    for _, future in in_flight:
+                        future.cancel()
+            except Exception as e:
+                put((None, [], [], e, True))
+            finally:
+                put(_DONE)
+
+        producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if item[0] is None:
+                    raise item[3]
+                yield item
+        finally:
+            stop.set()
+            producer.join()
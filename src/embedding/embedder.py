@@ -1,25 +1,200 @@
-from sentence_transformers import SentenceTransformer
+import json
 import numpy as np
-from typing import List
+from typing import List, Optional, Sequence
 import os
 
+
+def dimension_from_metadata(local_dir: str) -> Optional[int]:
+    """
+    Размерность эмбеддингов по конфигам сохранённой модели sentence-transformers
+    (modules.json, 1_Pooling/config.json, *_Dense/config.json), без загрузки весов.
+    None, если по файлам размерность не определить.
+    """
+    modules_path = os.path.join(local_dir, "modules.json")
+    if os.path.exists(modules_path):
+        with open(modules_path, "r", encoding="utf-8") as f:
+            modules = [(m.get("path", ""), m.get("type", "")) for m in json.load(f)]
+    else:
+        modules = [("1_Pooling", "sentence_transformers.models.Pooling")]
+
+    dim = None
+    for path, module_type in modules:
+        config_path = os.path.join(local_dir, path, "config.json")
+        if not path or not os.path.exists(config_path):
+            continue
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if module_type.endswith("Pooling"):
+            modes = sum(1 for key, value in config.items() if key.startswith("pooling_mode_") and value is True)
+            dim = config["word_embedding_dimension"] * max(modes, 1)
+        elif module_type.endswith("Dense"):
+            dim = config["out_features"]
+    return dim
+
+
+# "torch" — PyTorch float32; "int8" — PyTorch с динамическим квантованием Linear в int8;
+# "onnx" — ONNX Runtime; "onnx_int8" — ONNX Runtime с квантованной в int8 моделью.
+# Для onnx-бэкендов нужны onnxruntime и optimum (pip install "sentence-transformers[onnx]").
+BACKENDS = ("torch", "int8", "onnx", "onnx_int8")
+
+
+def length_buckets(lengths: Sequence[int], batch_size: int, max_batch_tokens: Optional[int] = None) -> List[np.ndarray]:
+    """
+    Разбивает тексты на батчи по длине: сначала самые длинные, в батче не больше batch_size текстов
+    и не больше max_batch_tokens токенов с учётом паддинга до самого длинного. Короткие тексты
+    идут большими батчами, длинные — маленькими, и на паддинг почти ничего не тратится.
+    Возвращает номера текстов для каждого батча.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    buckets: List[np.ndarray] = []
+    begin = 0
+    for end in range(1, len(order) + 1):
+        size = end - begin
+        padded = lengths[order[begin]] * (size + 1)
+        if end == len(order) or size >= batch_size or (max_batch_tokens is not None and padded > max_batch_tokens):
+            buckets.append(order[begin:end])
+            begin = end
+    return buckets
+
+
 class TextEmbedder:
-    def __init__(self, model_name: str = "sberbank-ai/sbert_large_nlu_ru", local_dir: str = "models/sbert_ru_large"):
-        if not os.path.exists(local_dir):
-            print(f"[+] Модель не найдена в {local_dir}. Скачиваю {model_name} с HuggingFace...")
-            model = SentenceTransformer(model_name)
-            os.makedirs(os.path.dirname(local_dir), exist_ok=True)
-            model.save(local_dir)
-            print(f"[+] Модель сохранена в {local_dir}")
+    """
+    Модель sentence-transformers. Веса (и сам torch) загружаются при первом encode,
+    размерность читается из конфигов модели — создание эмбеддера ничего не стоит.
+    - backend: бэкенд инференса на CPU (см. BACKENDS)
+    - batch_size, max_batch_tokens: пределы батча по числу текстов и по токенам с паддингом
+    - threads: число потоков инференса (None — как решит torch/onnxruntime)
+    - onnx_quantization: набор инструкций для onnx_int8: "avx512_vnni", "avx512", "avx2" или "arm64"
+    - progress_min: с какого числа текстов показывать прогресс-бар
+    """
 
-        print(f"[+] Загружается модель эмбеддингов из {local_dir}")
-        self.model = SentenceTransformer(local_dir)
+    def __init__(
+        self,
+        model_name: str = "sberbank-ai/sbert_large_nlu_ru",
+        local_dir: str = "models/sbert_ru_large",
+        backend: str = "torch",
+        batch_size: int = 32,
+        max_batch_tokens: Optional[int] = 16384,
+        threads: Optional[int] = None,
+        onnx_quantization: str = "avx512_vnni",
+        progress_min: int = 1024,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд эмбеддера: {backend}")
+        self.model_name = model_name
+        self.local_dir = local_dir
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.threads = threads
+        self.onnx_quantization = onnx_quantization
+        self.progress_min = progress_min
+        self._model = None
+        self._dim: Optional[int] = None
 
-    def encode(self, texts: List[str]) -> np.ndarray:
-        embeddings = self.model.encode(
-            texts,
-            show_progress_bar=True,
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            if not os.path.exists(self.local_dir):
+                print(f"[+] Модель не найдена в {self.local_dir}. Скачиваю {self.model_name} с HuggingFace...")
+                model = SentenceTransformer(self.model_name)
+                os.makedirs(os.path.dirname(self.local_dir), exist_ok=True)
+                model.save(self.local_dir)
+                print(f"[+] Модель сохранена в {self.local_dir}")
+
+            print(f"[+] Загружается модель эмбеддингов из {self.local_dir} ({self.backend})")
+            if self.backend in ("onnx", "onnx_int8"):
+                self._model = self._load_onnx()
+            else:
+                import torch
+
+                if self.threads:
+                    torch.set_num_threads(self.threads)
+                model = SentenceTransformer(self.local_dir, device="cpu")
+                if self.backend == "int8":
+                    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                self._model = model
+        return self._model
+
+    def _load_onnx(self):
+        """
+        Модель для ONNX Runtime. model.onnx (и его int8-версия) экспортируются один раз
+        и сохраняются в local_dir/onnx рядом с весами.
+        """
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if self.threads:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = options
+
+        if not os.path.exists(os.path.join(self.local_dir, "onnx", "model.onnx")):
+            print(f"[+] Экспорт модели в ONNX: {self.local_dir}/onnx")
+            SentenceTransformer(self.local_dir, backend="onnx", model_kwargs=model_kwargs).save_pretrained(self.local_dir)
+        if self.backend == "onnx":
+            return SentenceTransformer(self.local_dir, backend="onnx", model_kwargs=model_kwargs)
+
+        file_name = f"model_qint8_{self.onnx_quantization}.onnx"
+        if not os.path.exists(os.path.join(self.local_dir, "onnx", file_name)):
+            print(f"[+] Квантование ONNX-модели в int8 ({self.onnx_quantization})")
+            model = SentenceTransformer(self.local_dir, backend="onnx", model_kwargs=model_kwargs)
+            export_dynamic_quantized_onnx_model(model, self.onnx_quantization, self.local_dir)
+        model_kwargs["file_name"] = os.path.join("onnx", file_name)
+        return SentenceTransformer(self.local_dir, backend="onnx", model_kwargs=model_kwargs)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def get_embedding_dim(self) -> int:
+        if self._dim is None:
+            if self._model is None and os.path.isdir(self.local_dir):
+                self._dim = dimension_from_metadata(self.local_dir)
+            if self._dim is None:
+                self._dim = self.model.get_sentence_embedding_dimension()
+        return self._dim
+
+    def _token_estimate(self, text: str) -> int:
+        """Длина текста в токенах без токенизатора: ~1.5 подслова на слово, не больше max_seq_length."""
+        limit = getattr(self.model, "max_seq_length", None) or 512
+        return min(int(len(text.split()) * 1.5) + 2, limit)
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """Один текст (запрос) без сортировки и прогресс-бара; (1, dim)."""
+        return self.model.encode(
+            [text],
+            batch_size=1,
+            show_progress_bar=False,
             convert_to_numpy=True,
             normalize_embeddings=True
-        )
+        ).astype(np.float32, copy=False)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if len(texts) == 0:
+            return np.zeros((0, self.get_embedding_dim()), dtype=np.float32)
+        if len(texts) == 1:
+            return self.encode_query(texts[0])
+
+        buckets = length_buckets([self._token_estimate(text) for text in texts], self.batch_size, self.max_batch_tokens)
+        if len(texts) >= self.progress_min:
+            from tqdm import tqdm
+
+            buckets = tqdm(buckets, desc="Эмбеддинги", unit="батч")
+        embeddings = None
+        for rows in buckets:
+            vectors = self.model.encode(
+                [texts[i] for i in rows],
+                batch_size=len(rows),
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[rows] = vectors
         return embeddings
@@ -0,0 +1,42 @@
+"""Детерминированный эмбеддер без модели и сети: хеширование слов в фиксированное число измерений."""
+
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashEmbedder:
+    """
+    Замена TextEmbedder для тестов, бенчмарков и CI без доступа к HuggingFace.
+    Каждое слово (и пара соседних слов) попадает в измерение crc32(слово) % dim со знаком
+    из старшего бита хеша; вектор нормализуется. Тексты с общими словами получаются
+    близкими, так что recall на синтетике осмыслен.
+    """
+
+    def __init__(self, dim: int = 384, bigrams: bool = True):
+        self.dim = dim
+        self.bigrams = bigrams
+        self.model_name = f"hash-{dim}{'-bigrams' if bigrams else ''}"
+
+    def get_embedding_dim(self) -> int:
+        return self.dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        if self.bigrams:
+            tokens += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return tokens
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                embeddings[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        return embeddings
@@ -0,0 +1,199 @@
+"""OCR страниц PDF без текстового слоя: растеризация fitz, пул процессов, кеш результатов на диске."""
+
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from resources.registry import registry, DEFAULT_OCR_LANGUAGES
+from resources.metrics import metrics
+
+
+def render_page(page, dpi: int) -> bytes:
+    """PNG страницы в оттенках серого; для OCR цвет не нужен, а картинка втрое меньше."""
+    import fitz
+
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")
+
+
+def recognize(reader, image: bytes) -> str:
+    """Текст с картинки: абзацы easyocr в порядке чтения."""
+    return "\n".join(reader.readtext(image, detail=0, paragraph=True)).strip()
+
+
+def _recognize_in_worker(image: bytes, languages: Tuple[str, ...]) -> str:
+    # easyocr.Reader создаётся один раз на процесс через реестр
+    return recognize(registry.ocr_reader(languages), image)
+
+
+class OCRCache:
+    """Результаты OCR в папке: один файл <sha256 картинки>.txt на страницу."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+
+class PageOCR:
+    """
+    Распознаёт страницы PDF, у которых нет текстового слоя (сканы).
+    - dpi: разрешение растеризации (200 — компромисс между качеством и временем)
+    - workers: размер пула процессов для OCR; 0 — распознавать в текущем процессе
+    - cache_dir: кеш результатов по хешу картинки страницы (и языкам)
+    - max_pages: сколько страниц одного документа распознавать не больше
+    - time_budget: сколько секунд тратить на OCR одного документа; недоделанные страницы пропускаются
+    Пул создаётся при первом распознавании и живёт до close() (или выхода из with);
+    после close() следующее распознавание создаст его заново.
+    """
+
+    def __init__(
+        self,
+        dpi: int = 200,
+        workers: int = 0,
+        cache_dir: Optional[str] = None,
+        max_pages: Optional[int] = 50,
+        time_budget: Optional[float] = 300.0,
+        languages: Sequence[str] = DEFAULT_OCR_LANGUAGES,
+        reader_factory: Optional[Callable[[], object]] = None,
+    ):
+        self.dpi = dpi
+        self.workers = workers
+        self.cache = OCRCache(cache_dir) if cache_dir else None
+        self.max_pages = max_pages
+        self.time_budget = time_budget
+        self.languages = tuple(languages)
+        # для workers=0: откуда взять easyocr.Reader (по умолчанию — общий реестр)
+        self._reader_factory = reader_factory or (lambda: registry.ocr_reader(self.languages))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._unavailable = False
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "PageOCR":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _key(self, image: bytes) -> str:
+        digest = hashlib.sha256(image)
+        digest.update(f"|{self.dpi}|{','.join(self.languages)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def deadline(self) -> Optional[float]:
+        """Момент (time.monotonic), после которого OCR документа прекращается."""
+        return time.monotonic() + self.time_budget if self.time_budget is not None else None
+
+    def recognize_pages(self, doc, page_numbers: List[int], deadline: Optional[float] = None, limit: bool = True) -> Dict[int, str]:
+        """
+        OCR заданных страниц открытого fitz-документа. Возвращает {номер страницы: текст}
+        только для распознанных страниц; остальные (лимит страниц, время, ошибки) пропускаются.
+        При потоковом извлечении документ распознаётся частями: тогда deadline общий на документ,
+        а лимит страниц вызывающий считает сам (limit=False).
+        """
+        if self._unavailable or not page_numbers:
+            return {}
+        if limit and self.max_pages is not None and len(page_numbers) > self.max_pages:
+            print(f"[!] OCR: распознаются первые {self.max_pages} из {len(page_numbers)} страниц без текста")
+            page_numbers = page_numbers[:self.max_pages]
+        if deadline is None:
+            deadline = self.deadline()
+
+        results: Dict[int, str] = {}
+        todo: List[Tuple[int, str, bytes]] = []
+        for number in page_numbers:
+            image = render_page(doc[number], self.dpi)
+            key = self._key(image)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                results[number] = cached
+            else:
+                todo.append((number, key, image))
+
+        metrics.inc("ocr_pages_total", len(results), source="cache")
+        try:
+            with metrics.timer("stage_seconds", stage="ocr"):
+                if self.workers > 0:
+                    recognized = self._recognize_parallel(todo, deadline)
+                else:
+                    recognized = self._recognize_inline(todo, deadline)
+        except ImportError as e:
+            print(f"[!] OCR недоступен ({e}); страницы без текста пропускаются")
+            self._unavailable = True
+            return results
+
+        metrics.inc("ocr_pages_total", len(recognized), source="recognized")
+        for number, key, text in recognized:
+            results[number] = text
+            if self.cache is not None:
+                self.cache.put(key, text)
+        if len(results) < len(page_numbers):
+            print(f"[!] OCR: не распознано {len(page_numbers) - len(results)} страниц (лимит времени или ошибки)")
+        return results
+
+    def _recognize_inline(self, todo, deadline) -> List[Tuple[int, str, str]]:
+        if not todo:
+            return []
+        try:
+            reader = self._reader_factory()
+        except Exception as e:
+            # нет весов easyocr и сети, нет GPU-зависимостей и т.п. — как отсутствие OCR
+            raise ImportError(f"не удалось создать easyocr.Reader: {e}") from e
+        recognized = []
+        for number, key, image in todo:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            try:
+                recognized.append((number, key, recognize(reader, image)))
+            except ImportError:
+                raise
+            except Exception as e:
+                print(f"[!] OCR страницы {number + 1}: {e}")
+        return recognized
+
+    def _recognize_parallel(self, todo, deadline) -> List[Tuple[int, str, str]]:
+        futures = {self.pool.submit(_recognize_in_worker, image, self.languages): (number, key) for number, key, image in todo}
+        recognized = []
+        pending = set(futures)
+        while pending:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                number, key = futures[future]
+                try:
+                    recognized.append((number, key, future.result()))
+                except ImportError:
+                    raise
+                except Exception as e:
+                    print(f"[!] OCR страницы {number + 1}: {e}")
+        for future in pending:
+            future.cancel()
+        return recognized
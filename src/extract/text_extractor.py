@@ -1,44 +1,179 @@
 import os
-from typing import Optional
-import fitz  
-from docx import Document
+import re
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
 import numpy as np
-import easyocr
 import io
 
+from resources.registry import registry, DEFAULT_OCR_LANGUAGES
+from extract.ocr import PageOCR
+
+
+class TextPart(NamedTuple):
+    """
+    Часть документа с происхождением.
+    start — смещение части в тексте документа (extract() для PDF/DOCX, содержимое файла для TXT);
+    page — номер страницы с 1 (None для TXT и DOCX); section — текущий заголовок раздела.
+    """
+
+    text: str
+    start: int
+    page: Optional[int] = None
+    section: Optional[str] = None
+
+
+_HEADING_STYLES = ("heading", "заголовок", "title", "название")
+
 
 class DocumentExtractor:
-    def __init__(self, ocr_languages=("en", "ru")):
-        self.ocr_reader = easyocr.Reader(list(ocr_languages), gpu=False)
+    """
+    Текст из PDF, DOCX и TXT. Страницы PDF без текстового слоя (сканы) распознаются через OCR
+    (см. extract/ocr.py); use_ocr=False отключает это, ocr=PageOCR(...) задаёт DPI, пул, кеш и лимиты.
+    Страница считается сканом, если на ней есть картинки и меньше min_page_chars символов текста.
+    """
 
-    def extract(self, filepath: str) -> Optional[str]:
+    def __init__(self, ocr_languages=DEFAULT_OCR_LANGUAGES, ocr_reader=None, ocr: Optional[PageOCR] = None, use_ocr: bool = True, min_page_chars: int = 16, page_window: int = 16):
+        self.ocr_languages = tuple(ocr_languages)
+        self._ocr_reader = ocr_reader
+        self.use_ocr = use_ocr
+        self.min_page_chars = min_page_chars
+        # сколько страниц PDF читать и отдавать на OCR за раз при потоковом извлечении
+        self.page_window = page_window
+        self.ocr = ocr or PageOCR(languages=self.ocr_languages, reader_factory=lambda: self.ocr_reader)
+
+    @property
+    def ocr_reader(self):
+        """easyocr.Reader из общего реестра; создаётся при первом обращении."""
+        if self._ocr_reader is None:
+            self._ocr_reader = registry.ocr_reader(self.ocr_languages)
+        return self._ocr_reader
+
+    def _check(self, filepath: str) -> str:
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Файл '{filepath}' не найден.")
-
         ext = os.path.splitext(filepath)[1].lower()
+        if ext not in (".pdf", ".txt", ".docx"):
+            raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+        return ext
+
+    def extract(self, filepath: str) -> Optional[str]:
+        ext = self._check(filepath)
         if ext == ".pdf":
             return self._extract_from_pdf(filepath)
         elif ext == ".txt":
             return self._extract_from_txt(filepath)
-        elif ext == ".docx":
+        else:
             return self._extract_from_docx(filepath)
+
+    def extract_iter(self, filepath: str) -> Iterator[str]:
+        """
+        Текст документа по частям: страницы PDF, абзацы DOCX, блоки строк TXT.
+        Части идут в порядке документа; "\n".join(extract_iter(path)) совпадает с extract(path)
+        с точностью до пробелов. Ошибки формата и отсутствие файла — сразу, до первой части.
+        """
+        return (part.text for part in self.iter_parts(filepath))
+
+    def iter_parts(self, filepath: str) -> Iterator[TextPart]:
+        """Как extract_iter, но каждая часть с номером страницы, смещением и заголовком раздела."""
+        ext = self._check(filepath)
+        if ext == ".pdf":
+            return self._iter_pdf(filepath)
+        elif ext == ".txt":
+            return self._iter_txt(filepath)
         else:
-            raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+            return self._iter_docx(filepath)
+
+    def metadata(self, filepath: str) -> Dict[str, Any]:
+        """Название и авторы из свойств PDF/DOCX; пустые поля не возвращаются."""
+        ext = self._check(filepath)
+        if ext == ".pdf":
+            import fitz
+
+            with fitz.open(filepath) as doc:
+                info = doc.metadata or {}
+            title, author = info.get("title"), info.get("author")
+        elif ext == ".docx":
+            from docx import Document
+
+            props = Document(filepath).core_properties
+            title, author = props.title, props.author
+        else:
+            return {}
+        meta: Dict[str, Any] = {}
+        if title and title.strip():
+            meta["title"] = title.strip()
+        if author and author.strip():
+            meta["authors"] = [a.strip() for a in re.split(r";|\s+and\s+|\s+&\s+", author) if a.strip()]
+        return meta
+
+    def _iter_pdf(self, filepath: str) -> Iterator[TextPart]:
+        """Страницы PDF; сканы распознаются окнами по page_window страниц с общими лимитами OCR."""
+        import fitz
 
-    def _extract_from_pdf(self, filepath: str) -> str:
-        text = []
         doc = fitz.open(filepath)
-        for i, page in enumerate(doc):
-            page_text = page.get_text().strip()
-            if page_text:
-                text.append(page_text)
-        return "\n".join(text)
+        # оглавление PDF: раздел страницы — последний пункт, начавшийся не позже неё
+        toc = sorted((page, title.strip()) for _, title, page in doc.get_toc(simple=True) if page > 0)
+        toc_pos, section = 0, None
+        offset = 0
+        deadline = self.ocr.deadline()
+        ocr_left = self.ocr.max_pages
+        for start in range(0, len(doc), self.page_window):
+            numbers = range(start, min(start + self.page_window, len(doc)))
+            pages = {i: doc[i].get_text().strip() for i in numbers}
+            if self.use_ocr and ocr_left != 0:
+                scanned = [
+                    i for i in numbers
+                    if len(pages[i]) < self.min_page_chars and doc[i].get_images(full=False)
+                ]
+                if ocr_left is not None:
+                    if len(scanned) > ocr_left:
+                        print(f"[!] OCR: достигнут лимит {self.ocr.max_pages} страниц, остальные сканы пропускаются")
+                    scanned = scanned[:ocr_left]
+                    ocr_left -= len(scanned)
+                for i, page_text in self.ocr.recognize_pages(doc, scanned, deadline=deadline, limit=False).items():
+                    if len(page_text) > len(pages[i]):
+                        pages[i] = page_text
+            for i in numbers:
+                while toc_pos < len(toc) and toc[toc_pos][0] <= i + 1:
+                    section = toc[toc_pos][1]
+                    toc_pos += 1
+                if pages[i]:
+                    yield TextPart(pages[i], offset, i + 1, section)
+                    offset += len(pages[i]) + 1
+
+    def _iter_txt(self, filepath: str, block_chars: int = 1 << 16) -> Iterator[TextPart]:
+        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+            block: List[str] = []
+            size = offset = 0
+            for line in f:
+                block.append(line)
+                size += len(line)
+                if size >= block_chars:
+                    yield TextPart("".join(block), offset)
+                    offset += size
+                    block, size = [], 0
+            if block:
+                yield TextPart("".join(block), offset)
+
+    def _iter_docx(self, filepath: str) -> Iterator[TextPart]:
+        from docx import Document
+
+        doc = Document(filepath)
+        offset, section = 0, None
+        for p in doc.paragraphs:
+            if not p.text.strip():
+                continue
+            style = (p.style.name or "").lower() if p.style is not None else ""
+            if style.startswith(_HEADING_STYLES):
+                section = p.text.strip()
+            yield TextPart(p.text, offset, None, section)
+            offset += len(p.text) + 1
+
+    def _extract_from_pdf(self, filepath: str) -> str:
+        return "\n".join(part.text for part in self._iter_pdf(filepath))
 
     def _extract_from_txt(self, filepath: str) -> str:
         with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
             return f.read().strip()
 
     def _extract_from_docx(self, filepath: str) -> str:
-        doc = Document(filepath)
-        paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-        return "\n".join(paragraphs)
+        return "\n".join(part.text for part in self._iter_docx(filepath))
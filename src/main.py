@@ -7,17 +7,11 @@ import os
 
 # folder_path = "D:/Go-prog/prog2/articles"  
 
-# for filename in os.listdir(folder_path):
-#     filepath = os.path.join(folder_path, filename)
-    
-#     if os.path.isfile(filepath):
-#         try:
-#             print(f"[+] Добавляется файл: {filename}")
-#             db.add_article(filepath)
-#         except Exception as e:
-#             print(f"[!] Ошибка при добавлении {filename}: {e}")
-
-# print("[✓] Все файлы добавлены в базу.")
+# report = db.ingest_folder(folder_path, save_every=100)
+# for filename, error in report.failed.items():
+#     print(f"[!] Ошибка при добавлении {filename}: {error}")
+
+# print(f"[✓] Все файлы добавлены в базу: {report}")
 
 
 
@@ -0,0 +1,35 @@
+"""Общий ограниченный кеш лемм с сохранением на диск."""
+
+import os
+import pickle
+from typing import Optional
+
+from resources.cache import LRUCache
+
+
+class LemmaCache(LRUCache):
+    """
+    Кеш токен -> лемма для MorphAnalyzer.
+    Один на процесс (через реестр ресурсов), вытесняет давно не встречавшиеся токены
+    и может сохраняться между запусками, чтобы тёплый старт не вызывал parse заново.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 200_000):
+        super().__init__(maxsize=maxsize)
+
+    def save(self, path: str):
+        """Атомарно сохраняет кеш (от старых записей к свежим, чтобы порядок LRU сохранился)."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.items(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> int:
+        """Дозагружает сохранённые леммы. Возвращает число загруженных записей."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            items = pickle.load(f)
+        for token, lemma in items:
+            self.put(token, lemma)
+        return len(items)
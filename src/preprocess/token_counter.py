@@ -0,0 +1,124 @@
+"""Подсчёт токенов модели эмбеддингов для чанкера: токенизатором модели или быстрой оценкой, с кешем по словам."""
+
+import json
+import math
+import os
+from typing import Optional
+
+from resources.cache import LRUCache
+
+
+class TokenCounter:
+    """
+    Сколько токенов модели займёт слово.
+    - tokenizer_path: папка модели (sentence-transformers / HuggingFace) — счёт её токенизатором
+    - model_name: имя модели на HuggingFace — токенизатор и конфиг берутся (и скачиваются) по нему,
+      пока папки tokenizer_path нет (модель эмбеддингов загружается лениво и сохраняется туда позже);
+      источник выбирается при первом подсчёте, а не при создании счётчика
+    Без обоих (или если токенизатор не загрузился) — оценка ceil(len(слово) / chars_per_token).
+    - cache_size: сколько слов помнить; слова в тексте повторяются, токенизатор зовётся редко
+    BERT-подобные токенизаторы сначала режут текст по пробелам, поэтому сумма по словам
+    совпадает с длиной последовательности без служебных [CLS]/[SEP].
+    Объект можно передавать в процессы пула: токенизатор и кеш создаются там заново.
+    """
+
+    def __init__(
+        self,
+        tokenizer_path: Optional[str] = None,
+        chars_per_token: float = 3.0,
+        cache_size: Optional[int] = 200_000,
+        model_name: Optional[str] = None,
+    ):
+        self.tokenizer_path = tokenizer_path
+        self.model_name = model_name
+        self.chars_per_token = chars_per_token
+        self.cache_size = cache_size
+        self._tokenizer = None
+        # токенизатор не загрузился: дальше считаем по длине слов
+        self._failed = False
+        self._cache = LRUCache(maxsize=cache_size)
+
+    @classmethod
+    def for_embedder(cls, embedder, **kwargs) -> "TokenCounter":
+        """Счётчик под модель эмбеддера (TextEmbedder: папка модели или её имя на HuggingFace); иначе — оценка по длине."""
+        local_dir = getattr(embedder, "local_dir", None)
+        if local_dir is None:
+            return cls(**kwargs)
+        return cls(local_dir, model_name=getattr(embedder, "model_name", None), **kwargs)
+
+    @property
+    def source(self) -> Optional[str]:
+        """Откуда брать токенизатор: папка модели, если она уже есть, иначе имя модели."""
+        if self._failed:
+            return None
+        if self.tokenizer_path is not None and (os.path.isdir(self.tokenizer_path) or self.model_name is None):
+            return self.tokenizer_path
+        return self.model_name
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tokenizer"] = None
+        state["_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = LRUCache(maxsize=self.cache_size)
+
+    @property
+    def tokenizer(self):
+        source = self.source
+        if self._tokenizer is None and source is not None:
+            try:
+                from transformers import AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(source)
+            except Exception as e:
+                print(f"[!] Токенизатор {source} не загружен ({e}); токены оцениваются по длине слов")
+                self._failed = True
+        return self._tokenizer
+
+    def __call__(self, word: str) -> int:
+        count = self._cache.get(word)
+        if count is None:
+            tokenizer = self.tokenizer
+            if tokenizer is not None:
+                count = max(len(tokenizer.encode(word, add_special_tokens=False)), 1)
+            else:
+                count = max(math.ceil(len(word) / self.chars_per_token), 1)
+            self._cache.put(word, count)
+        return count
+
+    def count(self, text: str) -> int:
+        return sum(self(word) for word in text.split())
+
+    def max_tokens(self) -> Optional[int]:
+        """
+        Сколько токенов текста модель обработает без обрезки: max_seq_length из
+        sentence_bert_config.json (или model_max_length токенизатора) минус [CLS] и [SEP].
+        None, если по файлам модели это не определить.
+        """
+        source = self.source
+        if source is None:
+            return None
+        limit = None
+        config_path = self._config_path(source)
+        if config_path is not None:
+            with open(config_path, "r", encoding="utf-8") as f:
+                limit = json.load(f).get("max_seq_length")
+        if limit is None and self.tokenizer is not None and self.tokenizer.model_max_length < 1_000_000:
+            limit = self.tokenizer.model_max_length
+        return limit - 2 if limit else None
+
+    @staticmethod
+    def _config_path(source: str) -> Optional[str]:
+        """sentence_bert_config.json из папки модели или с HuggingFace (скачивается только он)."""
+        if os.path.isdir(source):
+            path = os.path.join(source, "sentence_bert_config.json")
+            return path if os.path.exists(path) else None
+        try:
+            from huggingface_hub import hf_hub_download
+
+            return hf_hub_download(source, "sentence_bert_config.json")
+        except Exception:
+            return None
@@ -0,0 +1,42 @@
+"""Отложенный импорт тяжёлых модулей: модуль загружается при первом обращении к атрибуту."""
+
+import importlib
+import threading
+from types import ModuleType
+from typing import Optional
+
+
+class LazyModule(ModuleType):
+    """
+    Заглушка модуля: faiss = lazy_import("faiss") ничего не импортирует,
+    пока не понадобится faiss.IndexFlatIP или другой атрибут.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lock"] = threading.Lock()
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module: Optional[ModuleType] = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
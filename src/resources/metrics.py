@@ -0,0 +1,269 @@
+"""
+Метрики и трассировка этапов: таймеры, счётчики, гистограммы и текущие значения.
+
+Один реестр на процесс (metrics), как resources.registry. По умолчанию выключен: timer()
+отдаёт общий пустой контекст, inc()/observe()/set() выходят после проверки одного флага.
+Включается metrics.enable() или переменной окружения TEXT2SCI_METRICS=1.
+
+Экспорт:
+- snapshot() — словарь для JSON (/metrics сервиса)
+- prometheus() — текстовый формат Prometheus (/metrics?format=prometheus)
+- add_sink(fn) — fn получает событие каждого замера таймера: структурные логи, трассировка
+- add_collector(fn) — fn(metrics) вызывается перед экспортом и обновляет значения,
+  которые дешевле прочитать, чем отслеживать (размер индекса, попадания кешей)
+Метрики процессов пула (ParallelPreparer) остаются в самих процессах.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# границы корзин гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# для гистограмм количеств (чанков на документ, размеров батчей)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+PREFIX = "text2sci_"
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+_NULL_TIMER = nullcontext()
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items())) if labels else ()
+
+
+def _format(key: Key, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    """name{label="value",...} — имя серии в snapshot и в формате Prometheus."""
+    name, labels = key
+    labels = labels + extra
+    if not labels:
+        return name
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return name + "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    """Число наблюдений по корзинам (не накопительно), их сумма и количество."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, наблюдений не больше le) — корзины в смысле Prometheus, последняя +Inf."""
+        total, result = 0, []
+        for bound, count in zip(list(self.bounds) + [float("inf")], self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class _Timer:
+    __slots__ = ("owner", "name", "labels", "start")
+
+    def __init__(self, owner: "Metrics", name: str, labels: Dict[str, Any]):
+        self.owner = owner
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        self.owner.observe(self.name, seconds, **self.labels)
+        if self.owner._sinks:
+            event = {"metric": self.name, "seconds": seconds, "ts": time.time(), **self.labels}
+            if exc_type is not None:
+                event["error"] = exc_type.__name__
+            self.owner._emit(event)
+        return False
+
+
+class Metrics:
+    """
+    Реестр метрик процесса. Имена — без префикса (stage_seconds), метки — именованные
+    аргументы: metrics.timer("stage_seconds", stage="encode"). Потокобезопасен.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        if enabled is None:
+            enabled = os.environ.get("TEXT2SCI_METRICS", "").lower() in ("1", "true", "yes", "on")
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._bounds: Dict[str, Tuple[float, ...]] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[Key, float] = {}
+        self._gauges: Dict[Key, float] = {}
+        self._histograms: Dict[Key, Histogram] = {}
+        self._sinks: List[Callable[[Dict[str, Any]], None]] = []
+        self._collectors: List[Callable[["Metrics"], None]] = []
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def set_buckets(self, name: str, buckets: Tuple[float, ...]):
+        """Свои границы корзин для гистограммы name (например, COUNT_BUCKETS для количеств)."""
+        self._bounds[name] = tuple(buckets)
+
+    # ------------------ Запись ------------------
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._bounds.get(name, self.buckets))
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """Контекст, который записывает своё время в гистограмму name и отдаёт событие подписчикам."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def timed_iter(self, items: Iterable, name: str, **labels) -> Iterator:
+        """
+        Итератор, который меряет ожидание каждого следующего элемента: для генераторов,
+        работа которых идёт внутри next() (потоковое извлечение, очередь пула).
+        """
+        if not self.enabled:
+            return iter(items)
+        return self._timed_iter(iter(items), name, labels)
+
+    def _timed_iter(self, items: Iterator, name: str, labels: Dict[str, Any]) -> Iterator:
+        while True:
+            with _Timer(self, name, labels):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    # ------------------ Подписчики и сборщики ------------------
+    def add_sink(self, sink: Callable[[Dict[str, Any]], None]):
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink: Callable[[Dict[str, Any]], None]):
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+
+    def _emit(self, event: Dict[str, Any]):
+        for sink in list(self._sinks):
+            try:
+                sink(event)
+            except Exception as e:
+                print(f"[!] Подписчик метрик упал: {e}")
+
+    def add_collector(self, collector: Callable[["Metrics"], None]):
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[["Metrics"], None]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def collect(self):
+        for collector in list(self._collectors):
+            try:
+                collector(self)
+            except Exception as e:
+                print(f"[!] Сборщик метрик упал: {e}")
+
+    # ------------------ Экспорт ------------------
+    def snapshot(self) -> Dict[str, Any]:
+        """{"counters": {серия: значение}, "gauges": {...}, "histograms": {серия: {count, sum, mean, buckets}}}."""
+        if self.enabled:
+            self.collect()
+        with self._lock:
+            return {
+                "counters": {_format(key): value for key, value in sorted(self._counters.items())},
+                "gauges": {_format(key): value for key, value in sorted(self._gauges.items())},
+                "histograms": {
+                    _format(key): {
+                        "count": h.count,
+                        "sum": h.sum,
+                        "mean": h.sum / h.count if h.count else 0.0,
+                        "buckets": dict(h.cumulative()),
+                    }
+                    for key, h in sorted(self._histograms.items())
+                },
+            }
+
+    def prometheus(self) -> str:
+        """Все метрики в текстовом формате Prometheus (версия 0.0.4), имена с префиксом text2sci_."""
+        if self.enabled:
+            self.collect()
+        lines: List[str] = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for key, value in sorted(series.items()):
+                    name = PREFIX + key[0]
+                    if name not in typed:
+                        lines.append(f"# TYPE {name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{_format((name, key[1]))} {value}")
+            typed = set()
+            for key, h in sorted(self._histograms.items()):
+                name = PREFIX + key[0]
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for le, count in h.cumulative():
+                    lines.append(f"{_format((name + '_bucket', key[1]), (('le', le),))} {count}")
+                lines.append(f"{_format((name + '_sum', key[1]))} {h.sum}")
+                lines.append(f"{_format((name + '_count', key[1]))} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+def json_log_sink(stream: Optional[TextIO] = None) -> Callable[[Dict[str, Any]], None]:
+    """Подписчик, который пишет каждое событие строкой JSON (по умолчанию в stderr)."""
+    lock = threading.Lock()
+
+    def sink(event: Dict[str, Any]):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with lock:
+            target = stream or sys.stderr
+            target.write(line + "\n")
+            target.flush()
+
+    return sink
+
+
+metrics = Metrics()
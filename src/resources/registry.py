@@ -0,0 +1,93 @@
+"""Общий реестр тяжёлых объектов процесса: эмбеддер, морфоанализатор, OCR и кеш лемм."""
+
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_OCR_LANGUAGES = ("en", "ru")
+
+
+class ResourceRegistry:
+    """
+    Ленивый реестр ресурсов.
+    Каждый объект создаётся при первом обращении и дальше переиспользуется всеми
+    DatabaseManager, Seeker, TextPreprocessor и DocumentExtractor в процессе.
+    preload() позволяет загрузить всё заранее, при старте сервиса.
+    """
+
+    def __init__(self, lemma_cache_size: Optional[int] = 200_000):
+        self.lemma_cache_size = lemma_cache_size
+        self._lock = threading.RLock()
+        self._instances: Dict[Tuple, Any] = {}
+
+    def _get(self, key: Tuple, factory: Callable[[], Any]) -> Any:
+        obj = self._instances.get(key)
+        if obj is None:
+            with self._lock:
+                obj = self._instances.get(key)
+                if obj is None:
+                    obj = factory()
+                    self._instances[key] = obj
+        return obj
+
+    # ------------------ Ресурсы ------------------
+    def embedder(self, model_name: str = None, local_dir: str = None, **options):
+        """
+        TextEmbedder; без аргументов — модель по умолчанию.
+        options — настройки инференса TextEmbedder (backend, batch_size, threads, ...).
+        """
+        from embedding.embedder import TextEmbedder
+
+        kwargs = {}
+        if model_name is not None:
+            kwargs["model_name"] = model_name
+        if local_dir is not None:
+            kwargs["local_dir"] = local_dir
+        kwargs.update(sorted(options.items()))
+        key = ("embedder", *kwargs.items()) if kwargs else ("embedder",)
+        return self._get(key, lambda: TextEmbedder(**kwargs))
+
+    def morph(self):
+        """pymorphy2.MorphAnalyzer (словари грузятся один раз на процесс)."""
+        import pymorphy2
+
+        return self._get(("morph",), pymorphy2.MorphAnalyzer)
+
+    def ocr_reader(self, languages: Tuple[str, ...] = DEFAULT_OCR_LANGUAGES):
+        """easyocr.Reader для заданного набора языков."""
+        import easyocr
+
+        languages = tuple(languages)
+        key = ("ocr_reader",) if languages == DEFAULT_OCR_LANGUAGES else ("ocr_reader", languages)
+        return self._get(key, lambda: easyocr.Reader(list(languages), gpu=False))
+
+    def lemma_cache(self):
+        """LemmaCache, общий для всех TextPreprocessor."""
+        from preprocess.lemma_cache import LemmaCache
+
+        return self._get(("lemma_cache",), lambda: LemmaCache(self.lemma_cache_size))
+
+    # ------------------ Управление ------------------
+    def set(self, name: str, obj: Any, *key):
+        """Подменяет ресурс готовым объектом (например, в тестах): registry.set("embedder", fake)."""
+        with self._lock:
+            self._instances[(name, *key)] = obj
+
+    def is_loaded(self, name: str) -> bool:
+        return any(key[0] == name for key in self._instances)
+
+    def preload(self, embedder: bool = True, morph: bool = True, ocr: bool = True):
+        """Загружает ресурсы заранее, чтобы первый запрос не платил за инициализацию."""
+        if embedder:
+            self.embedder()
+        if morph:
+            self.morph()
+        if ocr:
+            self.ocr_reader()
+        self.lemma_cache()
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
+
+
+registry = ResourceRegistry()
@@ -0,0 +1,346 @@
+"""Колоночное хранилище чанков с отображением в память и ленивым декодированием."""
+
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+
+
+# ------------------ Класс для хранения информации о фрагменте ------------------
+class Chunk:
+    """
+    Фрагмент документа и его происхождение: страницы (с 1; None для TXT), символьный диапазон
+    [char_start, char_end) в тексте документа и заголовок раздела, в котором он начинается.
+    """
+
+    __slots__ = ("text", "file_path", "title", "distance", "authors", "page", "page_end", "char_start", "char_end", "section")
+
+    def __init__(
+        self,
+        text: str,
+        file_path: str,
+        dist: np.float32 = None,
+        title: str = None,
+        authors: List[str] = None,
+        page: Optional[int] = None,
+        page_end: Optional[int] = None,
+        char_start: Optional[int] = None,
+        char_end: Optional[int] = None,
+        section: Optional[str] = None,
+    ):
+        self.text = text
+        self.file_path = file_path
+        self.title = title
+        self.distance = dist
+        self.authors = authors or []
+        self.page = page
+        self.page_end = page_end
+        self.char_start = char_start
+        self.char_end = char_end
+        self.section = section
+
+    def to_dict(self):
+        """Возвращает словарь для совместимости с сохранением/выводом."""
+        return {
+            "text": self.text,
+            "file_path": self.file_path,
+            "title": self.title,
+            "distance": self.distance,
+            "authors": self.authors,
+            "page": self.page,
+            "page_end": self.page_end,
+            "char_start": self.char_start,
+            "char_end": self.char_end,
+            "section": self.section,
+        }
+
+    def __getstate__(self):
+        return {name: getattr(self, name, None) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # старые pickle-файлы хранят состояние как __dict__ без части полей
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        self.authors = []
+        for name in self.__slots__:
+            setattr(self, name, state.get(name, getattr(self, name, None)))
+
+
+# ------------------ Хранилище ------------------
+class ChunkStore:
+    """
+    Хранилище чанков в виде колонок:
+    - texts.bin   — все тексты подряд в UTF-8
+    - offsets.npy — границы текстов в texts.bin (n + 1 значений)
+    - <поле>.npy  — номер значения в таблице для file_path, title, authors и section
+    - tables.json — таблицы уникальных значений (интернирование путей, заголовков, авторов, разделов)
+    - page.npy, page_end.npy, char_start.npy, char_end.npy — происхождение чанка (-1 — нет данных)
+    - deleted.npy — номера удалённых чанков (надгробия; сами тексты остаются на месте)
+    - tags.npz    — пользовательские метки: для каждой метки отсортированные номера чанков
+
+    При загрузке texts.bin отображается в память, а текст чанка декодируется только
+    при обращении к нему. Новые чанки копятся в памяти и дописываются в конец при save().
+    """
+
+    TEXTS_FILE = "texts.bin"
+    OFFSETS_FILE = "offsets.npy"
+    TABLES_FILE = "tables.json"
+    DELETED_FILE = "deleted.npy"
+    TAGS_FILE = "tags.npz"
+    INTERNED_FIELDS = ("file_path", "title", "authors", "section")
+    NUMERIC_FIELDS = ("page", "page_end", "char_start", "char_end")
+
+    def __init__(self):
+        self._path: Optional[str] = None
+        self._blob = np.zeros(0, dtype=np.uint8)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(0, dtype=np.int32) for name in self.INTERNED_FIELDS}
+        self._tables: Dict[str, List[Any]] = {name: [] for name in self.INTERNED_FIELDS}
+        self._lookup: Optional[Dict[str, Dict[Any, int]]] = None
+        self._tail_texts: List[str] = []
+        self._tail_columns: Dict[str, List[int]] = {name: [] for name in self.INTERNED_FIELDS + self.NUMERIC_FIELDS}
+        self._columns.update({name: np.zeros(0, dtype=np.int64) for name in self.NUMERIC_FIELDS})
+        self.deleted: Set[int] = set()
+        # метка -> отсортированные номера чанков (см. tag/untag и retrieval/metadata.py)
+        self.tags: Dict[str, np.ndarray] = {}
+
+    # ------------------ Запись ------------------
+    @staticmethod
+    def _key(name: str, value: Any) -> Any:
+        return tuple(value) if name == "authors" else value
+
+    def _intern(self, name: str, value: Any) -> int:
+        if self._lookup is None:
+            self._lookup = {
+                field: {self._key(field, v): i for i, v in enumerate(values)}
+                for field, values in self._tables.items()
+            }
+        key = self._key(name, value)
+        idx = self._lookup[name].get(key)
+        if idx is None:
+            idx = len(self._tables[name])
+            self._tables[name].append(list(value) if name == "authors" else value)
+            self._lookup[name][key] = idx
+        return idx
+
+    def append(self, chunk: Chunk):
+        self._tail_texts.append(chunk.text)
+        for name in self.INTERNED_FIELDS:
+            self._tail_columns[name].append(self._intern(name, getattr(chunk, name, None)))
+        for name in self.NUMERIC_FIELDS:
+            value = getattr(chunk, name, None)
+            self._tail_columns[name].append(-1 if value is None else int(value))
+
+    def extend(self, chunks: Iterable[Chunk]):
+        for chunk in chunks:
+            self.append(chunk)
+
+    def delete(self, ids: Iterable[int]):
+        """Помечает чанки удалёнными; номера остальных чанков не меняются."""
+        self.deleted.update(int(i) for i in ids)
+
+    def is_deleted(self, i: int) -> bool:
+        return i in self.deleted
+
+    def tag(self, ids: Iterable[int], *tags: str):
+        """Добавляет чанкам ids пользовательские метки (коллекция, проект, источник...)."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        for tag in tags:
+            self.tags[tag] = np.union1d(self.tags.get(tag, np.zeros(0, dtype=np.int64)), ids)
+
+    def untag(self, ids: Iterable[int], *tags: str):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        for tag in tags:
+            if tag in self.tags:
+                remaining = np.setdiff1d(self.tags[tag], ids, assume_unique=True)
+                if len(remaining):
+                    self.tags[tag] = remaining
+                else:
+                    del self.tags[tag]
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Chunk]) -> "ChunkStore":
+        store = cls()
+        store.extend(chunks)
+        return store
+
+    # ------------------ Чтение ------------------
+    @property
+    def persisted(self) -> int:
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.persisted + len(self._tail_texts)
+
+    def _position(self, i: int) -> int:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(f"Чанк {i} вне диапазона 0..{n - 1}")
+        return int(i)
+
+    def text(self, i: int) -> str:
+        i = self._position(i)
+        if i < self.persisted:
+            return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+        return self._tail_texts[i - self.persisted]
+
+    def field(self, name: str, i: int) -> Any:
+        i = self._position(i)
+        if i < self.persisted:
+            value_id = self._columns[name][i]
+        else:
+            value_id = self._tail_columns[name][i - self.persisted]
+        if name in self.NUMERIC_FIELDS:
+            return None if value_id < 0 else int(value_id)
+        value = self._tables[name][value_id]
+        return list(value) if name == "authors" else value
+
+    def column(self, name: str) -> np.ndarray:
+        """Колонка поля целиком (номера значений в table(name) или числа, -1 — нет данных)."""
+        tail = np.asarray(self._tail_columns[name], dtype=self._dtype(name))
+        return np.concatenate([np.asarray(self._columns[name]), tail]) if len(tail) else np.asarray(self._columns[name])
+
+    def table(self, name: str) -> List[Any]:
+        """Уникальные значения интернированного поля; номер значения — позиция в списке."""
+        return self._tables[name]
+
+    def entry(self, i: int) -> Dict[str, Any]:
+        """Словарь как Chunk.to_dict(), но без создания объекта Chunk."""
+        entry = {"text": self.text(i), "distance": None}
+        for name in self.INTERNED_FIELDS + self.NUMERIC_FIELDS:
+            entry[name] = self.field(name, i)
+        return entry
+
+    def __getitem__(self, i: int) -> Chunk:
+        entry = self.entry(i)
+        entry.pop("distance")
+        return Chunk(**entry)
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self[i]
+
+    # ------------------ Сохранение и загрузка ------------------
+    def save(self, directory: str):
+        """
+        Сохраняет хранилище в папку. Если оно уже лежит в этой папке, в texts.bin
+        дописываются только новые тексты; offsets и колонки переписываются целиком
+        (это несколько байт на чанк).
+        """
+        os.makedirs(directory, exist_ok=True)
+        texts_path = os.path.join(directory, self.TEXTS_FILE)
+        same_place = (
+            self._path is not None
+            and os.path.abspath(self._path) == os.path.abspath(directory)
+            and os.path.exists(texts_path)
+            and os.path.getsize(texts_path) >= int(self._offsets[-1])
+        )
+
+        encoded = [text.encode("utf-8") for text in self._tail_texts]
+        tail_offsets = self._offsets[-1] + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        offsets = np.concatenate([np.asarray(self._offsets), tail_offsets])
+        columns = {
+            name: np.concatenate([np.asarray(self._columns[name]), np.asarray(self._tail_columns[name], dtype=self._dtype(name))])
+            for name in self.INTERNED_FIELDS + self.NUMERIC_FIELDS
+        }
+
+        old_blob, self._blob = self._blob, None
+        if not same_place:
+            source = os.path.join(self._path, self.TEXTS_FILE) if self._path is not None else None
+            if source is not None and os.path.exists(source):
+                shutil.copyfile(source, texts_path)
+            else:
+                with open(texts_path, "wb") as f:
+                    f.write(bytes(old_blob[:self._offsets[-1]]))
+        del old_blob
+        with open(texts_path, "r+b") as f:
+            # обрезаем возможный хвост от прерванного сохранения и дописываем новые тексты
+            f.seek(int(self._offsets[-1]))
+            f.truncate()
+            for b in encoded:
+                f.write(b)
+
+        self._offsets = offsets
+        self._columns = columns
+        self._save_array(os.path.join(directory, self.OFFSETS_FILE), offsets)
+        for name, column in columns.items():
+            self._save_array(os.path.join(directory, f"{name}.npy"), column)
+        self._save_array(os.path.join(directory, self.DELETED_FILE), np.array(sorted(self.deleted), dtype=np.int64))
+        self._save_tags(os.path.join(directory, self.TAGS_FILE))
+        tmp_tables = os.path.join(directory, self.TABLES_FILE + ".tmp")
+        with open(tmp_tables, "w", encoding="utf-8") as f:
+            json.dump(self._tables, f, ensure_ascii=False)
+        os.replace(tmp_tables, os.path.join(directory, self.TABLES_FILE))
+
+        self._tail_texts = []
+        self._tail_columns = {name: [] for name in self.INTERNED_FIELDS + self.NUMERIC_FIELDS}
+        self._path = directory
+        self._blob = self._map_blob(texts_path, int(offsets[-1]))
+
+    @classmethod
+    def _dtype(cls, name: str):
+        return np.int64 if name in cls.NUMERIC_FIELDS else np.int32
+
+    @staticmethod
+    def _save_array(path: str, array: np.ndarray):
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    def _save_tags(self, path: str):
+        names = sorted(self.tags)
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(self.tags[name]) for name in names], out=offsets[1:])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                names=np.frombuffer(json.dumps(names, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+                offsets=offsets,
+                ids=np.concatenate([self.tags[name] for name in names]) if names else np.zeros(0, dtype=np.int64),
+            )
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _map_blob(path: str, size: int) -> np.ndarray:
+        if size == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode="r", shape=(size,))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ChunkStore":
+        store = cls()
+        mmap_mode = "r" if mmap else None
+        offsets = np.load(os.path.join(directory, cls.OFFSETS_FILE), mmap_mode=mmap_mode)
+        store._offsets = np.asarray(offsets, dtype=np.int64)
+        with open(os.path.join(directory, cls.TABLES_FILE), "r", encoding="utf-8") as f:
+            store._tables.update(json.load(f))
+        for name in cls.INTERNED_FIELDS + cls.NUMERIC_FIELDS:
+            path = os.path.join(directory, f"{name}.npy")
+            if os.path.exists(path):
+                store._columns[name] = np.load(path, mmap_mode=mmap_mode)
+            else:
+                # хранилище из старой версии: колонки нет, у всех чанков значение None
+                default = -1 if name in cls.NUMERIC_FIELDS else store._intern(name, None)
+                store._columns[name] = np.full(store.persisted, default, dtype=cls._dtype(name))
+        deleted_path = os.path.join(directory, cls.DELETED_FILE)
+        if os.path.exists(deleted_path):
+            store.deleted = set(np.load(deleted_path).tolist())
+        tags_path = os.path.join(directory, cls.TAGS_FILE)
+        if os.path.exists(tags_path):
+            with np.load(tags_path) as data:
+                names = json.loads(data["names"].tobytes().decode("utf-8"))
+                offsets, ids = data["offsets"], data["ids"]
+                store.tags = {name: ids[offsets[i]:offsets[i + 1]].copy() for i, name in enumerate(names)}
+        texts_path = os.path.join(directory, cls.TEXTS_FILE)
+        if mmap:
+            store._blob = cls._map_blob(texts_path, int(store._offsets[-1]))
+        else:
+            with open(texts_path, "rb") as f:
+                store._blob = np.frombuffer(f.read(int(store._offsets[-1])), dtype=np.uint8)
+        store._path = directory
+        return store
@@ -0,0 +1,131 @@
+"""
+Хранилище эмбеддингов на диске: матрица (число чанков, dim), строка i — вектор чанка i.
+
+Эмбеддинги — самая дорогая часть загрузки, а внутри FAISS они хранятся в виде, который
+зависит от типа индекса (PQ и SQ8 их не восстанавливают). Отдельная копия позволяет
+перестроить индекс любого типа, сменить параметры или число шардов без прогона модели.
+"""
+
+import json
+import os
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Векторы дописываются в конец vectors.bin (float16 по умолчанию — вдвое меньше float32,
+    для нормализованных эмбеддингов потеря точности не влияет на поиск), читаются через memmap.
+    meta.json: размерность, тип, модель, число строк и "дыры" — строки чанков, добавленных
+    до появления хранилища (их векторов нет, они заполнены нулями).
+    Строки за пределами count в файле — недописанный хвост, при следующей записи он обрезается.
+    """
+
+    DATA_FILE = "vectors.bin"
+    META_FILE = "meta.json"
+
+    def __init__(self, directory: str, model: Optional[str] = None, dtype: str = "float16"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.stored_model: Optional[str] = None
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.holes: List[Tuple[int, int]] = []
+        meta_path = os.path.join(directory, self.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dtype = np.dtype(meta["dtype"])
+            self.dim = meta["dim"]
+            self.count = meta["count"]
+            self.holes = [tuple(hole) for hole in meta.get("holes", [])]
+            # модель, которой записаны строки; дописывать векторы другой модели нельзя
+            self.stored_model = meta["model"] if self.count else None
+        self._view: Optional[np.ndarray] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.DATA_FILE)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Вся матрица только для чтения (memmap); не копируется в память."""
+        if self._view is None:
+            if self.count == 0:
+                return np.zeros((0, self.dim or 0), dtype=self.dtype)
+            self._view = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.count, self.dim))
+        return self._view
+
+    # ------------------ Запись ------------------
+    def append(self, start: int, embeddings: np.ndarray):
+        """Записывает векторы чанков start, start + 1, ...; пропущенные строки становятся дырами."""
+        if self.stored_model is not None and self.model is not None and self.stored_model != self.model:
+            raise ValueError(f"В {self.directory} эмбеддинги модели {self.stored_model}, а не {self.model}")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Размерность {embeddings.shape[1]} не совпадает с хранилищем ({self.dim})")
+        if start < self.count:
+            raise ValueError(f"Эмбеддинг чанка {start} уже записан")
+        row_bytes = self.dim * self.dtype.itemsize
+        mode = "r+b" if os.path.exists(self.path) else "wb"
+        with open(self.path, mode) as f:
+            f.seek(self.count * row_bytes)
+            if start > self.count:
+                f.write(bytes((start - self.count) * row_bytes))
+                self.holes.append((self.count, start))
+            f.write(np.ascontiguousarray(embeddings, dtype=self.dtype).tobytes())
+            f.truncate()
+        self.count = start + len(embeddings)
+        self.stored_model = self.stored_model or self.model
+        self._view = None
+
+    def truncate(self, count: int):
+        """Отбрасывает строки с номера count (их векторы не дошли до индекса); файл обрежется при следующей записи."""
+        if count >= self.count:
+            return
+        self.count = max(count, 0)
+        self.holes = [(lo, min(hi, self.count)) for lo, hi in self.holes if lo < self.count]
+        self._view = None
+
+    def flush(self):
+        """Фиксирует число строк; векторы к этому моменту уже на диске."""
+        meta = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "model": self.stored_model or self.model,
+            "count": self.count,
+            "holes": [list(hole) for hole in self.holes],
+        }
+        meta_path = os.path.join(self.directory, self.META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    # ------------------ Чтение ------------------
+    def covers(self, rows: np.ndarray) -> bool:
+        """Есть ли в хранилище настоящие векторы для всех строк rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return True
+        if rows.min() < 0 or rows.max() >= self.count:
+            return False
+        return not any(np.any((rows >= lo) & (rows < hi)) for lo, hi in self.holes)
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        """Векторы строк rows в float32 (копия)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.ascontiguousarray(self.vectors[rows], dtype=np.float32)
+
+    def iter_blocks(self, rows: np.ndarray, block_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(строки, векторы float32) блоками по block_size — в памяти не больше одного блока."""
+        rows = np.asarray(rows, dtype=np.int64)
+        for i in range(0, len(rows), block_size):
+            block = rows[i:i + block_size]
+            yield block, self.get(block)
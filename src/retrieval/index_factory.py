@@ -0,0 +1,207 @@
+"""Построение индекса FAISS по описанию: HNSW, IVF-Flat, IVF-PQ/OPQ и скалярное квантование."""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Optional
+
+from resources.lazy import lazy_import
+
+faiss = lazy_import("faiss")
+
+
+class IndexSpec:
+    """
+    Описание индекса.
+    kind:
+    - "hnsw"      — HNSW{m},Flat (как раньше; float32, самый точный и самый большой)
+    - "hnsw_sq"   — HNSW{m},SQ8 (в 4 раза меньше памяти)
+    - "flat"      — точный перебор
+    - "sq"        — SQ8 без графа (в 4 раза меньше памяти, перебор)
+    - "ivf_flat"  — IVF{nlist},Flat
+    - "ivf_sq"    — IVF{nlist},SQ8
+    - "ivf_pq"    — IVF{nlist},PQ{pq_m}x{pq_bits} (в dim*4/pq_m раз меньше памяти)
+    - "opq_ivf_pq"— OPQ{pq_m},IVF{nlist},PQ{pq_m}x{pq_bits} (поворот перед PQ, выше recall)
+    Вместо kind можно передать готовую строку фабрики FAISS: IndexSpec(factory="IVF4096,PQ64").
+    IVF/PQ-индексы требуют обучения: до train_size векторов ретривер копит эмбеддинги в памяти.
+    """
+
+    KINDS = ("hnsw", "hnsw_sq", "flat", "sq", "ivf_flat", "ivf_sq", "ivf_pq", "opq_ivf_pq")
+
+    def __init__(
+        self,
+        kind: str = "hnsw",
+        m: int = 32,
+        ef_construction: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        nlist: int = 1024,
+        nprobe: Optional[int] = None,
+        pq_m: int = 16,
+        pq_bits: int = 8,
+        factory: Optional[str] = None,
+        train_size: Optional[int] = None,
+    ):
+        if factory is None and kind not in self.KINDS:
+            raise ValueError(f"Неизвестный тип индекса: {kind}")
+        self.kind = kind
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.factory = factory
+        self._train_size = train_size
+
+    def factory_string(self) -> str:
+        if self.factory is not None:
+            return self.factory
+        return {
+            "hnsw": f"HNSW{self.m},Flat",
+            "hnsw_sq": f"HNSW{self.m},SQ8",
+            "flat": "Flat",
+            "sq": "SQ8",
+            "ivf_flat": f"IVF{self.nlist},Flat",
+            "ivf_sq": f"IVF{self.nlist},SQ8",
+            "ivf_pq": f"IVF{self.nlist},PQ{self.pq_m}x{self.pq_bits}",
+            "opq_ivf_pq": f"OPQ{self.pq_m},IVF{self.nlist},PQ{self.pq_m}x{self.pq_bits}",
+        }[self.kind]
+
+    @property
+    def centroids(self) -> int:
+        """Наибольшее число центроидов среди обучаемых частей индекса: меньше векторов FAISS не обучит."""
+        factory = self.factory_string()
+        centroids = 1
+        ivf = re.search(r"IVF(\d+)", factory)
+        if ivf:
+            centroids = max(centroids, int(ivf.group(1)))
+        pq = re.search(r"(?<!O)PQ\d+(?:x(\d+))?", factory)
+        if pq:
+            centroids = max(centroids, 2 ** int(pq.group(1) or 8))
+        if "OPQ" in factory:
+            # OPQ обучает собственный PQ на 256 центроидов
+            centroids = max(centroids, 256)
+        return centroids
+
+    @property
+    def train_size(self) -> int:
+        """Сколько векторов накопить перед обучением (FAISS советует от 39 на центроид)."""
+        if self._train_size is not None:
+            return max(self._train_size, self.centroids)
+        return 39 * self.centroids
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "pq_m": self.pq_m,
+            "pq_bits": self.pq_bits,
+            "factory": self.factory,
+            "train_size": self._train_size,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexSpec":
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, IndexSpec) and self.to_dict() == other.to_dict()
+
+    def build(self, dim: int) -> faiss.Index:
+        """
+        Строит пустой индекс, в который векторы добавляются с номерами чанков (add_with_ids).
+        IVF хранит номера сам; остальные индексы оборачиваются в IndexIDMap2.
+        """
+        index = faiss.index_factory(dim, self.factory_string())
+        hnsw = _find(index, "hnsw")
+        if hnsw is not None:
+            if self.ef_construction is not None:
+                hnsw.efConstruction = self.ef_construction
+            if self.ef_search is not None:
+                hnsw.efSearch = self.ef_search
+        ivf = _find_ivf(index)
+        if ivf is not None and self.nprobe is not None:
+            ivf.nprobe = self.nprobe
+        if ivf is not None:
+            # IndexIDMap поверх IVF ломается при remove_ids: IVF не перенумеровывает векторы
+            return index
+        return faiss.IndexIDMap2(index)
+
+    def __repr__(self):
+        return f"IndexSpec({self.factory_string()!r})"
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """Снимает обёртки IndexIDMap/IndexPreTransform и приводит индекс к настоящему классу."""
+    index = faiss.downcast_index(index)
+    while True:
+        if isinstance(index, faiss.IndexPreTransform):
+            index = faiss.downcast_index(index.index)
+        elif isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            index = faiss.downcast_index(index.index)
+        else:
+            return index
+
+
+def _find(index: faiss.Index, attr: str):
+    inner = _unwrap(index)
+    return getattr(inner, attr, None)
+
+
+def _find_ivf(index: faiss.Index):
+    inner = _unwrap(index)
+    return inner if isinstance(inner, faiss.IndexIVF) else None
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, sel=None):
+    """
+    Параметры одного поиска (не меняют сам индекс, поэтому безопасны для параллельных запросов).
+    sel — faiss.IDSelector: индекс рассматривает только векторы с номерами из него; значения
+    nprobe и ef_search, которые не переданы, берутся из индекса (у объекта параметров свои умолчания).
+    Возвращает None, если переопределять нечего.
+    """
+    inner = _unwrap(index)
+    extra = {"sel": sel} if sel is not None else {}
+    params = None
+    if isinstance(inner, faiss.IndexHNSW) and (ef_search is not None or sel is not None):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search if ef_search is not None else inner.hnsw.efSearch, **extra)
+    elif isinstance(inner, faiss.IndexIVF) and (nprobe is not None or sel is not None):
+        params = faiss.SearchParametersIVF(nprobe=nprobe if nprobe is not None else inner.nprobe, **extra)
+    elif sel is not None:
+        params = faiss.SearchParameters(sel=sel)
+
+    if params is not None and isinstance(faiss.downcast_index(index), faiss.IndexPreTransform):
+        # конструктор с аргументами держит ссылку на вложенные параметры
+        params = faiss.SearchParametersPreTransform(index_params=params)
+    return params
+
+
+def filtered_budgets(index: faiss.Index, top_k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Пары (nprobe, ef_search) для повторных поисков с IDSelector: от заданных (или индексных)
+    значений, каждый раз вдвое больше, пока не дойдёт до полного перебора (все списки IVF,
+    ef_search = ntotal). При сильном фильтре HNSW и IVF находят меньше top_k подходящих
+    векторов, и недобравшие строки ищутся заново со следующей парой.
+    """
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        ef = max(ef_search if ef_search is not None else inner.hnsw.efSearch, top_k)
+        while True:
+            yield nprobe, ef
+            if ef >= index.ntotal:
+                return
+            ef = min(index.ntotal, ef * 2)
+    elif isinstance(inner, faiss.IndexIVF):
+        probes = min(nprobe if nprobe is not None else inner.nprobe, inner.nlist)
+        while True:
+            yield probes, ef_search
+            if probes >= inner.nlist:
+                return
+            probes = min(inner.nlist, probes * 2)
+    else:
+        yield nprobe, ef_search
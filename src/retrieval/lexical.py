@@ -0,0 +1,203 @@
+"""
+Лексический поиск: инвертированный индекс по леммам чанков с ранжированием BM25.
+
+Находит то, что плохо ловят эмбеддинги: имена, формулы, идентификаторы, редкие термины.
+Номера чанков те же, что у ретривера (глобальные и для ShardedRetriever), поэтому
+результаты сливаются с плотным поиском по chunk_id. Запрос не требует прогона модели.
+Хранится рядом с FAISS-индексом: {index_path}.lexical.npz
+"""
+
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+LEXICAL_SUFFIX = ".lexical.npz"
+
+
+def lexical_path(index_path: str) -> str:
+    return index_path + LEXICAL_SUFFIX
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова лемматизированного текста; та же разбивка для чанков и для запросов."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    Инвертированный индекс: для каждой леммы — номера чанков и частоты (array('i'), 8 байт на вхождение).
+    - k1, b: параметры BM25
+    - удалённые чанки сразу исключаются из выдачи, числа чанков и средней длины;
+      их вхождения (и с ними документные частоты лемм) вычищает compact()
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self._ids: List[array] = []
+        self._freqs: List[array] = []
+        # длина каждого чанка в словах; номер чанка — позиция
+        self.lengths = array("i")
+        self.deleted: Set[int] = set()
+        self._docs = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def docs(self) -> int:
+        """Сколько живых чанков участвует в статистике BM25."""
+        return self._docs
+
+    def add(self, start: int, texts: Iterable[str]):
+        """Добавляет лемматизированные тексты чанков start, start + 1, ..."""
+        if start < len(self.lengths):
+            raise ValueError(f"Чанк {start} уже есть в лексическом индексе")
+        # чанки без текста для индекса (например, добавленные в обход DatabaseManager) — пустые
+        self.lengths.extend([0] * (start - len(self.lengths)))
+        for chunk_id, text in enumerate(texts, start=start):
+            tokens = tokenize(text)
+            for term, freq in Counter(tokens).items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self._ids)
+                    self._ids.append(array("i"))
+                    self._freqs.append(array("i"))
+                self._ids[term_id].append(chunk_id)
+                self._freqs[term_id].append(freq)
+            self.lengths.append(len(tokens))
+            if tokens:
+                self._docs += 1
+                self._total_length += len(tokens)
+
+    def remove(self, ids: Iterable[int]):
+        for chunk_id in ids:
+            chunk_id = int(chunk_id)
+            if 0 <= chunk_id < len(self.lengths) and chunk_id not in self.deleted:
+                self.deleted.add(chunk_id)
+                if self.lengths[chunk_id]:
+                    self._docs -= 1
+                    self._total_length -= self.lengths[chunk_id]
+
+    def compact(self):
+        """Убирает вхождения удалённых чанков из списков; номера чанков не меняются."""
+        if not self.deleted:
+            return
+        deleted = np.fromiter(self.deleted, dtype=np.int32, count=len(self.deleted))
+        for term_id, ids in enumerate(self._ids):
+            ids_np = np.frombuffer(ids, dtype=np.int32)
+            keep = ~np.isin(ids_np, deleted)
+            if not keep.all():
+                self._ids[term_id] = array("i", ids_np[keep].tobytes())
+                self._freqs[term_id] = array("i", np.frombuffer(self._freqs[term_id], dtype=np.int32)[keep].tobytes())
+        for chunk_id in self.deleted:
+            self.lengths[chunk_id] = 0
+
+    # ------------------ Поиск ------------------
+    def search(self, query: str, top_k: int = 5, exclude: Optional[Set[int]] = None, include: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        BM25 по леммам запроса: [(номер чанка, оценка)] по убыванию оценки, только чанки
+        хотя бы с одной леммой запроса. exclude — ещё номера, которые не нужно отдавать;
+        include — если задан, отдаются только эти номера (фильтр по метаданным).
+        """
+        terms = [self.vocab[term] for term in set(tokenize(query)) if term in self.vocab]
+        if not terms or self._docs == 0:
+            return []
+        # считаются только вхождения лемм запроса: стоимость — число этих вхождений, а не число чанков
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        avg_length = self._total_length / self._docs
+        all_ids, all_scores = [], []
+        for term_id in terms:
+            ids = np.frombuffer(self._ids[term_id], dtype=np.int32)
+            if len(ids) == 0:
+                continue
+            freqs = np.frombuffer(self._freqs[term_id], dtype=np.int32).astype(np.float32)
+            idf = math.log(1.0 + (self._docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[ids] / avg_length)
+            all_ids.append(ids)
+            all_scores.append(idf * freqs * (self.k1 + 1.0) / (freqs + norm))
+        if not all_ids:
+            return []
+        if len(all_ids) == 1:
+            candidates, scores = all_ids[0].astype(np.int64), all_scores[0]
+        else:
+            # сумма по леммам для каждого чанка из объединения списков
+            candidates, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+            candidates = candidates.astype(np.int64)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores), minlength=len(candidates))
+
+        if include is not None:
+            include = np.asarray(include, dtype=np.int64)
+            if len(include) > 1 and np.any(include[1:] < include[:-1]):
+                include = np.sort(include)
+            positions = np.searchsorted(include, candidates)
+            keep = positions < len(include)
+            keep[keep] = include[positions[keep]] == candidates[keep]
+            candidates, scores = candidates[keep], scores[keep]
+        keep = scores > 0
+        candidates, scores = candidates[keep], scores[keep]
+
+        # удалённые проверяются по множествам только у лучших кандидатов, по порядку оценок
+        hidden = (self.deleted, exclude) if exclude else (self.deleted,)
+        order = np.argsort(-scores, kind="stable")
+        results = []
+        for position in order:
+            chunk_id = int(candidates[position])
+            if any(chunk_id in ids for ids in hidden):
+                continue
+            results.append((chunk_id, float(scores[position])))
+            if len(results) == top_k:
+                break
+        return results
+
+    # ------------------ Сохранение и загрузка ------------------
+    def save(self, path: str):
+        """Словарь и списки вхождений в формате CSR в одном .npz (без pickle)."""
+        offsets = np.zeros(len(self._ids) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in self._ids], out=offsets[1:])
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                offsets=offsets,
+                ids=np.frombuffer(b"".join(ids.tobytes() for ids in self._ids), dtype=np.int32),
+                freqs=np.frombuffer(b"".join(freqs.tobytes() for freqs in self._freqs), dtype=np.int32),
+                lengths=np.frombuffer(self.lengths, dtype=np.int32),
+                deleted=np.array(sorted(self.deleted), dtype=np.int64),
+                params=np.array([self.k1, self.b]),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            k1, b = data["params"]
+            index = cls(k1=float(k1), b=float(b))
+            raw_terms = data["terms"].tobytes().decode("utf-8")
+            terms = raw_terms.split("\n") if raw_terms else []
+            offsets, ids, freqs = data["offsets"], data["ids"], data["freqs"]
+            index.vocab = {term: term_id for term_id, term in enumerate(terms)}
+            index._ids = [array("i", ids[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(terms))]
+            index._freqs = [array("i", freqs[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(terms))]
+            index.lengths = array("i", data["lengths"].astype(np.int32).tobytes())
+            index.deleted = {int(i) for i in data["deleted"]}
+        live = np.frombuffer(index.lengths, dtype=np.int32).copy()
+        if index.deleted:
+            live[list(index.deleted)] = 0
+        index._docs = int(np.count_nonzero(live))
+        index._total_length = int(live.sum())
+        return index
+
+    @classmethod
+    def load_if_exists(cls, path: str) -> Optional["LexicalIndex"]:
+        return cls.load(path) if os.path.exists(path) else None
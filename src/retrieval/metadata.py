@@ -0,0 +1,113 @@
+"""
+Индекс метаданных чанков для фильтрованного поиска.
+
+Фильтр — словарь {поле: условие}. Условия по разным полям объединяются через И,
+список значений одного поля — через ИЛИ:
+- file_path, title, section — значение или список значений (точное совпадение)
+- authors — автор или список авторов: подходит чанк, у которого есть хотя бы один из них
+- tags — метка или список меток (ChunkStore.tag)
+- page, page_end, char_start, char_end — число или диапазон (lo, hi) включительно, None — без границы
+- ids — явный список номеров чанков
+Результат — отсортированный массив номеров живых чанков; ретривер передаёт его в FAISS
+как IDSelector или, если он короткий, ищет по нему точным перебором.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from retrieval.chunk_store import ChunkStore
+
+FILTER_FIELDS = ChunkStore.INTERNED_FIELDS + ChunkStore.NUMERIC_FIELDS + ("tags", "ids")
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def _values(condition: Any) -> List[Any]:
+    return list(condition) if isinstance(condition, (list, tuple, set, frozenset)) else [condition]
+
+
+def _union(parts: List[np.ndarray]) -> np.ndarray:
+    if not parts:
+        return _EMPTY
+    if len(parts) == 1:
+        return parts[0]
+    return np.unique(np.concatenate(parts))
+
+
+class MetadataIndex:
+    """
+    Списки вхождений по интернированным полям ChunkStore: для каждого значения — номера
+    его чанков по возрастанию (порядок чанков по номеру значения и границы, как CSR).
+    Строятся при первом фильтре по полю и перестраиваются, когда в хранилище прибавились чанки.
+    Метки хранит сам ChunkStore уже в виде отсортированных массивов.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        # поле -> (число чанков при построении, номера чанков по значениям, границы значений)
+        self._postings: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+
+    def _field_postings(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        size = len(self.store)
+        cached = self._postings.get(name)
+        if cached is None or cached[0] != size:
+            column = self.store.column(name)
+            # устойчивая сортировка: внутри одного значения номера чанков остаются по возрастанию
+            order = np.argsort(column, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(column[order], np.arange(len(self.store.table(name)) + 1))
+            cached = self._postings[name] = (size, order, bounds)
+        return cached[1], cached[2]
+
+    def _match_interned(self, name: str, values: List[Any]) -> np.ndarray:
+        table = self.store.table(name)
+        if name == "authors":
+            wanted = set(values)
+            value_ids = [i for i, authors in enumerate(table) if authors and wanted.intersection(authors)]
+        else:
+            wanted = set(values)
+            value_ids = [i for i, value in enumerate(table) if value in wanted]
+        if not value_ids:
+            return _EMPTY
+        order, bounds = self._field_postings(name)
+        return _union([order[bounds[v]:bounds[v + 1]] for v in value_ids])
+
+    def _match_range(self, name: str, condition: Any) -> np.ndarray:
+        lo, hi = condition if isinstance(condition, (list, tuple)) else (condition, condition)
+        column = self.store.column(name)
+        mask = column >= (0 if lo is None else lo)
+        if hi is not None:
+            mask &= column <= hi
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def _match(self, name: str, condition: Any) -> np.ndarray:
+        if name == "ids":
+            ids = np.unique(np.asarray(_values(condition), dtype=np.int64))
+            return ids[(ids >= 0) & (ids < len(self.store))]
+        if name == "tags":
+            return _union([self.store.tags[tag] for tag in _values(condition) if tag in self.store.tags])
+        if name in ChunkStore.NUMERIC_FIELDS:
+            return self._match_range(name, condition)
+        return self._match_interned(name, _values(condition))
+
+    def select(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Отсортированные номера живых чанков, подходящих под фильтр."""
+        unknown = set(filter) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Неизвестные поля фильтра: {sorted(unknown)}; доступны {FILTER_FIELDS}")
+        result = None
+        for name, condition in filter.items():
+            ids = self._match(name, condition)
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if len(result) == 0:
+                return _EMPTY
+        if result is None:
+            result = np.arange(len(self.store), dtype=np.int64)
+        if self.store.deleted:
+            result = result[~np.isin(result, np.fromiter(self.store.deleted, dtype=np.int64, count=len(self.store.deleted)))]
+        return result
+
+
+def filter_key(filter: Dict[str, Any]) -> Tuple:
+    """Хешируемое представление фильтра (для кешей и группировки запросов)."""
+    return tuple(sorted((name, tuple(_values(condition))) for name, condition in filter.items()))
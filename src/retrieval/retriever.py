@@ -1,71 +1,562 @@
-from typing import List
-import faiss
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import json
+import os
+import threading
 import numpy as np
 import pickle
 
-# ------------------ Класс для хранения информации о фрагменте ------------------
-class Chunk:
-    def __init__(self, text: str, file_path: str, dist: np.float32 = None, title: str = None, authors: List[str] = None):
-        self.text = text
-        self.file_path = file_path
-        self.title = title
-        self.distance = dist
-        self.authors = authors or []
-
-    def to_dict(self):
-        """Возвращает словарь для совместимости с сохранением/выводом."""
-        return {
-            "text": self.text,
-            "file_path": self.file_path,
-            "title": self.title,
-            "distance": self.distance,
-            "authors": self.authors
-        }
+from retrieval.chunk_store import Chunk, ChunkStore
+from retrieval.embedding_store import EmbeddingStore
+from retrieval.index_factory import IndexSpec, filtered_budgets, search_parameters
+from retrieval.metadata import MetadataIndex
+from resources.lazy import lazy_import
+from resources.metrics import metrics
+
+faiss = lazy_import("faiss")
+
+LEGACY_COLLECTOR_FILE = "articles_texts.pkl"
+COLLECTOR_DIR = "articles_chunks"
+# рядом с индексом: описание IndexSpec и эмбеддинги, ещё не попавшие в необученный индекс
+SPEC_SUFFIX = ".spec.json"
+PENDING_SUFFIX = ".pending.npz"
+
+
+def default_paths(data_path: str = "data") -> Tuple[str, str]:
+    """Пути к индексу и хранилищу чанков; если хранилища ещё нет, а старый pickle есть — путь к pickle."""
+    index_path = os.path.join(data_path, "articles.index")
+    collector_path = os.path.join(data_path, COLLECTOR_DIR)
+    legacy_path = os.path.join(data_path, LEGACY_COLLECTOR_FILE)
+    if not os.path.isdir(collector_path) and os.path.exists(legacy_path):
+        collector_path = legacy_path
+    return index_path, collector_path
+
 
 # ------------------ Ретривер ------------------
 class VectorRetriever:
-    def __init__(self, dim: int, m: int = 32):
+    """
+    FAISS-индекс + хранилище чанков.
+    Идентификатор чанка — его номер в collector; векторы добавляются в индекс с этими номерами
+    (IndexIDMap2 или собственные номера IVF), поэтому они не меняются ни при удалении, ни при перестройке.
+    Поиск с фильтром по метаданным (retrieval/metadata.py) ограничивает кандидатов внутри FAISS
+    через IDSelector; если под фильтр подходит не больше exact_filter_max чанков или не больше
+    доли exact_filter_fraction индекса, их векторы перебираются точно — графу HNSW и спискам IVF
+    при сильном фильтре не хватает кандидатов.
+    """
+
+    EXACT_FILTER_MAX = 8192
+    EXACT_FILTER_FRACTION = 0.01
+
+    def __init__(self, dim: int, m: int = 32, spec: Optional[IndexSpec] = None, compact_threshold: float = 0.2):
         self.dim = dim
         self.m = m
-        self.index = faiss.IndexHNSWFlat(dim, m)
-        self.collector: List[Chunk] = []
+        # тип индекса задаётся IndexSpec; по умолчанию HNSW{m},Flat, как и раньше
+        self.spec = spec or IndexSpec("hnsw", m=m)
+        self.index = self.spec.build(dim)
+        self.collector = ChunkStore()
+        # эмбеддинги, ждущие обучения индекса (IVF/PQ): (номер первого чанка, векторы)
+        self._pending: List[Tuple[int, np.ndarray]] = []
+        # удалённые чанки, векторы которых ещё лежат в индексе (HNSW не умеет remove_ids)
+        self.tombstones: Set[int] = set()
+        # доля надгробий, после которой индекс перестраивается в фоне
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._compaction: Optional[threading.Thread] = None
+        self._compaction_log: Optional[List[Tuple[str, object]]] = None
+        # копия эмбеддингов на диске (см. attach_embeddings): из неё перестраивается индекс
+        self.embeddings: Optional[EmbeddingStore] = None
+        self._rows: Optional[Callable[[np.ndarray], np.ndarray]] = None
+        # растёт при каждом изменении индекса; по нему сбрасываются кеши результатов
+        self.version = 0
+        self.exact_filter_max = self.EXACT_FILTER_MAX
+        self.exact_filter_fraction = self.EXACT_FILTER_FRACTION
+        self._metadata: Optional[MetadataIndex] = None
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
 
     def add_embeddings(self, embeddings: np.ndarray, chunks: List[Chunk]):
         assert embeddings.shape[1] == self.dim, "Неверная размерность эмбеддингов!"
-        self.index.add(embeddings.astype("float32"))
-        self.collector.extend(chunks)
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        with self._lock, metrics.timer("stage_seconds", stage="faiss_add"):
+            start = len(self.collector)
+            self.collector.extend(chunks)
+            try:
+                if self.index.is_trained and not self._pending:
+                    self._add_to_index(start, embeddings)
+                else:
+                    self._pending.append((start, embeddings))
+                    if self.pending >= self.spec.train_size:
+                        self.train()
+            except Exception:
+                # номера уже заняты чанками в collector: оставляем их удалёнными, чтобы не всплыли в выдаче
+                self._pending = [(first, block) for first, block in self._pending if first < start]
+                self.collector.delete(range(start, len(self.collector)))
+                raise
+            finally:
+                self.version += 1
+
+    def _has_ids(self) -> bool:
+        """Хранит ли индекс номера чанков (иначе номер чанка — позиция вектора, как в старых индексах)."""
+        return isinstance(self.index, faiss.IndexIDMap) or faiss.try_extract_index_ivf(self.index) is not None
+
+    def _add_to_index(self, start: int, embeddings: np.ndarray):
+        ids = np.arange(start, start + len(embeddings), dtype=np.int64)
+        if self._has_ids():
+            self.index.add_with_ids(embeddings, ids)
+        else:
+            # старый индекс без IDMap: номер вектора и есть номер чанка
+            assert self.index.ntotal == start, "Индекс без IDMap рассинхронизирован с collector"
+            self.index.add(embeddings)
+        if self._compaction_log is not None:
+            self._compaction_log.append(("add", (ids, embeddings)))
+
+    @property
+    def pending(self) -> int:
+        """Сколько эмбеддингов ждут обучения индекса."""
+        return sum(len(block) for _, block in self._pending)
 
-    def search(self, query_vector: np.ndarray, top_k: int = 5) -> List[dict]:
+    def train(self, sample: Optional[np.ndarray] = None, max_train: int = 100_000):
+        """
+        Обучает индекс на sample (или на накопленных эмбеддингах, не больше max_train случайных строк)
+        и добавляет в него всё, что ждало обучения. Векторов должно быть не меньше, чем центроидов
+        в индексе (spec.centroids), иначе — ValueError.
+        """
+        with self._lock:
+            if not self.index.is_trained:
+                if sample is None:
+                    sample = np.concatenate([block for _, block in self._pending]) if self._pending else np.zeros((0, self.dim), dtype="float32")
+                    if len(sample) > max_train:
+                        rows = np.random.default_rng(0).choice(len(sample), max_train, replace=False)
+                        sample = sample[rows]
+                if len(sample) < self.spec.centroids:
+                    raise ValueError(f"Для обучения {self.spec} нужно не меньше {self.spec.centroids} векторов, есть {len(sample)}")
+                print(f"[+] Обучение индекса {self.spec} на {len(sample)} векторах")
+                with metrics.timer("stage_seconds", stage="faiss_train"):
+                    self.index.train(np.ascontiguousarray(sample, dtype="float32"))
+            for start, block in self._pending:
+                self._add_to_index(start, block)
+            self._pending = []
+
+    def search(
+        self, query_vector: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[Dict[str, Any]] = None
+    ) -> List[dict]:
         if query_vector.ndim == 1:
             query_vector = query_vector.reshape(1, -1)
+        return self.search_batch(query_vector[:1], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[0]
+
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[dict]]:
+        """
+        Один поиск FAISS по всей матрице запросов; результаты для каждой строки отдельно.
+        nprobe (IVF) и ef_search (HNSW) переопределяют параметры индекса только для этого вызова.
+        filter — условия на метаданные чанков (см. retrieval/metadata.py).
+        Пока индекс IVF/PQ не обучен, все векторы лежат в буфере ожидания и перебираются точно.
+        """
+        if query_vectors.ndim == 1:
+            query_vectors = query_vectors.reshape(1, -1)
+        query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+
+        if not self.index.is_trained and self._pending:
+            return self._search_pending(query_vectors, top_k, self.select(filter) if filter is not None else None)
+        if not self.index.is_trained or self.index.ntotal == 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        if filter is not None:
+            return self._search_filtered(query_vectors, top_k, self.select(filter), nprobe, ef_search)
+        params = search_parameters(self.index, nprobe=nprobe, ef_search=ef_search)
+        index = self.index
+        deleted = self.collector.deleted
+        k = self._overfetch(top_k)
+        while True:
+            with metrics.timer("stage_seconds", stage="faiss_search"):
+                distances, indices = index.search(query_vectors, k, params=params)
+            batch = []
+            for row_indices, row_distances in zip(indices, distances):
+                results = []
+                for idx, dist in zip(row_indices, row_distances):
+                    if 0 <= idx < len(self.collector) and idx not in deleted:
+                        results.append(self._entry(idx, dist))
+                        if len(results) == top_k:
+                            break
+                batch.append(results)
+            # надгробия HNSW могли вытеснить живые чанки из top_k — запрашиваем больше; IVF и Flat
+            # удаляют векторы сразу, и короткую строку там (IVF с малым nprobe) больший k не дополнит
+            if not self.tombstones or k >= index.ntotal or all(len(results) == top_k for results in batch):
+                return batch
+            k = min(index.ntotal, k * 2)
+            metrics.inc("faiss_refetch_total")
+
+    def _search_pending(self, query_vectors: np.ndarray, top_k: int, allowed: Optional[np.ndarray]) -> List[List[dict]]:
+        """Точный перебор эмбеддингов, ждущих обучения индекса; allowed — номера чанков под фильтром."""
+        blocks = list(self._pending)
+        ids = np.concatenate([np.arange(start, start + len(block), dtype=np.int64) for start, block in blocks])
+        keep = ~np.isin(ids, np.fromiter(self.collector.deleted, dtype=np.int64, count=len(self.collector.deleted)))
+        if allowed is not None:
+            keep &= np.isin(ids, allowed)
+        if not keep.any():
+            return [[] for _ in range(len(query_vectors))]
+        ids = ids[keep]
+        vectors = np.ascontiguousarray(np.concatenate([block for _, block in blocks])[keep], dtype="float32")
+        metrics.inc("pending_searches_total")
+        with metrics.timer("stage_seconds", stage="faiss_search_pending"):
+            distances, rows = faiss.knn(query_vectors, vectors, min(top_k, len(ids)), metric=self.index.metric_type)
+        return [
+            [self._entry(ids[row], dist) for row, dist in zip(row_ids, row_distances) if row >= 0]
+            for row_ids, row_distances in zip(rows, distances)
+        ]
+
+    def _entry(self, idx: int, distance) -> dict:
+        entry = self.collector.entry(idx)
+        entry["distance"] = distance
+        entry["chunk_id"] = int(idx)
+        return entry
+
+    # ------------------ Фильтр по метаданным ------------------
+    @property
+    def metadata(self) -> MetadataIndex:
+        if self._metadata is None or self._metadata.store is not self.collector:
+            self._metadata = MetadataIndex(self.collector)
+        return self._metadata
+
+    def select(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Отсортированные номера живых чанков, подходящих под фильтр."""
+        return self.metadata.select(filter)
+
+    def tag(self, ids: List[int], *tags: str):
+        """Пользовательские метки чанков; по ним фильтрует {"tags": ...}. Сохраняются вместе с чанками."""
+        with self._lock:
+            self.collector.tag(ids, *tags)
+            self.version += 1
+
+    def untag(self, ids: List[int], *tags: str):
+        with self._lock:
+            self.collector.untag(ids, *tags)
+            self.version += 1
 
-        distances, indices = self.index.search(query_vector.astype("float32"), top_k)
-        results = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx < len(self.collector):
-                chunk = self.collector[idx]
-                entry = chunk.to_dict()
-                entry["distance"] = dist
-                results.append(entry)
-        return results
+    def tags_of(self, ids: List[int]) -> Set[str]:
+        """Метки, которые есть хотя бы у одного из чанков ids."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        return {tag for tag, tagged in self.collector.tags.items() if np.isin(ids, tagged).any()}
+
+    def _filter_vectors(self, ids: np.ndarray) -> Optional[np.ndarray]:
+        """Векторы чанков ids для точного перебора: из хранилища или из индекса; None, если их не достать."""
+        if self._from_store(ids):
+            return self._stored_vectors(ids)
+        try:
+            with self._lock:
+                return np.ascontiguousarray(self.index.reconstruct_batch(ids), dtype="float32")
+        except RuntimeError:
+            # IVF без прямой карты (и некоторые другие индексы) не восстанавливают векторы по номеру
+            return None
+
+    def _search_filtered(self, query_vectors: np.ndarray, top_k: int, allowed: np.ndarray, nprobe: Optional[int], ef_search: Optional[int]) -> List[List[dict]]:
+        """
+        Поиск только среди чанков allowed (живые, по возрастанию номеров). Короткий список или
+        малая доля индекса перебирается точно; иначе номера уходят в FAISS как IDSelector, и
+        индекс сам пропускает остальные векторы. Строки, где подходящих нашлось меньше top_k,
+        ищутся заново с вдвое большими ef_search/nprobe (см. filtered_budgets).
+        """
+        if len(allowed) == 0:
+            return [[] for _ in range(len(query_vectors))]
+        if len(allowed) <= self.exact_filter_max or len(allowed) <= self.exact_filter_fraction * self.index.ntotal:
+            vectors = self._filter_vectors(allowed)
+            if vectors is not None:
+                metrics.inc("filtered_searches_total", path="exact")
+                with metrics.timer("stage_seconds", stage="faiss_search_exact"):
+                    distances, rows = faiss.knn(query_vectors, vectors, min(top_k, len(allowed)), metric=self.index.metric_type)
+                return [
+                    [self._entry(allowed[row], dist) for row, dist in zip(row_ids, row_distances) if row >= 0]
+                    for row_ids, row_distances in zip(rows, distances)
+                ]
+
+        metrics.inc("filtered_searches_total", path="selector")
+        selector = faiss.IDSelectorBatch(allowed)
+        need = min(top_k, len(allowed))
+        batch: List[List[dict]] = [[] for _ in range(len(query_vectors))]
+        short = np.arange(len(query_vectors))
+        for probes, ef in filtered_budgets(self.index, top_k, nprobe, ef_search):
+            params = search_parameters(self.index, nprobe=probes, ef_search=ef, sel=selector)
+            with metrics.timer("stage_seconds", stage="faiss_search"):
+                distances, indices = self.index.search(query_vectors[short], top_k, params=params)
+            for row, row_indices, row_distances in zip(short, indices, distances):
+                batch[row] = [
+                    self._entry(idx, dist) for idx, dist in zip(row_indices, row_distances) if 0 <= idx < len(self.collector)
+                ]
+            short = np.array([row for row in short if len(batch[row]) < need], dtype=np.int64)
+            if len(short) == 0:
+                break
+            metrics.inc("faiss_refetch_total")
+        return batch
+
+    def get_context(self, chunk_id: int, window: int = 1) -> List[dict]:
+        """
+        Чанк и до window соседей с каждой стороны из того же документа (чанки документа идут подряд),
+        без удалённых. Берётся из хранилища, документ заново не разбирается.
+        """
+        file_path = self.collector.field("file_path", chunk_id)
+        lo, hi = max(0, chunk_id - window), min(len(self.collector), chunk_id + window + 1)
+        context = []
+        for i in range(lo, hi):
+            if i in self.collector.deleted or self.collector.field("file_path", i) != file_path:
+                continue
+            entry = self.collector.entry(i)
+            entry["chunk_id"] = i
+            context.append(entry)
+        return context
+
+    def _overfetch(self, top_k: int) -> int:
+        """Сколько кандидатов просить у FAISS, чтобы после отбрасывания удалённых осталось top_k."""
+        dead = len(self.tombstones)
+        if not dead:
+            return top_k
+        alive_fraction = max(1.0 - dead / max(self.index.ntotal, 1), 0.05)
+        return min(self.index.ntotal, int(np.ceil(top_k / alive_fraction)) + top_k)
+
+    # ------------------ Удаление и перестройка ------------------
+    def remove_chunks(self, ids: List[int]):
+        """
+        Удаляет чанки из выдачи. Индексы, умеющие remove_ids (Flat, IVF), удаляют векторы сразу;
+        для HNSW остаются надгробия, и при их доле выше compact_threshold индекс перестраивается в фоне.
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        with self._lock:
+            self.collector.delete(ids)
+            pending_ids = {i for start, block in self._pending for i in range(start, start + len(block))}
+            in_index = [i for i in ids if i not in pending_ids]
+            if in_index:
+                try:
+                    if not self._has_ids():
+                        # в старом индексе remove_ids сдвинул бы позиции, а с ними и номера чанков
+                        raise RuntimeError("index without ids")
+                    self.index.remove_ids(faiss.IDSelectorBatch(np.array(in_index, dtype=np.int64)))
+                except RuntimeError:
+                    self.tombstones.update(in_index)
+            if self._compaction_log is not None:
+                self._compaction_log.append(("remove", in_index))
+            self.version += 1
+        if self.tombstone_fraction > self.compact_threshold:
+            self.compact(background=True)
+
+    @property
+    def tombstone_fraction(self) -> float:
+        return len(self.tombstones) / self.index.ntotal if self.index.ntotal else 0.0
+
+    def attach_embeddings(self, store: EmbeddingStore, rows: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        """
+        Подключает хранилище эмбеддингов. rows переводит номера чанков ретривера в строки хранилища
+        (для шардов); по умолчанию номер чанка и есть номер строки.
+        """
+        self.embeddings = store
+        self._rows = rows
+
+    def _from_store(self, ids: np.ndarray) -> bool:
+        if self.embeddings is None:
+            return False
+        return self.embeddings.covers(self._rows(ids) if self._rows is not None else ids)
+
+    def _stored_vectors(self, ids: np.ndarray) -> np.ndarray:
+        return self.embeddings.get(self._rows(ids) if self._rows is not None else ids)
+
+    def _live_ids(self) -> np.ndarray:
+        """Номера неудалённых чанков, векторы которых лежат в индексе (надгробия бывают только у не-IVF)."""
+        if isinstance(self.index, faiss.IndexIDMap):
+            ids = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        else:
+            ids = np.arange(self.index.ntotal, dtype=np.int64)
+        return np.array([i for i in ids if i not in self.tombstones], dtype=np.int64)
+
+    def _build_index(self, spec: IndexSpec, ids: np.ndarray, vectors: Optional[np.ndarray] = None, block_size: int = 65536, max_train: int = 100_000):
+        """
+        Новый индекс по spec с векторами чанков ids. Без vectors векторы читаются из хранилища
+        эмбеддингов блоками по block_size; обучение — на случайных max_train из них.
+        """
+        index = spec.build(self.dim)
+        if not index.is_trained and len(ids) < spec.centroids:
+            raise ValueError(f"Для обучения {spec} нужно не меньше {spec.centroids} векторов, есть {len(ids)}")
+        if not index.is_trained and len(ids):
+            if vectors is not None:
+                sample = vectors
+            else:
+                sample_ids = ids if len(ids) <= max_train else np.sort(np.random.default_rng(0).choice(ids, max_train, replace=False))
+                sample = self._stored_vectors(sample_ids)
+            index.train(sample)
+        if vectors is not None:
+            if len(ids):
+                index.add_with_ids(vectors, ids)
+        else:
+            for start in range(0, len(ids), block_size):
+                block = ids[start:start + block_size]
+                index.add_with_ids(self._stored_vectors(block), block)
+        return index
+
+    def compact(self, background: bool = False):
+        """
+        Перестраивает индекс без надгробий. В фоновом режиме поиск и добавление продолжают
+        работать со старым индексом; изменения, пришедшие во время перестройки, переносятся
+        в новый индекс перед подменой. Векторы берутся из хранилища эмбеддингов, если оно
+        подключено, иначе восстанавливаются из самого индекса.
+        """
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            if not self.tombstones:
+                # remove_ids уже удалил векторы (Flat, IVF) — перестраивать нечего
+                return
+            if self._pending and self.pending >= self.spec.centroids:
+                self.train()
+            ids = self._live_ids()
+            vectors = None
+            if not self._from_store(ids):
+                # reconstruct нельзя вызывать одновременно с add, поэтому читаем всё сразу под замком
+                vectors = np.vstack([self.index.reconstruct(int(i)) for i in ids]) if len(ids) else np.zeros((0, self.dim), dtype="float32")
+            dropped = set(self.tombstones)
+            self._compaction_log = []
+
+        def rebuild():
+            with metrics.timer("stage_seconds", stage="compact"):
+                index = self._build_index(self.spec, ids, vectors)
+            with self._lock:
+                for op, payload in self._compaction_log:
+                    if op == "add":
+                        index.add_with_ids(payload[1], payload[0])
+                    else:
+                        try:
+                            index.remove_ids(faiss.IDSelectorBatch(np.array(payload, dtype=np.int64)))
+                        except RuntimeError:
+                            pass
+                self.index = index
+                self.tombstones -= dropped
+                self._compaction_log = None
+                self.version += 1
+            print(f"[+] Индекс перестроен: удалено {len(dropped)} векторов, осталось {index.ntotal}")
+
+        if background:
+            self._compaction = threading.Thread(target=rebuild, name="index-compaction", daemon=True)
+            self._compaction.start()
+        else:
+            rebuild()
+
+    def rebuild(self, spec: Optional[IndexSpec] = None, block_size: int = 65536, max_train: int = 100_000):
+        """
+        Строит индекс заново (другого типа или с другими параметрами) из хранилища эмбеддингов,
+        без повторного кодирования. Номера чанков сохраняются, удалённые чанки в индекс не попадают.
+        """
+        self.wait_for_compaction()
+        with self._lock:
+            ids = np.array([i for i in range(len(self.collector)) if i not in self.collector.deleted], dtype=np.int64)
+            if not self._from_store(ids):
+                raise ValueError("В хранилище эмбеддингов нет векторов для всех чанков: индекс не перестроить без повторного кодирования")
+            spec = spec or self.spec
+            self.index = self._build_index(spec, ids, block_size=block_size, max_train=max_train)
+            self.spec = spec
+            self.m = spec.m
+            self.tombstones = set()
+            self._pending = []
+            self.version += 1
+        print(f"[+] Индекс {spec} построен из сохранённых эмбеддингов: {self.index.ntotal} векторов")
+
+    def wait_for_compaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
 
     def save(self, index_path: str, collector_path: str):
-        faiss.write_index(self.index, index_path)
-        with open(collector_path, "wb") as f:
-            pickle.dump(self.collector, f)
+        """
+        Индекс пишется в index_path, его IndexSpec — в {index_path}.spec.json, чанки — в папку
+        collector_path (см. ChunkStore). Индекс, которому ещё не хватает векторов на все центроиды,
+        сохраняется необученным, а ждущие обучения эмбеддинги — в {index_path}.pending.npz.
+        """
+        if os.path.isfile(collector_path):
+            # старый pickle: дальше храним чанки в соседней папке ChunkStore
+            collector_path = os.path.join(os.path.dirname(collector_path), COLLECTOR_DIR)
+        self.wait_for_compaction()
+        with self._lock:
+            if self._pending and self.pending >= self.spec.centroids:
+                self.train()
+            with metrics.timer("stage_seconds", stage="index_save"):
+                faiss.write_index(self.index, index_path)
+                self._save_spec(index_path)
+                self._save_pending(index_path)
+                self.collector.save(collector_path)
         print(f"[+] Индекс сохранён: {index_path}")
         print(f"[+] Collector сохранён: {collector_path}")
 
+    def _save_spec(self, index_path: str):
+        tmp_path = index_path + SPEC_SUFFIX + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.spec.to_dict(), f)
+        os.replace(tmp_path, index_path + SPEC_SUFFIX)
+
+    def _save_pending(self, index_path: str):
+        path = index_path + PENDING_SUFFIX
+        if not self._pending:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = index_path + ".pending.tmp.npz"
+        np.savez(
+            tmp_path,
+            starts=np.array([start for start, _ in self._pending], dtype=np.int64),
+            sizes=np.array([len(block) for _, block in self._pending], dtype=np.int64),
+            vectors=np.concatenate([block for _, block in self._pending]),
+        )
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _load_pending(index_path: str) -> List[Tuple[int, np.ndarray]]:
+        path = index_path + PENDING_SUFFIX
+        if not os.path.exists(path):
+            return []
+        with np.load(path) as data:
+            bounds = np.concatenate([[0], np.cumsum(data["sizes"])])
+            vectors = data["vectors"]
+            return [(int(start), vectors[bounds[i]:bounds[i + 1]]) for i, start in enumerate(data["starts"])]
+
+    @staticmethod
+    def load_spec(index_path: str) -> Optional[IndexSpec]:
+        """IndexSpec, сохранённый рядом с индексом; None для баз, записанных до его появления."""
+        path = index_path + SPEC_SUFFIX
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return IndexSpec.from_dict(json.load(f))
+
     @classmethod
-    def load(cls, index_path: str, collector_path: str):
-        index = faiss.read_index(index_path)
-        with open(collector_path, "rb") as f:
-            collector = pickle.load(f)
+    def load(cls, index_path: str, collector_path: str, mmap: bool = True, spec: Optional[IndexSpec] = None):
+        """
+        Загружает индекс и чанки; collector_path может быть папкой ChunkStore или старым pickle со списком Chunk.
+        spec по умолчанию — сохранённый рядом с индексом (по нему идут перестройки).
+        """
+        with metrics.timer("stage_seconds", stage="index_load"):
+            index = faiss.read_index(index_path)
+            if os.path.isdir(collector_path):
+                collector = ChunkStore.load(collector_path, mmap=mmap)
+            else:
+                with open(collector_path, "rb") as f:
+                    collector = ChunkStore.from_chunks(pickle.load(f))
+            pending = cls._load_pending(index_path)
 
         dim = index.d
-        retriever = cls(dim=dim)
+        retriever = cls(dim=dim, spec=spec or cls.load_spec(index_path))
         retriever.index = index
         retriever.collector = collector
+        retriever._pending = pending
+        if isinstance(index, faiss.IndexIDMap):
+            in_index = set(faiss.vector_to_array(index.id_map).tolist())
+        elif faiss.try_extract_index_ivf(index) is not None:
+            in_index = set()
+        else:
+            in_index = range(index.ntotal)
+        retriever.tombstones = {i for i in collector.deleted if i in in_index}
 
         print(f"[+] Индекс загружен: {index_path}")
         print(f"[+] Collector загружен ({len(collector)} элементов)")
@@ -0,0 +1,400 @@
+"""Шардированный ретривер: несколько VectorRetriever, поиск по ним параллельно и слияние top-k."""
+
+import json
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from retrieval.chunk_store import Chunk
+from retrieval.embedding_store import EmbeddingStore
+from retrieval.index_factory import IndexSpec
+from retrieval.retriever import COLLECTOR_DIR, PENDING_SUFFIX, SPEC_SUFFIX, VectorRetriever
+from resources.lazy import lazy_import
+
+faiss = lazy_import("faiss")
+
+
+def shard_of(file_path: str, shards: int) -> int:
+    """Шард документа: все чанки одного файла лежат в одном шарде."""
+    return zlib.crc32((file_path or "").encode("utf-8")) % shards
+
+
+def is_sharded(index_path: str) -> bool:
+    return os.path.exists(index_path + ShardedRetriever.META_SUFFIX)
+
+
+def load_retriever(index_path: str, collector_path: str, **kwargs):
+    """Загружает ShardedRetriever, если по index_path лежат шарды, иначе обычный VectorRetriever."""
+    if is_sharded(index_path):
+        return ShardedRetriever.load(index_path, collector_path, **kwargs)
+    return VectorRetriever.load(index_path, collector_path, **kwargs)
+
+
+def _collector_dir(collector_path: str) -> str:
+    if os.path.isfile(collector_path):
+        # старый pickle: чанки лежат в соседней папке ChunkStore
+        return os.path.join(os.path.dirname(collector_path), COLLECTOR_DIR)
+    return collector_path
+
+
+def retriever_files(index_path: str, collector_path: str) -> List[str]:
+    """Существующие файлы и папки ретривера (обычного или шардированного)."""
+    collector_path = _collector_dir(collector_path)
+    paths = [index_path, index_path + SPEC_SUFFIX, index_path + PENDING_SUFFIX, collector_path]
+    meta_path = index_path + ShardedRetriever.META_SUFFIX
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            shards = json.load(f)["shards"]
+        for s in range(shards):
+            paths += [f"{index_path}.{s}{suffix}" for suffix in ("", SPEC_SUFFIX, PENDING_SUFFIX)] + [f"{collector_path}.{s}"]
+        paths += [index_path + ShardedRetriever.ROUTES_SUFFIX, meta_path]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def remove_retriever_files(index_path: str, collector_path: str):
+    """Удаляет файлы ретривера (обычного или шардированного)."""
+    for path in retriever_files(index_path, collector_path):
+        _remove(path)
+
+
+def replace_retriever_files(new_index_path: str, new_collector_path: str, index_path: str, collector_path: str):
+    """
+    Ставит ретривер, сохранённый под временными именами new_*, на место ретривера index_path
+    (раскладка может быть другой). Старые файлы сначала переименовываются в *.old и удаляются
+    только после того, как новые встали на место: на диске всё время есть целая база.
+    """
+    collector_path = _collector_dir(collector_path)
+    old = retriever_files(index_path, collector_path)
+    for path in old:
+        _remove(path + ".old")
+        os.replace(path, path + ".old")
+    for path in retriever_files(new_index_path, new_collector_path):
+        if path.startswith(new_collector_path):
+            os.replace(path, collector_path + path[len(new_collector_path):])
+        else:
+            os.replace(path, index_path + path[len(new_index_path):])
+    for path in old:
+        _remove(path + ".old")
+
+
+class ShardedCollector:
+    """Вид на чанки всех шардов по глобальным номерам (только чтение)."""
+
+    def __init__(self, owner: "ShardedRetriever"):
+        self._owner = owner
+
+    def __len__(self) -> int:
+        return len(self._owner._routes)
+
+    def entry(self, i: int) -> Dict[str, Any]:
+        shard, local = self._owner._locate(i)
+        return self._owner.shards[shard].collector.entry(local)
+
+    def __getitem__(self, i: int) -> Chunk:
+        shard, local = self._owner._locate(i)
+        return self._owner.shards[shard].collector[local]
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def deleted(self) -> Set[int]:
+        return {
+            int(i)
+            for s, shard in enumerate(self._owner.shards)
+            for i in self._owner._to_global(s, sorted(shard.collector.deleted))
+            if i >= 0
+        }
+
+    @property
+    def tags(self) -> Dict[str, np.ndarray]:
+        """Метки всех шардов: для каждой метки отсортированные глобальные номера чанков."""
+        parts: Dict[str, List[np.ndarray]] = {}
+        for s, shard in enumerate(self._owner.shards):
+            for tag, local_ids in shard.collector.tags.items():
+                global_ids = self._owner._to_global(s, local_ids)
+                parts.setdefault(tag, []).append(global_ids[global_ids >= 0])
+        return {tag: np.unique(np.concatenate(ids)) for tag, ids in parts.items()}
+
+
+class ShardedRetriever:
+    """
+    Чанки делятся на shards частей по документу (crc32 пути файла). Каждый шард — отдельный
+    VectorRetriever со своим индексом и хранилищем; поиск идёт по всем шардам в пуле потоков
+    (FAISS отпускает GIL), результаты сливаются по расстоянию.
+    Снаружи чанки нумеруются глобально в порядке добавления, как в VectorRetriever;
+    таблица маршрутов (шард, локальный номер) хранится рядом с индексом. Маршруты дописываются
+    под замком после того, как шарды приняли чанки; чанк шарда без маршрута считается ещё не добавленным.
+    Файлы: {index_path}.{i}, {collector_path}.{i}, {index_path}.shards.json, {index_path}.routes.npy
+    """
+
+    META_SUFFIX = ".shards.json"
+    ROUTES_SUFFIX = ".routes.npy"
+
+    def __init__(self, dim: int, shards: int = 4, m: int = 32, spec: Optional[IndexSpec] = None, workers: Optional[int] = None, compact_threshold: float = 0.2):
+        if shards < 1:
+            raise ValueError("Нужен хотя бы один шард")
+        self.dim = dim
+        self.spec = spec or IndexSpec("hnsw", m=m)
+        self.shards = [VectorRetriever(dim=dim, spec=self.spec, compact_threshold=compact_threshold) for _ in range(shards)]
+        self.workers = workers or shards
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # глобальный номер -> (шард, локальный номер) и обратно
+        self._routes: List[Tuple[int, int]] = []
+        self._globals: List[List[int]] = [[] for _ in range(shards)]
+        # _globals в виде массивов; пересобираются, когда шард получил новые маршруты
+        self._global_arrays: Dict[int, np.ndarray] = {}
+        self._lock = threading.RLock()
+        self.collector = ShardedCollector(self)
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shard")
+        return self._pool
+
+    def _map(self, fn, items):
+        items = list(items)
+        if len(items) == 1:
+            return [fn(items[0])]
+        return list(self.pool.map(fn, items))
+
+    def _locate(self, i: int) -> Tuple[int, int]:
+        if i < 0:
+            i += len(self._routes)
+        if not 0 <= i < len(self._routes):
+            raise IndexError(f"Чанк {i} вне диапазона 0..{len(self._routes) - 1}")
+        return self._routes[i]
+
+    def _to_global(self, shard: int, local_ids) -> np.ndarray:
+        """Локальные номера шарда -> глобальные; -1 для чанков, маршрут которых ещё не записан."""
+        local_ids = np.asarray(local_ids, dtype=np.int64)
+        with self._lock:
+            known = self._global_arrays.get(shard)
+            if known is None or len(known) != len(self._globals[shard]):
+                known = self._global_arrays[shard] = np.asarray(self._globals[shard], dtype=np.int64)
+        result = np.full(len(local_ids), -1, dtype=np.int64)
+        inside = (local_ids >= 0) & (local_ids < len(known))
+        result[inside] = known[local_ids[inside]]
+        return result
+
+    @property
+    def version(self) -> int:
+        return sum(shard.version for shard in self.shards)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.index.ntotal for shard in self.shards)
+
+    # ------------------ Добавление ------------------
+    def add_embeddings(self, embeddings: np.ndarray, chunks: List[Chunk]):
+        """
+        Чанки раскладываются по шардам, затем под замком получают глобальные номера по порядку.
+        Если шард упал, номера получают только чанки, которые шарды уже приняли, и они сразу
+        удаляются — маршруты не ведут в пустоту, а локальные номера шардов не сбиваются.
+        """
+        assert embeddings.shape[1] == self.dim, "Неверная размерность эмбеддингов!"
+        targets = [shard_of(chunk.file_path, len(self.shards)) for chunk in chunks]
+        rows: Dict[int, List[int]] = {}
+        for row, shard in enumerate(targets):
+            rows.setdefault(shard, []).append(row)
+        starts = {shard: len(self.shards[shard].collector) for shard in rows}
+        failed = True
+        try:
+            for shard, shard_rows in rows.items():
+                self.shards[shard].add_embeddings(embeddings[shard_rows], [chunks[row] for row in shard_rows])
+            failed = False
+        finally:
+            with self._lock:
+                accepted = {shard: len(self.shards[shard].collector) - start for shard, start in starts.items()}
+                taken = dict.fromkeys(rows, 0)
+                added = []
+                for shard in targets:
+                    if taken[shard] < accepted[shard]:
+                        self._globals[shard].append(len(self._routes))
+                        added.append(len(self._routes))
+                        self._routes.append((shard, starts[shard] + taken[shard]))
+                        taken[shard] += 1
+            if failed and added:
+                self.remove_chunks(added)
+
+    def train(self, sample: Optional[np.ndarray] = None, max_train: int = 100_000):
+        self._map(lambda shard: shard.train(sample, max_train), self.shards)
+
+    # ------------------ Поиск ------------------
+    def search(
+        self, query_vector: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[Dict[str, Any]] = None
+    ) -> List[dict]:
+        if query_vector.ndim == 1:
+            query_vector = query_vector.reshape(1, -1)
+        return self.search_batch(query_vector[:1], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[0]
+
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[dict]]:
+        """
+        Каждый шард отдаёт свой top_k для всей матрицы запросов; из них выбирается общий top_k.
+        Фильтр по метаданным каждый шард применяет к своим чанкам (номера из "ids" переводятся в локальные).
+        """
+        if query_vectors.ndim == 1:
+            query_vectors = query_vectors.reshape(1, -1)
+        query_vectors = np.ascontiguousarray(query_vectors, dtype="float32")
+
+        per_shard = self._map(
+            lambda s: self.shards[s].search_batch(
+                query_vectors, top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                filter=self._shard_filter(filter, s) if filter is not None else None,
+            ),
+            range(len(self.shards)),
+        )
+        # для L2 ближе — меньше, для скалярного произведения — больше
+        larger_is_closer = self.shards[0].index.metric_type == faiss.METRIC_INNER_PRODUCT
+        to_global = [self._to_global(s, [e["chunk_id"] for row in results for e in row]) for s, results in enumerate(per_shard)]
+        batch = []
+        offsets = [0] * len(per_shard)
+        for row in range(len(query_vectors)):
+            merged = []
+            for s, results in enumerate(per_shard):
+                for entry in results[row]:
+                    global_id = to_global[s][offsets[s]]
+                    offsets[s] += 1
+                    if global_id < 0:
+                        # шард уже принял чанк, а маршрут ещё не записан
+                        continue
+                    entry["chunk_id"] = int(global_id)
+                    merged.append(entry)
+            merged.sort(key=lambda entry: entry["distance"], reverse=larger_is_closer)
+            batch.append(merged[:top_k])
+        return batch
+
+    # ------------------ Фильтр по метаданным ------------------
+    def _local_ids(self, ids) -> Dict[int, List[int]]:
+        """Глобальные номера чанков -> {шард: локальные номера}."""
+        by_shard: Dict[int, List[int]] = {}
+        for i in ids:
+            i = int(i)
+            if 0 <= i < len(self._routes):
+                shard, local = self._routes[i]
+                by_shard.setdefault(shard, []).append(local)
+        return by_shard
+
+    def _shard_filter(self, filter: Dict[str, Any], shard: int) -> Dict[str, Any]:
+        if "ids" not in filter:
+            return filter
+        ids = filter["ids"]
+        local = self._local_ids(ids if isinstance(ids, (list, tuple, set, np.ndarray)) else [ids]).get(shard, [])
+        return {**filter, "ids": local}
+
+    def select(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Отсортированные глобальные номера живых чанков, подходящих под фильтр."""
+        parts = [self._to_global(s, shard.select(self._shard_filter(filter, s))) for s, shard in enumerate(self.shards)]
+        ids = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+        return ids[ids >= 0]
+
+    def tag(self, ids: List[int], *tags: str):
+        for shard, local_ids in self._local_ids(ids).items():
+            self.shards[shard].tag(local_ids, *tags)
+
+    def untag(self, ids: List[int], *tags: str):
+        for shard, local_ids in self._local_ids(ids).items():
+            self.shards[shard].untag(local_ids, *tags)
+
+    def tags_of(self, ids: List[int]) -> Set[str]:
+        return set().union(*(self.shards[shard].tags_of(local_ids) for shard, local_ids in self._local_ids(ids).items()))
+
+    def get_context(self, chunk_id: int, window: int = 1) -> List[dict]:
+        """Соседи чанка по документу; документ целиком лежит в одном шарде."""
+        shard, local = self._locate(chunk_id)
+        context = self.shards[shard].get_context(local, window)
+        for entry, global_id in zip(context, self._to_global(shard, [entry["chunk_id"] for entry in context])):
+            entry["chunk_id"] = int(global_id)
+        return [entry for entry in context if entry["chunk_id"] >= 0]
+
+    # ------------------ Удаление и перестройка ------------------
+    def remove_chunks(self, ids: List[int]):
+        by_shard: Dict[int, List[int]] = {}
+        for i in ids:
+            shard, local = self._locate(int(i))
+            by_shard.setdefault(shard, []).append(local)
+        for shard, local_ids in by_shard.items():
+            self.shards[shard].remove_chunks(local_ids)
+
+    def compact(self, background: bool = False):
+        """Перестраивает шарды с надгробиями; без background — параллельно в пуле потоков."""
+        if background:
+            for shard in self.shards:
+                shard.compact(background=True)
+        else:
+            self._map(lambda shard: shard.compact(), self.shards)
+
+    def wait_for_compaction(self):
+        for shard in self.shards:
+            shard.wait_for_compaction()
+
+    def attach_embeddings(self, store: EmbeddingStore):
+        """Хранилище общее, строки в нём — глобальные номера; шард переводит в них свои локальные."""
+        for s, shard in enumerate(self.shards):
+            shard.attach_embeddings(store, rows=lambda ids, s=s: self._to_global(s, ids))
+
+    def rebuild(self, spec: Optional[IndexSpec] = None, block_size: int = 65536, max_train: int = 100_000):
+        """Перестраивает индексы всех шардов из хранилища эмбеддингов (параллельно)."""
+        self.spec = spec or self.spec
+        self._map(lambda shard: shard.rebuild(self.spec, block_size, max_train), self.shards)
+
+    # ------------------ Сохранение и загрузка ------------------
+    def save(self, index_path: str, collector_path: str):
+        """Каждый шард сохраняется в свои файлы параллельно; затем пишутся маршруты и описание."""
+        if os.path.isfile(collector_path):
+            collector_path = os.path.join(os.path.dirname(collector_path), COLLECTOR_DIR)
+        self._map(
+            lambda s: self.shards[s].save(f"{index_path}.{s}", f"{collector_path}.{s}"),
+            range(len(self.shards)),
+        )
+        with self._lock:
+            routes = np.array(self._routes, dtype=np.int64).reshape(-1, 2)
+        tmp_routes = index_path + ".routes.tmp.npy"
+        np.save(tmp_routes, routes)
+        os.replace(tmp_routes, index_path + self.ROUTES_SUFFIX)
+        meta_path = index_path + self.META_SUFFIX
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"shards": len(self.shards), "dim": self.dim}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, index_path: str, collector_path: str, mmap: bool = True, spec: Optional[IndexSpec] = None, workers: Optional[int] = None):
+        if os.path.isfile(collector_path):
+            collector_path = os.path.join(os.path.dirname(collector_path), COLLECTOR_DIR)
+        with open(index_path + cls.META_SUFFIX, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        retriever = cls(dim=meta["dim"], shards=meta["shards"], spec=spec, workers=workers)
+        # шарды читаются по очереди: np.load разбирает заголовок .npy через ast.literal_eval,
+        # а он в CPython < 3.11.8 не потокобезопасен (SystemError при параллельной загрузке)
+        retriever.shards = [
+            VectorRetriever.load(f"{index_path}.{s}", f"{collector_path}.{s}", mmap=mmap, spec=spec)
+            for s in range(meta["shards"])
+        ]
+        # spec шардов восстанавливается из их файлов
+        retriever.spec = retriever.shards[0].spec
+        routes = np.load(index_path + cls.ROUTES_SUFFIX)
+        retriever._routes = [(int(shard), int(local)) for shard, local in routes]
+        for global_id, (shard, _) in enumerate(retriever._routes):
+            retriever._globals[shard].append(global_id)
+        return retriever
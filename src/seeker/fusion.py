@@ -0,0 +1,98 @@
+"""
+Слияние результатов для запросов из нескольких предложений.
+
+Препроцессор режет запрос на предложения, и каждое кодируется отдельно
+(все одним вызовом encode). Дальше векторы объединяются одной из стратегий:
+
+- "mean": векторы предложений усредняются и нормализуются, поиск один.
+  Цена как у однострочного запроса; подзапросы о разном "размываются".
+- "max": поиск по каждому предложению (одним батчем FAISS), чанк получает
+  лучшее расстояние из всех. Хорошо, когда одно предложение несёт главный смысл.
+- "rrf": reciprocal rank fusion по рангам из поисков каждого предложения.
+  Не зависит от шкалы расстояний и поднимает чанки, которые находятся сразу
+  по нескольким предложениям; лучший выбор для составных вопросов.
+
+"max" и "rrf" просят у FAISS top_k кандидатов на каждое предложение, поэтому
+поиск дороже в число предложений раз, а encode в любом случае один.
+
+Гибридный режим Seeker сливает плотную выдачу с лексической (BM25) тем же RRF:
+шкалы расстояний и оценок BM25 несравнимы, а ранги — сравнимы.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+FUSION_STRATEGIES = ("mean", "max", "rrf")
+RRF_K = 60
+
+
+def mean_vector(vectors: np.ndarray) -> np.ndarray:
+    """Усреднённый и нормализованный вектор запроса (1, dim)."""
+    vector = vectors.mean(axis=0, keepdims=True)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def fuse_max(result_lists: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """Лучшее (минимальное) расстояние по каждому чанку среди всех предложений."""
+    best: Dict[int, Dict[str, Any]] = {}
+    for results in result_lists:
+        for entry in results:
+            current = best.get(entry["chunk_id"])
+            if current is None or entry["distance"] < current["distance"]:
+                best[entry["chunk_id"]] = entry
+    return sorted(best.values(), key=lambda e: e["distance"])[:top_k]
+
+
+def fuse_rrf(result_lists: List[List[Dict[str, Any]]], top_k: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion: score = sum(1 / (k + rank)); в выдаче остаётся лучшее расстояние чанка."""
+    scores: Dict[int, float] = {}
+    best: Dict[int, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, entry in enumerate(results, start=1):
+            chunk_id = entry["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            current = best.get(chunk_id)
+            if current is None or entry["distance"] < current["distance"]:
+                best[chunk_id] = entry
+    ranked = sorted(scores, key=lambda chunk_id: (-scores[chunk_id], best[chunk_id]["distance"]))[:top_k]
+    fused = []
+    for chunk_id in ranked:
+        entry = dict(best[chunk_id])
+        entry["score"] = scores[chunk_id]
+        fused.append(entry)
+    return fused
+
+
+def fuse_hybrid(dense: List[Dict[str, Any]], lexical: List[Dict[str, Any]], top_k: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    RRF плотной и лексической выдачи. У чанка, найденного обоими путями, остаётся расстояние
+    из плотного поиска и оценка bm25 из лексического; score — итоговая оценка RRF.
+    """
+    scores: Dict[int, float] = {}
+    merged: Dict[int, Dict[str, Any]] = {}
+    for results in (dense, lexical):
+        for rank, entry in enumerate(results, start=1):
+            chunk_id = entry["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            if chunk_id in merged:
+                merged[chunk_id]["bm25"] = entry["bm25"]
+            else:
+                merged[chunk_id] = dict(entry)
+    fused = []
+    for chunk_id in sorted(scores, key=lambda chunk_id: -scores[chunk_id])[:top_k]:
+        entry = merged[chunk_id]
+        entry["score"] = scores[chunk_id]
+        fused.append(entry)
+    return fused
+
+
+def fuse(result_lists: List[List[Dict[str, Any]]], top_k: int, strategy: str) -> List[Dict[str, Any]]:
+    if len(result_lists) == 1:
+        return result_lists[0][:top_k]
+    if strategy == "max":
+        return fuse_max(result_lists, top_k)
+    if strategy == "rrf":
+        return fuse_rrf(result_lists, top_k)
+    raise ValueError(f"Неизвестная стратегия слияния: {strategy}")
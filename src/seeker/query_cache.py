@@ -0,0 +1,48 @@
+"""Кеш запросов для Seeker: эмбеддинги нормализованных запросов и готовые top-k результаты."""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from resources.cache import LRUCache
+
+
+class QueryCache:
+    """
+    Два независимых LRU/TTL слоя, ключ — нормализованный (лемматизированный) текст запроса.
+    - embeddings: векторы запроса; не зависят от индекса, живут долго
+    - results: готовые результаты поиска; сбрасываются при любом изменении индекса
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: Optional[float] = None, results_maxsize: Optional[int] = None, results_ttl: Optional[float] = None):
+        self.embeddings = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.results = LRUCache(maxsize=results_maxsize or maxsize, ttl=results_ttl if results_ttl is not None else ttl)
+        self._index_version = None
+
+    def get_embedding(self, key: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(key)
+
+    def put_embedding(self, key: str, vectors: np.ndarray):
+        vectors = np.array(vectors, copy=True)
+        vectors.flags.writeable = False
+        self.embeddings.put(key, vectors)
+
+    def _check_version(self, index_version: int):
+        if index_version != self._index_version:
+            self.results.clear()
+            self._index_version = index_version
+
+    def get_results(self, key: str, top_k: int, index_version: int) -> Optional[List[Dict[str, Any]]]:
+        self._check_version(index_version)
+        return self.results.get((key, top_k))
+
+    def put_results(self, key: str, top_k: int, index_version: int, results: List[Dict[str, Any]]):
+        self._check_version(index_version)
+        self.results.put((key, top_k), results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
+
+    def clear(self):
+        self.embeddings.clear()
+        self.results.clear()
@@ -1,22 +1,56 @@
 from typing import List, Dict, Any, Optional, Tuple
+import os
 import numpy as np
 
 # ожидаем, что эти классы у тебя уже есть
 from preprocess.chunker import TextPreprocessor
 from embedding.embedder import TextEmbedder
-from retrieval.retriever import VectorRetriever, Chunk
+from retrieval.retriever import VectorRetriever, Chunk, default_paths
+from retrieval.sharded import load_retriever
+from retrieval.lexical import LexicalIndex, lexical_path
+from retrieval.metadata import filter_key
+from data_manager.manifest import DocumentManifest, MANIFEST_FILE
+from resources.registry import registry
+from resources.metrics import Metrics, metrics
+from seeker.query_cache import QueryCache
+from seeker.fusion import FUSION_STRATEGIES, fuse, fuse_hybrid, mean_vector
+
+# "dense" — только FAISS, "lexical" — только BM25 по леммам (без прогона модели), "hybrid" — оба с RRF
+SEARCH_MODES = ("dense", "lexical", "hybrid")
 
 
 class Seeker:
     """
     Утилитарный слой поиска (seeker).
     Работает как: raw query -> preprocess -> embed -> retriever.search -> normalized results.
+    В режимах "lexical" и "hybrid" леммы запроса ищутся ещё и в LexicalIndex (BM25);
+    в гибридном режиме плотный поиск просит dense_k кандидатов (по умолчанию top_k).
+    С манифестом базы (data_manager/manifest.py) фильтр понимает ещё documents и added.
     """
 
-    def __init__(self, retriever: Optional[VectorRetriever] = None, embedder: Optional[TextEmbedder] = None, preprocessor: Optional[TextPreprocessor] = None,): 
-        self.retriever = retriever or VectorRetriever.load("data\\articles.index","data\\articles_texts.pkl")
-        self.embedder = embedder or TextEmbedder()
+    def __init__(self, retriever: Optional[VectorRetriever] = None, embedder: Optional[TextEmbedder] = None, preprocessor: Optional[TextPreprocessor] = None, cache: Optional[QueryCache] = None, fusion: str = "mean", lexical: Optional[LexicalIndex] = None, mode: str = "dense", dense_k: Optional[int] = None, manifest: Optional[DocumentManifest] = None): 
+        if retriever is None:
+            index_path, collector_path = default_paths("data")
+            retriever = load_retriever(index_path, collector_path)
+            lexical = lexical or LexicalIndex.load_if_exists(lexical_path(index_path))
+            manifest = manifest or DocumentManifest(os.path.join("data", MANIFEST_FILE))
+        self.retriever = retriever
+        self.manifest = manifest
+        self.lexical = lexical
+        self.embedder = embedder or registry.embedder()
         self.preprocessor = preprocessor or TextPreprocessor(use_lemmatization=True)
+        # кеш запросов не обязателен: Seeker(cache=QueryCache(maxsize=..., ttl=...))
+        self.cache = cache
+        # как объединять предложения запроса: "mean", "max" или "rrf" (см. seeker/fusion.py)
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия слияния: {fusion}")
+        self.fusion = fusion
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Неизвестный режим поиска: {mode}")
+        if mode != "dense" and lexical is None:
+            raise ValueError(f"Режиму {mode} нужен лексический индекс")
+        self.mode = mode
+        self.dense_k = dense_k
 
     def _prepare_query(self, query: str) -> str:
         """
@@ -30,14 +64,129 @@ class Seeker:
             return query.strip()
         return " ".join(sentences)
 
-    def get_raw_answer(self, query_text: str, top_k: int = 5) -> Tuple[str, List[str]]:
+    def _split_query(self, query: str) -> List[str]:
+        sentences = self.preprocessor.process_querry(query)
+        return sentences or [query.strip()]
+
+    def _search(self, query_text: str, top_k: int, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.search_many([query_text], top_k=top_k, filter=filter)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Пакетный поиск: предложения всех запросов кодируются одним вызовом encode,
+        затем один вызов FAISS на весь батч. Предложения одного запроса объединяются
+        стратегией self.fusion, чанки в выдаче не повторяются. В режиме "lexical" модель
+        не вызывается вовсе, в "hybrid" к плотной выдаче подмешивается BM25 (см. fuse_hybrid).
+        filter — условия на метаданные (файлы, авторы, метки...; см. retrieval/metadata.py),
+        общие для всех запросов батча; top_k набирается только из подходящих чанков.
+        Условия documents и added переводятся в номера чанков по self.manifest.
+        Возвращает список результатов для каждого запроса в исходном порядке.
+        """
+        metrics.inc("queries_total", len(queries), mode=self.mode)
+        with metrics.timer("query_seconds", mode=self.mode):
+            sentences = [self._split_query(query) for query in queries]
+            keys = ["\n".join(parts) for parts in sentences]
+            scope = (self.mode, self.fusion, filter_key(filter) if filter else None)
+            results: List[Optional[List[Dict[str, Any]]]] = [None] * len(keys)
+            if self.cache is not None:
+                for i, key in enumerate(keys):
+                    results[i] = self.cache.get_results((*scope, key), top_k, self.retriever.version)
+
+            missing = [i for i, cached in enumerate(results) if cached is None]
+            if self.cache is not None:
+                metrics.inc("query_cache_hits_total", len(keys) - len(missing))
+            if not missing:
+                return results
+
+            if self.manifest is not None:
+                filter = self.manifest.resolve_filter(filter)
+            # лексическому индексу фильтр передаётся готовым списком номеров — один раз на батч
+            allowed = self.retriever.select(filter) if filter and self.mode != "dense" else None
+            if self.mode == "lexical":
+                found = [self._lexical_search(" ".join(sentences[i]), top_k, allowed) for i in missing]
+            else:
+                dense_k = (self.dense_k or top_k) if self.mode == "hybrid" else top_k
+                found = self._dense_search([sentences[i] for i in missing], [keys[i] for i in missing], dense_k, filter)
+                if self.mode == "hybrid":
+                    found = [
+                        fuse_hybrid(dense, self._lexical_search(" ".join(sentences[i]), max(top_k, dense_k), allowed), top_k)
+                        for i, dense in zip(missing, found)
+                    ]
+
+            for i, chunks in zip(missing, found):
+                results[i] = chunks
+                if self.cache is not None:
+                    self.cache.put_results((*scope, keys[i]), top_k, self.retriever.version, chunks)
+            return results
+
+    def _dense_search(self, sentences: List[List[str]], keys: List[str], top_k: int, filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Предложения всех запросов — одним encode (эмбеддинги берутся из кеша, если есть), затем один поиск FAISS."""
+        vectors: Dict[int, np.ndarray] = {}
+        to_encode = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get_embedding(key) if self.cache is not None else None
+            if cached is not None:
+                vectors[i] = cached
+            else:
+                to_encode.append(i)
+        if to_encode:
+            with metrics.timer("stage_seconds", stage="query_encode"):
+                encoded = self.embedder.encode([sentence for i in to_encode for sentence in sentences[i]])
+            offset = 0
+            for i in to_encode:
+                vectors[i] = encoded[offset:offset + len(sentences[i])]
+                offset += len(sentences[i])
+                if self.cache is not None:
+                    self.cache.put_embedding(keys[i], vectors[i])
+
+        if self.fusion == "mean":
+            query_matrix = np.vstack([mean_vector(vectors[i]) for i in range(len(keys))])
+            return self.retriever.search_batch(query_matrix, top_k=top_k, filter=filter)
+        query_matrix = np.vstack([vectors[i] for i in range(len(keys))])
+        flat = self.retriever.search_batch(query_matrix, top_k=top_k, filter=filter)
+        found, offset = [], 0
+        for i in range(len(keys)):
+            found.append(fuse(flat[offset:offset + len(vectors[i])], top_k, self.fusion))
+            offset += len(vectors[i])
+        return found
+
+    def _lexical_search(self, lemmas: str, top_k: int, allowed: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """BM25 по леммам запроса (allowed — номера чанков под фильтром); вместо расстояния — оценка bm25."""
+        collector = self.retriever.collector
+        results = []
+        with metrics.timer("stage_seconds", stage="query_lexical"):
+            found = self.lexical.search(lemmas, top_k, exclude=collector.deleted, include=allowed)
+        for chunk_id, score in found:
+            if chunk_id >= len(collector):
+                continue
+            entry = collector.entry(chunk_id)
+            entry["distance"] = None
+            entry["chunk_id"] = chunk_id
+            entry["bm25"] = score
+            results.append(entry)
+        return results
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Статистика попаданий кеша запросов (пустой словарь, если кеш выключен)."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def collect_metrics(self, metrics: Metrics = metrics):
+        """Размер индекса и попадания кеша запросов — текущими значениями (см. resources/metrics.py)."""
+        if not metrics.enabled:
+            return
+        metrics.set("chunks", len(self.retriever.collector))
+        metrics.set("index_version", self.retriever.version)
+        for name, stats in self.cache_stats().items():
+            metrics.set("cache_hit_rate", stats["hit_rate"], cache=f"query_{name}")
+            metrics.set("cache_size", stats["size"], cache=f"query_{name}")
+
+    def get_raw_answer(self, query_text: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> Tuple[str, List[str]]:
         """
         Возвращает:
         - объединённый текст найденных чанков с метками
         - список уникальных путей к файлам
         """
-        query_vector = self.embedder.encode(self.preprocessor.process_querry(query_text))
-        chunks = self.retriever.search(query_vector, top_k=top_k)
+        chunks = self._search(query_text, top_k, filter)
 
         combined_text = []
         file_paths_set = set()
@@ -51,3 +200,15 @@ class Seeker:
             file_paths_set.add(file_path)
 
         return " ".join(combined_text), list(file_paths_set), distances
+
+    def get_citations(self, query_text: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Ссылки на найденные чанки без повторного разбора документов:
+        файл, название, авторы, страницы, раздел и символьный диапазон.
+        """
+        fields = ("chunk_id", "file_path", "title", "authors", "page", "page_end", "section", "char_start", "char_end", "distance")
+        return [{name: chunk.get(name) for name in fields} for chunk in self._search(query_text, top_k, filter)]
+
+    def get_context(self, chunk_id: int, window: int = 1) -> List[Dict[str, Any]]:
+        """Найденный чанк вместе с соседними чанками того же документа."""
+        return self.retriever.get_context(chunk_id, window)
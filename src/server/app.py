@@ -0,0 +1,168 @@
+"""
+HTTP-сервис поиска: модель и индекс загружаются один раз при старте,
+одновременные запросы объединяются MicroBatcher'ом.
+Запуск из src/: python -m server.app --data data --port 8000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from resources.metrics import Metrics, json_log_sink, metrics
+from server.batcher import MicroBatcher
+
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=100)
+    # условия на метаданные чанков: {"file_path": ..., "authors": [...], "tags": ..., "page": [lo, hi]}
+    filter: Optional[Dict[str, Any]] = None
+
+
+def _jsonable(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """numpy-скаляры в результатах поиска -> обычные числа."""
+    return {key: value.item() if isinstance(value, np.generic) else value for key, value in entry.items()}
+
+
+def default_seeker(data_path: str = "data", mode: str = "dense", backend: str = "torch", threads: Optional[int] = None):
+    from data_manager.manifest import DocumentManifest, MANIFEST_FILE
+    from resources.registry import registry
+    from retrieval.lexical import LexicalIndex, lexical_path
+    from retrieval.retriever import default_paths
+    from retrieval.sharded import load_retriever
+    from seeker.query_cache import QueryCache
+    from seeker.seeker import Seeker
+
+    index_path, collector_path = default_paths(data_path)
+    lexical = LexicalIndex.load_if_exists(lexical_path(index_path))
+    options = {"backend": backend} if backend != "torch" else {}
+    if threads is not None:
+        options["threads"] = threads
+    embedder = registry.embedder(**options)
+    return Seeker(
+        retriever=load_retriever(index_path, collector_path), embedder=embedder, cache=QueryCache(), lexical=lexical, mode=mode,
+        manifest=DocumentManifest(os.path.join(data_path, MANIFEST_FILE)),
+    )
+
+
+def create_app(seeker_factory: Optional[Callable[[], Any]] = None, max_batch: int = 32, max_wait_ms: float = 5.0, enable_metrics: bool = True) -> FastAPI:
+    """
+    seeker_factory создаёт Seeker (по умолчанию — из папки data); вызывается один раз при старте
+    в отдельном потоке, чтобы загрузка модели не блокировала цикл событий.
+    enable_metrics включает замеры этапов (resources/metrics.py) на время работы приложения;
+    они отдаются в /metrics, при остановке реестр возвращается в прежнее состояние.
+    """
+    seeker_factory = seeker_factory or default_seeker
+    state: Dict[str, Any] = {"seeker": None, "batcher": None, "started": time.time()}
+
+    def collect(registry: Metrics):
+        seeker, batcher = state["seeker"], state["batcher"]
+        if seeker is not None and hasattr(seeker, "collect_metrics"):
+            seeker.collect_metrics(registry)
+        if batcher is not None:
+            for name, value in batcher.stats().items():
+                registry.set(f"batcher_{name}", value)
+        registry.set("uptime_seconds", time.time() - state["started"])
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # реестр общий для процесса: включаем только на время работы приложения
+        was_enabled = metrics.enabled
+        if enable_metrics:
+            metrics.enable()
+        try:
+            loop = asyncio.get_running_loop()
+            seeker = await loop.run_in_executor(None, seeker_factory)
+            batcher = MicroBatcher(seeker.search_many, max_batch=max_batch, max_wait_ms=max_wait_ms)
+            await batcher.start()
+            state["seeker"], state["batcher"] = seeker, batcher
+            metrics.add_collector(collect)
+            try:
+                yield
+            finally:
+                metrics.remove_collector(collect)
+                await batcher.close()
+                batcher.executor.shutdown(wait=False)
+        finally:
+            metrics.enable(was_enabled)
+
+    app = FastAPI(title="Text2Sci search", lifespan=lifespan)
+    app.state.search = state
+
+    @app.post("/search")
+    async def search(request: SearchRequest) -> Dict[str, Any]:
+        batcher: MicroBatcher = state["batcher"]
+        if batcher is None:
+            raise HTTPException(status_code=503, detail="Сервис ещё загружается")
+        try:
+            results = await batcher.submit(request.query, request.top_k, request.filter)
+        except ValueError as e:
+            # неизвестное поле фильтра
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"query": request.query, "results": [_jsonable(entry) for entry in results]}
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        seeker = state["seeker"]
+        if seeker is None:
+            return {"status": "loading"}
+        return {
+            "status": "ok",
+            "chunks": len(seeker.retriever.collector),
+            "index_version": seeker.retriever.version,
+            "uptime_seconds": time.time() - state["started"],
+        }
+
+    @app.get("/metrics")
+    async def metrics_endpoint(format: str = "json"):
+        """JSON (батчер, кеш и все метрики этапов) или, с ?format=prometheus, текст для Prometheus."""
+        if format == "prometheus":
+            return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+        batcher, seeker = state["batcher"], state["seeker"]
+        return {
+            "batcher": batcher.stats() if batcher is not None else {},
+            "cache": seeker.cache_stats() if seeker is not None else {},
+            "stages": metrics.snapshot(),
+        }
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+    from embedding.embedder import BACKENDS
+
+    parser = argparse.ArgumentParser(description="HTTP-сервис поиска Text2Sci")
+    parser.add_argument("--data", default="data", help="папка с индексом и чанками")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--backend", default="torch", choices=BACKENDS, help="бэкенд инференса эмбеддера")
+    parser.add_argument("--threads", type=int, default=None, help="потоки инференса эмбеддера")
+    parser.add_argument("--no-metrics", action="store_true", help="не собирать замеры этапов")
+    parser.add_argument("--log-metrics", action="store_true", help="писать каждый замер строкой JSON в stderr")
+    parser.add_argument("--mode", default="dense", choices=("dense", "lexical", "hybrid"), help="плотный, лексический (BM25) или гибридный поиск")
+    args = parser.parse_args(argv)
+
+    if args.log_metrics:
+        metrics.add_sink(json_log_sink())
+    app = create_app(
+        lambda: default_seeker(args.data, args.mode, args.backend, args.threads),
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        enable_metrics=not args.no_metrics,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
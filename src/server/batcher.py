@@ -0,0 +1,121 @@
+"""Микробатчинг запросов: одновременные запросы объединяются в один вызов search_many."""
+
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from retrieval.metadata import filter_key
+
+SearchMany = Callable[[List[str], int], List[List[Dict[str, Any]]]]
+
+
+class MicroBatcher:
+    """
+    Копит запросы не дольше max_wait_ms (или до max_batch штук) и отдаёт их одним батчем
+    в search_many — один encode и один поиск FAISS на батч. Сам поиск выполняется
+    в executor (по умолчанию один поток), чтобы цикл событий не блокировался.
+    В батче берётся наибольший top_k, каждый запрос получает свой срез.
+    Запросы с фильтром по метаданным уходят в search_many группами с одинаковым фильтром.
+    """
+
+    def __init__(self, search_many: SearchMany, max_batch: int = 32, max_wait_ms: float = 5.0, executor: Optional[Executor] = None):
+        self.search_many = search_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # счётчики для /metrics
+        self.requests = 0
+        self.batches = 0
+        self.batched = 0
+        self.errors = 0
+        self.largest_batch = 0
+        self.search_seconds = 0.0
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            _, _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Сервер остановлен"))
+
+    async def submit(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Ставит запрос в очередь и ждёт его результатов."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        await self._queue.put((query, top_k, filter or None, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, int, Optional[Dict[str, Any]], asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            collected = await self._collect()
+            groups: Dict[Any, List[Tuple]] = {}
+            for item in collected:
+                if not item[3].cancelled():
+                    groups.setdefault(filter_key(item[2]) if item[2] else None, []).append(item)
+            for batch in groups.values():
+                await self._search(loop, batch)
+
+    async def _search(self, loop, batch: List[Tuple[str, int, Optional[Dict[str, Any]], asyncio.Future]]):
+        queries = [query for query, _, _, _ in batch]
+        top_k = max(k for _, k, _, _ in batch)
+        filter = batch[0][2]
+        # без фильтра search_many вызывается как раньше: (queries, top_k)
+        args = (queries, top_k) if filter is None else (queries, top_k, filter)
+        started = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self.executor, self.search_many, *args)
+        except Exception as e:
+            self.errors += 1
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.search_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.batched += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, k, _, future), found in zip(batch, results):
+            if not future.done():
+                future.set_result(found[:k])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch": self.batched / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "search_seconds": self.search_seconds,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
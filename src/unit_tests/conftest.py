@@ -0,0 +1,32 @@
+"""Общие помощники тестов индексов: нормированные случайные векторы и чанки с метаданными."""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+from retrieval.retriever import Chunk
+
+DIM = 32
+AUTHORS = [["Иванов"], ["Петров", "Сидоров"], [], ["Сидоров"]]
+
+
+def random_vectors(n, seed=0, dim=DIM):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_chunks(n, docs=1, prefix="doc", authors=None):
+    """
+    n чанков, разложенных по docs документам по кругу: {prefix}0.txt, {prefix}1.txt, ...
+    Страница — номер прохода по документам (с 1); authors — списки авторов, тоже по кругу.
+    """
+    return [
+        Chunk(
+            text=f"chunk {i}",
+            file_path=f"{prefix}{i % docs}.txt",
+            authors=authors[i % len(authors)] if authors else None,
+            page=1 + i // docs,
+        )
+        for i in range(n)
+    ]
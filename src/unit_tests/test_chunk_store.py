@@ -0,0 +1,102 @@
+import sys
+import os
+import pickle
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+import pytest
+from retrieval.chunk_store import Chunk, ChunkStore
+from retrieval.retriever import VectorRetriever
+
+
+def make_chunks(n, path="a.pdf"):
+    return [Chunk(text=f"Текст чанка №{i} — ёжик", file_path=path, title="Заголовок", authors=["Иванов", "Петров"]) for i in range(n)]
+
+
+# ------------------------
+# 1. Сохранение и загрузка с отображением в память
+# ------------------------
+def test_roundtrip(tmp_path):
+    store = ChunkStore.from_chunks(make_chunks(3) + make_chunks(2, path="b.docx"))
+    store.save(str(tmp_path))
+
+    loaded = ChunkStore.load(str(tmp_path))
+    assert len(loaded) == 5
+    assert isinstance(loaded._blob, np.memmap)
+    assert loaded.text(4) == "Текст чанка №1 — ёжик"
+    assert loaded[4].file_path == "b.docx"
+    assert loaded.entry(0)["authors"] == ["Иванов", "Петров"]
+    # пути, заголовки и авторы интернируются
+    assert loaded._tables["file_path"] == ["a.pdf", "b.docx"]
+    assert len(loaded._tables["authors"]) == 1
+
+
+# ------------------------
+# 2. Дозапись после загрузки
+# ------------------------
+def test_append_after_load(tmp_path):
+    store = ChunkStore.from_chunks(make_chunks(2))
+    store.save(str(tmp_path))
+    size_before = os.path.getsize(tmp_path / ChunkStore.TEXTS_FILE)
+
+    loaded = ChunkStore.load(str(tmp_path))
+    loaded.extend(make_chunks(1, path="c.txt"))
+    assert len(loaded) == 3 and loaded[-1].file_path == "c.txt"
+    loaded.save(str(tmp_path))
+    assert os.path.getsize(tmp_path / ChunkStore.TEXTS_FILE) > size_before
+
+    again = ChunkStore.load(str(tmp_path))
+    assert [c.text for c in again] == [c.text for c in make_chunks(2)] + [make_chunks(1)[0].text]
+
+    other = tmp_path / "copy"
+    again.save(str(other))
+    assert ChunkStore.load(str(other)).text(2) == again.text(2)
+
+
+# ------------------------
+# 3. Старый pickle со списком Chunk
+# ------------------------
+def test_legacy_pickle(tmp_path):
+    dim = 8
+    retriever = VectorRetriever(dim=dim)
+    retriever.add_embeddings(np.eye(dim, dtype="float32")[:2], make_chunks(2))
+    index_path = str(tmp_path / "articles.index")
+    legacy_path = str(tmp_path / "articles_texts.pkl")
+    retriever.save(index_path, str(tmp_path / "articles_chunks"))
+    with open(legacy_path, "wb") as f:
+        pickle.dump(list(make_chunks(2)), f)
+
+    loaded = VectorRetriever.load(index_path, legacy_path)
+    assert len(loaded.collector) == 2
+    assert loaded.search(np.eye(dim, dtype="float32")[1], top_k=1)[0]["text"] == make_chunks(2)[1].text
+
+
+# ------------------------
+# 4. Chunk без __dict__
+# ------------------------
+def test_chunk_slots():
+    chunk = make_chunks(1)[0]
+    assert not hasattr(chunk, "__dict__")
+    assert pickle.loads(pickle.dumps(chunk)).to_dict() == chunk.to_dict()
+
+
+# ------------------------
+# 5. Происхождение чанка и хранилища без этих колонок
+# ------------------------
+def test_provenance_columns(tmp_path):
+    chunk = Chunk(text="текст", file_path="a.pdf", page=3, page_end=4, char_start=100, char_end=5_000_000_000, section="Глава 2")
+    store = ChunkStore.from_chunks([chunk, Chunk(text="без данных", file_path="b.txt")])
+    store.save(str(tmp_path))
+
+    loaded = ChunkStore.load(str(tmp_path))
+    assert loaded[0].to_dict() == {**chunk.to_dict(), "distance": None}
+    assert loaded.entry(1)["page"] is None and loaded.entry(1)["section"] is None
+
+    # хранилище предыдущей версии: колонок происхождения нет
+    for name in ("section", *ChunkStore.NUMERIC_FIELDS):
+        os.remove(tmp_path / f"{name}.npy")
+    old = ChunkStore.load(str(tmp_path))
+    assert old[0].page is None and old[0].section is None and old.text(0) == "текст"
+    old.append(Chunk(text="новый", file_path="c.txt", page=1, section="Введение"))
+    old.save(str(tmp_path))
+    assert ChunkStore.load(str(tmp_path))[2].section == "Введение"
@@ -0,0 +1,192 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pickle
+import pytest
+
+from preprocess.chunker import TextPreprocessor
+from preprocess.token_counter import TokenCounter
+from extract.text_extractor import DocumentExtractor, TextPart
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), "files_for_testing")
+
+pre = TextPreprocessor(chunk_size=50, use_lemmatization=False)
+
+
+# ------------------------
+# 1. Потоковые чанки совпадают с обычными при любой нарезке текста
+# ------------------------
+def test_process_iter_matches_process():
+    with open(os.path.join(FILES_DIR, "1984.txt"), "r", encoding="utf-8") as f:
+        text = f.read()
+    expected = pre.process(text, links=False, lover=False, cut=False)
+
+    lines = text.split("\n")
+    assert list(pre.process_iter(lines, links=False, lover=False, cut=False)) == expected
+    # разрезы посреди предложений и слов по границе пробела
+    words = text.split(" ")
+    pieces = [" ".join(words[i:i + 37]) for i in range(0, len(words), 37)]
+    assert list(pre.process_iter(pieces, links=False, lover=False, cut=False)) == expected
+
+
+# ------------------------
+# 2. Незаконченное предложение не копится бесконечно
+# ------------------------
+def test_carry_is_bounded():
+    pieces = ["слово " * 300 for _ in range(10)]
+    sentences = list(pre.iter_sentences(pieces))
+    assert len(sentences) > 1
+    assert max(len(s.split()) for s in sentences) <= 10 * pre.chunk_size + 300
+    assert sum(len(s.split()) for s in sentences) == 3000
+
+
+# ------------------------
+# 3. extract_iter по частям даёт тот же текст, что extract
+# ------------------------
+def test_extract_iter_matches_extract():
+    extractor = DocumentExtractor(use_ocr=False)
+    for name in ("1984.txt", "1984.pdf", "1984.docx"):
+        path = os.path.join(FILES_DIR, name)
+        parts = list(extractor.extract_iter(path))
+        assert len(parts) >= 1
+        assert " ".join("\n".join(parts).split()) == " ".join(extractor.extract(path).split())
+
+
+# ------------------------
+# 4. Длинное предложение режется, а не даёт огромный чанк
+# ------------------------
+def test_long_sentence_is_split():
+    sentence = " ".join(f"w{i}" for i in range(120)) + "."
+    chunks = pre.chunk_sentences(["короткое начало.", sentence, "хвост."])
+    assert max(len(c.split()) for c in chunks) <= pre.chunk_size
+    assert " ".join(chunks).split() == ["короткое", "начало."] + sentence.split() + ["хвост."]
+
+
+# ------------------------
+# 5. Бюджет в токенах и перекрытие соседних чанков
+# ------------------------
+def test_token_budget_and_overlap():
+    counter = TokenCounter(chars_per_token=2)
+    tokenized = TextPreprocessor(use_lemmatization=False, max_tokens=40, overlap=8, token_counter=counter)
+    sentences = [f"предложение номер {i} из нескольких слов." for i in range(30)]
+    chunks = tokenized.chunk_sentences(sentences)
+    assert all(counter.count(c) <= 40 for c in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        prev_words, cur_words = prev.split(), cur.split()
+        # начало следующего чанка повторяет хвост предыдущего, не больше overlap токенов
+        k = next(k for k in range(min(len(prev_words), len(cur_words)), 0, -1) if prev_words[-k:] == cur_words[:k])
+        assert counter.count(" ".join(cur_words[:k])) <= 8
+    # без перекрытия все слова идут ровно один раз
+    plain = TextPreprocessor(use_lemmatization=False, max_tokens=40, token_counter=counter).chunk_sentences(sentences)
+    assert " ".join(plain).split() == " ".join(sentences).split()
+
+
+# ------------------------
+# 6. Позиции слов в чанках с перекрытием
+# ------------------------
+def test_spans_with_overlap():
+    text = " ".join(f"Предложение {i} про науку." for i in range(40))
+    overlapping = TextPreprocessor(chunk_size=30, use_lemmatization=False, overlap=6)
+    spans = list(overlapping.process_spans([TextPart(text, 0, 1)]))
+    assert len(spans) > 2
+    for chunk, provenance in spans:
+        assert text[provenance["char_start"]:provenance["char_end"]] == chunk
+    assert spans[1][1]["char_start"] < spans[0][1]["char_end"]
+
+
+def test_token_counter_pickles_without_tokenizer():
+    counter = TokenCounter(chars_per_token=3)
+    assert counter("наука") == 2 and counter.count("a bb cccc") == 4
+    restored = pickle.loads(pickle.dumps(counter))
+    assert restored("наука") == 2 and restored.max_tokens() is None
+
+
+# ------------------------
+# 7. Очистка и разбиение на предложения совпадают с прежней реализацией
+# ------------------------
+def test_clean_and_split_match_legacy():
+    from benchmarks.preprocess_bench import legacy_clean_text, legacy_split_sentences
+
+    with open(os.path.join(FILES_DIR, "1984.txt"), "r", encoding="utf-8") as f:
+        text = f.read()
+    samples = [
+        text,
+        "Ёлка  стоит.\tСм. https://example.org/a?b=1 и www.site.ru!  Пи = 3.14, e = 2.71... Конец?",
+        "  http://x  ",
+        "",
+    ]
+    for sample in samples:
+        for flags in [(True, True, True), (False, False, False), (True, True, False), (True, False, True)]:
+            cleaned = pre.clean_text(sample, *flags)
+            # прежняя версия схлопывала пробелы до удаления символов и оставляла двойные пробелы
+            assert cleaned == " ".join(legacy_clean_text(sample, *flags).split())
+            assert pre.split_sentences(cleaned) == legacy_split_sentences(cleaned)
+    assert pre.split_sentences("Пи равно 3.14. Дальше текст.") == ["Пи равно 3.14.", "Дальше текст."]
+
+
+# ------------------------
+# 8. Пакетная лемматизация совпадает с поштучной и разбирает каждое слово один раз
+# ------------------------
+def test_lemmatize_many_matches_single():
+    from preprocess.lemma_cache import LemmaCache
+
+    class CountingMorph:
+        calls = 0
+
+        def parse(self, token):
+            CountingMorph.calls += 1
+            return []
+
+    lemmatizer = TextPreprocessor(morph=CountingMorph(), lemma_cache=LemmaCache())
+    texts = ["кошка спит", "кошка бежит кошка", "", "спит"]
+    assert lemmatizer.lemmatize_many(texts) == [lemmatizer.lemmatize_text(t) for t in texts] == texts
+    assert CountingMorph.calls == 3
+
+    real = TextPreprocessor()
+    texts = ["кошки спали на диванах", "собаки бегут по улицам"]
+    assert real.lemmatize_many(texts) == [real.lemmatize_text(t) for t in texts]
+
+
+# ------------------------
+# 9. Пока папки модели нет, токенизатор берётся по имени модели
+# ------------------------
+def test_token_counter_uses_model_name_before_download(tmp_path):
+    transformers = pytest.importorskip("transformers")
+    import json
+
+    hub = tmp_path / "hub_model"
+    hub.mkdir()
+    (hub / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "нау", "##ка"]), encoding="utf-8")
+    transformers.BertTokenizer(str(hub / "vocab.txt")).save_pretrained(str(hub))
+    (hub / "sentence_bert_config.json").write_text(json.dumps({"max_seq_length": 128}), encoding="utf-8")
+
+    # модель эмбеддингов ещё не скачана: local_dir не существует
+    embedder = type("Embedder", (), {"local_dir": str(tmp_path / "models" / "absent"), "model_name": str(hub)})()
+    counter = TokenCounter.for_embedder(embedder, chars_per_token=100)
+    assert counter.source == str(hub)
+    assert counter("наука") == 2 and counter.max_tokens() == 126
+    restored = pickle.loads(pickle.dumps(counter))
+    assert restored("наука") == 2
+
+
+# ------------------------
+# 10. Бюджет токенов считается по тексту, который уходит в эмбеддер (леммы длиннее словоформ)
+# ------------------------
+def test_token_budget_counts_processed_text():
+    text = (
+        "Люди шли быстрее, дети шли лучше, и мы шли домой. Ребята пришли раньше, чем люди ушли. "
+        "Лучшие люди шли вперёд, а худшие дети ушли назад. Мы нашли детей, которые шли с людьми. "
+    ) * 40
+    counter = TokenCounter(chars_per_token=2)
+    lemmatizer = TextPreprocessor()
+
+    def encoded_tokens(flag):
+        raw = TextPreprocessor(use_lemmatization=False, max_tokens=64, token_counter=counter, count_processed=flag)
+        chunks = [chunk for chunk, _ in raw.process_spans([TextPart(text, 0, 1)])]
+        assert " ".join(chunks).split() == text.replace("ё", "е").split()
+        return [counter.count(lemmatizer.lemmatize_text(lemmatizer.clean_text(chunk))) for chunk in chunks]
+
+    # по исходным словоформам чанки после лемматизации вылезают за бюджет
+    assert max(encoded_tokens(False)) > 64
+    assert max(encoded_tokens(True)) <= 64
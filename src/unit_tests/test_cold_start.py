@@ -0,0 +1,70 @@
+import sys
+import os
+import json
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from embedding.embedder import TextEmbedder, dimension_from_metadata
+from embedding.hash_embedder import HashEmbedder
+from data_manager.data_manager import DatabaseManager
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+# ------------------------
+# 1. Импорт пакета не тянет тяжёлые библиотеки
+# ------------------------
+def test_import_is_lazy():
+    code = (
+        "import sys, json\n"
+        "import data_manager.data_manager, seeker.seeker, retrieval.sharded\n"
+        "print(json.dumps([m for m in ('torch', 'sentence_transformers', 'faiss', 'fitz', 'docx', 'easyocr', 'pymorphy2') if m in sys.modules]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True).stdout
+    assert json.loads(out.strip().splitlines()[-1]) == []
+
+
+# ------------------------
+# 2. Размерность из конфигов модели, без загрузки весов
+# ------------------------
+def test_dimension_from_metadata(tmp_path):
+    model_dir = str(tmp_path / "model")
+    write_json(os.path.join(model_dir, "modules.json"), [
+        {"idx": 0, "path": "", "type": "sentence_transformers.models.Transformer"},
+        {"idx": 1, "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"},
+    ])
+    write_json(os.path.join(model_dir, "1_Pooling", "config.json"), {"word_embedding_dimension": 1024, "pooling_mode_mean_tokens": True, "pooling_mode_cls_token": False})
+    embedder = TextEmbedder(model_name="fake", local_dir=model_dir)
+    assert embedder.get_embedding_dim() == 1024 and not embedder.is_loaded
+
+    write_json(os.path.join(model_dir, "modules.json"), [
+        {"idx": 1, "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"},
+        {"idx": 2, "path": "2_Dense", "type": "sentence_transformers.models.Dense"},
+    ])
+    write_json(os.path.join(model_dir, "2_Dense", "config.json"), {"in_features": 1024, "out_features": 256})
+    assert dimension_from_metadata(model_dir) == 256
+    assert dimension_from_metadata(str(tmp_path / "missing")) is None
+
+
+# ------------------------
+# 3. DatabaseManager не кодирует ничего при создании
+# ------------------------
+class CountingEmbedder(HashEmbedder):
+    calls = 0
+
+    def encode(self, texts):
+        CountingEmbedder.calls += 1
+        return super().encode(texts)
+
+
+def test_database_opens_without_encode(tmp_path):
+    db = DatabaseManager(data_path=str(tmp_path / "data"), embedder=CountingEmbedder(dim=48))
+    assert db._retriever is None
+    assert db.retriever.dim == 48
+    assert CountingEmbedder.calls == 0
@@ -0,0 +1,399 @@
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from data_manager.data_manager import DatabaseManager
+from embedding.hash_embedder import HashEmbedder
+
+TEXTS = {
+    "cats.txt": "Кошка спит на диване. Кошка ловит мышей по ночам.",
+    "dogs.txt": "Собака охраняет дом. Собака бежит по улице за мячом.",
+    "birds.txt": "Птица поет на ветке. Птицы улетают на юг осенью.",
+}
+
+
+def write_corpus(folder, texts=TEXTS):
+    os.makedirs(folder, exist_ok=True)
+    for name, text in texts.items():
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    return folder
+
+
+def make_manager(tmp_path):
+    return DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64))
+
+
+# ------------------------
+# 1. Пакетная загрузка и сохранение одним разом
+# ------------------------
+def test_ingest_folder(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    with open(os.path.join(folder, "table.csv"), "w") as f:
+        f.write("a,b")
+    db = make_manager(tmp_path)
+
+    report = db.ingest_folder(folder)
+    assert set(report.added) == {os.path.join(folder, name) for name in TEXTS}
+    assert list(report.failed) == [os.path.join(folder, "table.csv")]
+    assert len(db.retriever.collector) == report.total_chunks
+
+    reloaded = make_manager(tmp_path)
+    assert len(reloaded.retriever.collector) == report.total_chunks
+    assert reloaded.query("кошка спит", top_k=1)[0]["file_path"].endswith("cats.txt")
+
+
+# ------------------------
+# 2. Повторная загрузка пропускает неизменившиеся файлы
+# ------------------------
+def test_reingest_skips_unchanged(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    first = db.ingest_folder(folder)
+
+    second = make_manager(tmp_path).ingest_folder(folder)
+    assert second.added == {}
+    assert len(second.skipped) == len(TEXTS)
+    assert len(make_manager(tmp_path).retriever.collector) == first.total_chunks
+
+
+# ------------------------
+# 3. Изменившийся файл заменяет прежнюю версию
+# ------------------------
+def test_changed_file_replaces_old_chunks(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    db.ingest_folder(folder)
+
+    path = os.path.join(folder, "cats.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Жираф ест листья акации.")
+    os.utime(path, (time.time() + 5, time.time() + 5))
+
+    db = make_manager(tmp_path)
+    report = db.ingest_folder(folder)
+    assert report.replaced == [path]
+    assert len(report.skipped) == 2
+
+    results = db.query("кошка спит на диване", top_k=10)
+    assert all("Кошка" not in r["text"] for r in results)
+    assert db.query("жираф ест листья", top_k=1)[0]["text"].startswith("Жираф")
+    assert len(os.listdir(db.raw_path)) == len(TEXTS)
+
+
+# ------------------------
+# 4. Одноимённые файлы из разных папок не затирают друг друга
+# ------------------------
+def test_same_basename_different_folders(tmp_path):
+    a = write_corpus(str(tmp_path / "a"), {"note.txt": "Первый текст про море."})
+    b = write_corpus(str(tmp_path / "b"), {"note.txt": "Второй текст про горы."})
+    db = make_manager(tmp_path)
+    report = db.add_articles([os.path.join(a, "note.txt"), os.path.join(b, "note.txt")])
+    assert len(report.added) == 2
+    assert len(os.listdir(db.raw_path)) == 2
+
+
+# ------------------------
+# 5. Пул процессов даёт тот же результат
+# ------------------------
+def test_parallel_ingest_matches_serial(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    serial = DatabaseManager(data_path=str(tmp_path / "serial"), embedder=HashEmbedder(dim=64))
+    parallel = DatabaseManager(data_path=str(tmp_path / "parallel"), embedder=HashEmbedder(dim=64))
+
+    # сверка с манифестом идёт в главном потоке, а не в потоке-поставщике пула
+    threads = []
+    check = parallel.manifest.check
+    parallel.manifest.check = lambda *args: threads.append(threading.current_thread()) or check(*args)
+
+    serial_report = serial.ingest_folder(folder)
+    parallel_report = parallel.ingest_folder(folder, workers=2, queue_size=1)
+    assert parallel_report.added == serial_report.added
+    assert threads and all(thread is threading.main_thread() for thread in threads)
+    assert [c.text for c in parallel.retriever.collector] == [c.text for c in serial.retriever.collector]
+
+
+# ------------------------
+# 6. Удаление и принудительное обновление документа
+# ------------------------
+def test_remove_and_update_document(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    db.ingest_folder(folder)
+    cats = os.path.join(folder, "cats.txt")
+
+    report = db.update_document(cats)
+    assert list(report.added) == [cats] and report.replaced == [cats]
+    assert db.query("кошка спит", top_k=1)[0]["file_path"].endswith("cats.txt")
+
+    assert db.remove_document(cats)
+    assert not db.remove_document(cats)
+    reloaded = make_manager(tmp_path)
+    assert all(not r["file_path"].endswith("cats.txt") for r in reloaded.query("кошка спит", top_k=10))
+    assert reloaded.manifest.get(cats) is None
+
+
+# ------------------------
+# 7. База из нескольких шардов
+# ------------------------
+def test_sharded_database(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64), shards=2)
+    report = db.ingest_folder(folder)
+    assert db.remove_document(os.path.join(folder, "dogs.txt"))
+
+    reloaded = make_manager(tmp_path)
+    assert len(reloaded.retriever.shards) == 2
+    assert len(reloaded.retriever.collector) == report.total_chunks
+    assert reloaded.query("кошка спит", top_k=1)[0]["file_path"].endswith("cats.txt")
+    assert all(not r["file_path"].endswith("dogs.txt") for r in reloaded.query("собака", top_k=10))
+
+
+# ------------------------
+# 8. Большой документ кодируется частями, номера чанков идут подряд
+# ------------------------
+def test_large_document_streams_in_parts(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"), {
+        "big.txt": " ".join(f"Предложение номер {i} про длинную книгу." for i in range(3000)),
+        "cats.txt": TEXTS["cats.txt"],
+    })
+    db = make_manager(tmp_path)
+    calls = []
+    encode = db.embedder.encode
+    db.embedder.encode = lambda texts: calls.append(len(texts)) or encode(texts)
+
+    report = db.ingest_folder(folder, embed_batch=16)
+    assert report.added[os.path.join(folder, "big.txt")] > 16
+    assert max(calls) <= 32
+    big = db.manifest.get(os.path.join(folder, "big.txt"))
+    assert big.chunk_ids == list(range(big.chunk_ids[0], big.chunk_ids[0] + len(big.chunk_ids)))
+    assert len(db.retriever.collector) == report.total_chunks
+
+
+# ------------------------
+# 9. Страницы, разделы, смещения и метаданные PDF в чанках
+# ------------------------
+def test_chunk_provenance_pdf(tmp_path):
+    import fitz
+
+    folder = str(tmp_path / "src")
+    os.makedirs(folder)
+    path = os.path.join(folder, "paper.pdf")
+    doc = fitz.open()
+    for page in range(3):
+        doc.new_page().insert_text((72, 72), f"Page {page} opens here. " + "Some words about topic {page}. ".format(page=page) * 3)
+    doc.set_toc([[1, "Introduction", 1], [1, "Methods", 3]])
+    doc.set_metadata({"title": "A Study", "author": "Ivanov; Petrov"})
+    doc.save(path)
+
+    db = DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64))
+    db.raw_preprocessor.chunk_size = 10
+    db.ingest_folder(folder)
+
+    chunks = [db.retriever.collector.entry(i) for i in range(len(db.retriever.collector))]
+    stored = db.manifest.get(path).stored_path
+    text = db.extractor.extract(stored)
+    for chunk in chunks:
+        assert " ".join(text[chunk["char_start"]:chunk["char_end"]].split()) == chunk["text"]
+        assert chunk["title"] == "A Study" and chunk["authors"] == ["Ivanov", "Petrov"]
+    assert chunks[0]["page"] == 1 and chunks[0]["section"] == "Introduction"
+    assert chunks[-1]["page_end"] == 3 and chunks[-1]["section"] == "Methods"
+
+    context = db.retriever.get_context(2, window=1)
+    assert [c["chunk_id"] for c in context] == [1, 2, 3]
+
+
+# ------------------------
+# 10. Лексический индекс строится при загрузке и следует за удалениями
+# ------------------------
+def test_lexical_index_follows_ingest(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    db.ingest_folder(folder)
+    assert os.path.exists(db.lexical_path)
+
+    reloaded = make_manager(tmp_path)
+    [(chunk_id, _)] = reloaded.lexical.search("улица", top_k=5)
+    assert reloaded.texts[chunk_id].file_path.endswith("dogs.txt")
+
+    reloaded.remove_document(os.path.join(folder, "dogs.txt"))
+    assert make_manager(tmp_path).lexical.search("улица") == []
+
+    os.remove(db.lexical_path)
+    rebuilt = make_manager(tmp_path)
+    rebuilt.rebuild_lexical()
+    assert rebuilt.lexical.search("улица") == []
+    assert rebuilt.texts[rebuilt.lexical.search("кошка")[0][0]].file_path.endswith("cats.txt")
+
+
+# ------------------------
+# 11. Смена типа индекса и числа шардов без повторного кодирования
+# ------------------------
+def test_rebuild_index_from_stored_embeddings(tmp_path):
+    from retrieval.index_factory import IndexSpec
+    from retrieval.sharded import ShardedRetriever, is_sharded
+
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    db.ingest_folder(folder)
+    db.remove_document(os.path.join(folder, "birds.txt"))
+    expected = db.query("кошка спит", top_k=2)
+
+    db.embedder.encode = None  # модель больше не нужна
+    db.rebuild_index(IndexSpec("flat"), shards=2)
+    assert isinstance(db.retriever, ShardedRetriever) and is_sharded(db.index_path)
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.retriever.ntotal == 2
+    assert [r["chunk_id"] for r in reloaded.query("кошка спит", top_k=2)] == [r["chunk_id"] for r in expected]
+
+    reloaded.rebuild_index(IndexSpec("hnsw", m=16), shards=1)
+    assert not is_sharded(reloaded.index_path)
+    again = make_manager(tmp_path)
+    assert again.retriever.index.ntotal == 2
+    assert again.query("кошка спит", top_k=1)[0]["file_path"].endswith("cats.txt")
+    # без spec перестройка сохраняет тип индекса, записанный рядом с ним
+    again.rebuild_index()
+    assert make_manager(tmp_path).retriever.spec == IndexSpec("hnsw", m=16)
+
+
+# ------------------------
+# 12. Нарезка по токенам модели с перекрытием
+# ------------------------
+def test_token_chunking_with_overlap(tmp_path):
+    text = " ".join(f"Предложение номер {i} о кошках и собаках." for i in range(60))
+    folder = write_corpus(str(tmp_path / "src"), {"long.txt": text})
+    db = DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64), chunk_tokens=64, chunk_overlap=16)
+    report = db.ingest_folder(folder)
+    chunks = list(db.texts)
+    assert report.total_chunks == len(chunks) > 2
+    counter = db.chunking["token_counter"]
+    assert all(counter.count(chunk.text) <= 64 for chunk in chunks)
+    assert chunks[1].char_start < chunks[0].char_end
+
+    with pytest.raises(ValueError):
+        DatabaseManager(data_path=str(tmp_path / "other"), embedder=HashEmbedder(dim=64), chunk_tokens="model")
+
+
+# ------------------------
+# 13. Фильтры по документам, времени загрузки и меткам
+# ------------------------
+def test_query_filters_and_tags(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    db.ingest_folder(folder)
+    cats, dogs = os.path.join(folder, "cats.txt"), os.path.join(folder, "dogs.txt")
+
+    found = db.query("кошка спит", top_k=5, filter={"documents": dogs})
+    assert found and all(r["file_path"].endswith("dogs.txt") for r in found)
+    assert db.query("кошка спит", top_k=5, filter={"added": (time.time() + 60, None)}) == []
+    assert len(db.query("кошка спит", top_k=5, filter={"added": (None, time.time())})) == db.retriever.ntotal
+
+    assert db.tag_document(cats, "домашние") and db.tag_document(dogs, "домашние")
+    assert not db.tag_document(os.path.join(folder, "нет.txt"), "домашние")
+    assert db.untag_document(dogs, "домашние")
+    # метки сохраняются и переходят к новой версии документа
+    with open(cats, "a", encoding="utf-8") as f:
+        f.write(" Кошка мурлычет.")
+    db.update_document(cats)
+    reloaded = make_manager(tmp_path)
+    found = reloaded.query("собака", top_k=5, filter={"tags": "домашние"})
+    assert found and {r["chunk_id"] for r in found} == set(reloaded.manifest.get(cats).chunk_ids)
+
+    # метки переживают перераскладку по шардам и обратно
+    for shards in (2, 1):
+        reloaded.rebuild_index(shards=shards)
+        found = make_manager(tmp_path).query("собака", top_k=5, filter={"tags": "домашние"})
+        assert {r["chunk_id"] for r in found} == set(reloaded.manifest.get(cats).chunk_ids)
+
+
+# ------------------------
+# 14. Сбой индекса и перераскладки не портит хранилище эмбеддингов и базу на диске
+# ------------------------
+def test_failures_keep_store_and_disk_consistent(tmp_path, monkeypatch):
+    from retrieval.sharded import ShardedRetriever
+
+    folder = write_corpus(str(tmp_path / "src"))
+    db = make_manager(tmp_path)
+    db.add_articles([os.path.join(folder, "cats.txt")])
+    add = db.retriever.add_embeddings
+
+    def fail(*args):
+        raise RuntimeError("boom")
+
+    db.retriever.add_embeddings = fail
+    report = db.add_articles([os.path.join(folder, "dogs.txt")])
+    assert list(report.failed) == [os.path.join(folder, "dogs.txt")]
+    assert len(db.embeddings) == len(db.texts)
+    db.retriever.add_embeddings = add
+    report = db.add_articles([os.path.join(folder, "dogs.txt"), os.path.join(folder, "birds.txt")])
+    assert len(report.added) == 2 and len(db.embeddings) == len(db.texts)
+
+    # новая раскладка не записалась — старая база на месте и загружается
+    monkeypatch.setattr(ShardedRetriever, "save", fail)
+    with pytest.raises(RuntimeError):
+        db.rebuild_index(shards=2)
+    monkeypatch.undo()
+    reloaded = make_manager(tmp_path)
+    assert not isinstance(reloaded.retriever, ShardedRetriever) and reloaded.retriever.ntotal == len(db.texts)
+
+    reloaded.rebuild_index(shards=2)
+    assert isinstance(make_manager(tmp_path).retriever, ShardedRetriever)
+    assert not [name for name in os.listdir(tmp_path / "data") if name.endswith((".old", ".reshard"))]
+
+
+# ------------------------
+# 15. Сбой на середине большого документа: остальные части не записываются, документ не считается добавленным
+# ------------------------
+def test_failure_mid_document_is_not_recorded(tmp_path):
+    big = os.path.join(str(tmp_path / "src"), "big.txt")
+    folder = write_corpus(str(tmp_path / "src"), {
+        "big.txt": " ".join(f"Предложение номер {i} про длинную книгу." for i in range(3000)),
+        "cats.txt": TEXTS["cats.txt"],
+    })
+    db = make_manager(tmp_path)
+    calls = []
+    encode = db.embedder.encode
+
+    def flaky(texts):
+        calls.append(len(texts))
+        if len(calls) == 2:
+            raise RuntimeError("boom")
+        return encode(texts)
+
+    db.embedder.encode = flaky
+    report = db.add_articles([big, os.path.join(folder, "cats.txt")], embed_batch=16)
+    # две части big.txt (вторая упала), остальные его части не кодируются, затем cats.txt
+    assert len(calls) == 3
+    assert list(report.failed) == [big] and big not in report.added
+    assert db.manifest.get(big) is None
+    # в выдаче остались только чанки cats.txt
+    collector = db.retriever.collector
+    live = [i for i in range(len(collector)) if i not in collector.deleted]
+    assert live == db.manifest.get(os.path.join(folder, "cats.txt")).chunk_ids
+
+    # следующая загрузка заново добавляет упавший документ
+    db.embedder.encode = encode
+    report = db.add_articles([big, os.path.join(folder, "cats.txt")], embed_batch=16)
+    assert list(report.added) == [big] and len(report.skipped) == 1
+
+
+# ------------------------
+# 16. Пул процессов OCR останавливается после загрузки и при закрытии базы
+# ------------------------
+def test_ocr_pool_is_shut_down(tmp_path):
+    folder = write_corpus(str(tmp_path / "src"))
+    db = DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64), ocr_workers=1)
+    pool = db.extractor.ocr.pool
+    assert pool.submit(os.getpid).result() != os.getpid()
+    processes = list(pool._processes.values())
+    db.ingest_folder(folder)
+    assert db.extractor.ocr._pool is None and not any(process.is_alive() for process in processes)
+
+    with DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64), ocr_workers=1) as db:
+        db.extractor.ocr.pool.submit(os.getpid).result()
+        assert db.query("кошка", top_k=1)
+    assert db.extractor.ocr._pool is None
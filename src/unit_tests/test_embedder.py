@@ -6,15 +6,17 @@ import difflib
 import numpy as np
 import pytest
 
-# Добавляем корень проекта
+# Добавляем корень проекта и src
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.embedding.embedder import TextEmbedder
-from src.extract.text_extractor import DocumentExtractor
+from embedding.embedder import TextEmbedder
+from extract.text_extractor import DocumentExtractor
+from resources.registry import registry
 
 
-# Глобальный эмбеддер (ленивая загрузка)
-embedder = TextEmbedder(model_name="all-MiniLM-L6-v2")
+# Глобальный эмбеддер из общего реестра
+embedder = registry.embedder(model_name="all-MiniLM-L6-v2")
 
 # Экстрактор текстов
 extractor = DocumentExtractor()
@@ -0,0 +1,70 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+import pytest
+from embedding.embedder import TextEmbedder, length_buckets
+
+DIM = 8
+
+
+class FakeModel:
+    """Вместо SentenceTransformer: запоминает батчи, вектор зависит только от текста."""
+
+    max_seq_length = 128
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size, show_progress_bar, convert_to_numpy, normalize_embeddings):
+        self.calls.append((list(texts), batch_size, show_progress_bar))
+        vectors = np.stack([np.full(DIM, len(t.split()), dtype=np.float32) for t in texts])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_embedder(**kwargs):
+    embedder = TextEmbedder(local_dir="/nonexistent", **kwargs)
+    embedder._model = FakeModel()
+    return embedder
+
+
+# ------------------------
+# 1. Батчи по длине: не больше batch_size текстов и max_batch_tokens токенов
+# ------------------------
+def test_length_buckets():
+    lengths = [5, 100, 7, 100, 6, 50]
+    buckets = length_buckets(lengths, batch_size=3, max_batch_tokens=200)
+    assert [list(b) for b in buckets] == [[1, 3], [5, 2, 4], [0]]
+    assert sorted(np.concatenate(buckets).tolist()) == list(range(len(lengths)))
+    assert all(len(b) == 1 for b in length_buckets([10] * 4, batch_size=8, max_batch_tokens=15))
+
+
+# ------------------------
+# 2. Результат в исходном порядке, батчи отсортированы, без прогресс-бара
+# ------------------------
+def test_encode_restores_order():
+    embedder = make_embedder(batch_size=2)
+    texts = ["один", "два слова тут и там", "три слова тут", "четыре"]
+    vectors = embedder.encode(texts)
+    assert vectors.shape == (4, DIM) and vectors.dtype == np.float32
+    calls = embedder.model.calls
+    assert [c[0] for c in calls] == [["два слова тут и там", "три слова тут"], ["один", "четыре"]]
+    assert not any(show for _, _, show in calls)
+    expected = make_embedder()
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, expected.encode_query(text)[0])
+
+
+# ------------------------
+# 3. Один текст идёт коротким путём
+# ------------------------
+def test_single_text_fast_path():
+    embedder = make_embedder()
+    assert embedder.encode(["запрос"]).shape == (1, DIM)
+    assert embedder.model.calls == [(["запрос"], 1, False)]
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        TextEmbedder(backend="cuda")
@@ -0,0 +1,70 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+import pytest
+from retrieval.embedding_store import EmbeddingStore
+from retrieval.retriever import VectorRetriever
+from retrieval.index_factory import IndexSpec
+from conftest import DIM, make_chunks, random_vectors
+
+
+
+# ------------------------
+# 1. Дописывание, перечитывание и недописанный хвост
+# ------------------------
+def test_append_and_reopen(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "emb"), model="hash")
+    vectors = random_vectors(10)
+    store.append(0, vectors[:6])
+    store.append(6, vectors[6:])
+    store.flush()
+    store.append(10, random_vectors(3, seed=1))  # без flush: после перезапуска этих строк нет
+
+    reopened = EmbeddingStore(str(tmp_path / "emb"), model="hash")
+    assert len(reopened) == 10 and reopened.dim == DIM
+    np.testing.assert_allclose(reopened.get(np.arange(10)), vectors, atol=1e-3)
+    reopened.append(10, vectors[:2])
+    assert os.path.getsize(reopened.path) == 12 * DIM * 2
+
+    with pytest.raises(ValueError):
+        reopened.append(5, vectors[:1])
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(tmp_path / "emb"), model="other").append(12, vectors[:1])
+
+
+# ------------------------
+# 2. Пропущенные строки не считаются сохранёнными
+# ------------------------
+def test_holes(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "emb"), dtype="float32")
+    store.append(4, random_vectors(2))
+    store.flush()
+    reopened = EmbeddingStore(str(tmp_path / "emb"))
+    assert reopened.dtype == np.float32
+    assert reopened.covers([4, 5]) and not reopened.covers([3, 4]) and not reopened.covers([6])
+
+
+# ------------------------
+# 3. Индекс другого типа строится из хранилища, номера чанков сохраняются
+# ------------------------
+def test_retriever_rebuild_from_store(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "emb"))
+    vectors = random_vectors(300)
+    retriever = VectorRetriever(dim=DIM)
+    retriever.attach_embeddings(store)
+    store.append(0, vectors)
+    retriever.add_embeddings(vectors, make_chunks(300))
+    retriever.remove_chunks([0, 1, 2])
+
+    retriever.rebuild(IndexSpec("ivf_flat", nlist=4), block_size=64)
+    assert retriever.spec.kind == "ivf_flat" and not retriever.tombstones
+    assert retriever.index.ntotal == 297
+    results = retriever.search_batch(vectors[3:23], top_k=1, nprobe=4)
+    assert all(row[0]["chunk_id"] == i + 3 for i, row in enumerate(results))
+
+    bare = VectorRetriever(dim=DIM)
+    bare.add_embeddings(vectors[:5], make_chunks(5))
+    with pytest.raises(ValueError):
+        bare.rebuild(IndexSpec("flat"))
@@ -0,0 +1,53 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+from embedding.hash_embedder import HashEmbedder
+from benchmarks.retrieval_bench import run_benchmark
+
+embedder = HashEmbedder(dim=128)
+
+
+# ------------------------
+# 1. Интерфейс как у TextEmbedder
+# ------------------------
+def test_shapes_and_norms():
+    assert embedder.encode([]).shape == (0, embedder.get_embedding_dim())
+    embeddings = embedder.encode(["Кот", "Собака", "Птица"])
+    assert embeddings.shape == (3, 128)
+    assert embeddings.dtype == np.float32
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+    assert np.all(embedder.encode([""]) == 0)
+
+
+# ------------------------
+# 2. Детерминированность
+# ------------------------
+def test_deterministic():
+    a = HashEmbedder(dim=128).encode(["Москва — столица России."])
+    b = HashEmbedder(dim=128).encode(["Москва — столица России."])
+    assert np.array_equal(a, b)
+
+
+# ------------------------
+# 3. Общие слова дают близкие векторы
+# ------------------------
+def test_word_overlap_similarity():
+    e = embedder.encode([
+        "москва столица россии",
+        "москва столица россии и крупный город",
+        "париж столица франции",
+        "рыба плавает в пруду",
+    ])
+    assert np.dot(e[0], e[1]) > np.dot(e[0], e[2]) > np.dot(e[0], e[3])
+
+
+# ------------------------
+# 4. Бенчмарк отрабатывает без сети
+# ------------------------
+def test_benchmark_smoke(tmp_path):
+    report = run_benchmark(docs=3, words_per_doc=400, queries=10, top_k=3, embedder=embedder, lemmatize=False, corpus_dir=str(tmp_path))
+    assert report["chunks"] > 0
+    assert set(report["stages"]) >= {"extract", "chunk", "encode", "index_add", "search_batch"}
+    assert report["recall@3"] > 0.5
@@ -0,0 +1,62 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from resources.cache import LRUCache
+from preprocess.lemma_cache import LemmaCache
+
+
+# ------------------------
+# 1. Вытеснение самых старых записей
+# ------------------------
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+# ------------------------
+# 2. Счётчики попаданий
+# ------------------------
+def test_hit_miss_counters():
+    cache = LRUCache()
+    cache.put("x", "")
+    assert cache.get("x") == ""
+    assert cache.get("y") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.hit_rate == 0.5
+
+
+# ------------------------
+# 3. TTL
+# ------------------------
+def test_ttl_expiry():
+    cache = LRUCache(ttl=0.01)
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+
+# ------------------------
+# 4. Сохранение и загрузка
+# ------------------------
+def test_lemma_cache_roundtrip(tmp_path):
+    path = str(tmp_path / "lemmas.pkl")
+    cache = LemmaCache(maxsize=10)
+    cache.put("столицей", "столица")
+    cache.put("мыла", "мыть")
+    cache.save(path)
+
+    restored = LemmaCache(maxsize=10)
+    assert restored.load(path) == 2
+    assert restored.get("столицей") == "столица"
+    assert restored.items()[-1] == ("столицей", "столица")
+    assert LemmaCache().load(str(tmp_path / "missing.pkl")) == 0
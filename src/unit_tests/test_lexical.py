@@ -0,0 +1,105 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from retrieval.lexical import LexicalIndex, tokenize
+
+TEXTS = [
+    "кошка спать на диван",
+    "собака бежать по улица за кошка",
+    "формула e = mc2 эйнштейн",
+    "птица петь на ветка",
+]
+
+
+def make_index():
+    index = LexicalIndex()
+    index.add(0, TEXTS)
+    return index
+
+
+# ------------------------
+# 1. Редкий термин находит свой чанк, частый — ранжируется по BM25
+# ------------------------
+def test_bm25_ranking():
+    index = make_index()
+    assert index.search("mc2", top_k=5) == [(2, pytest.approx(index.search("mc2")[0][1]))]
+    ranked = [chunk_id for chunk_id, _ in index.search("кошка диван", top_k=5)]
+    assert ranked == [0, 1]
+    assert index.search("жираф") == []
+
+
+# ------------------------
+# 2. Удалённые чанки пропадают сразу, compact не меняет выдачу
+# ------------------------
+def test_remove_and_compact():
+    index = make_index()
+    index.remove([0])
+    assert [chunk_id for chunk_id, _ in index.search("кошка")] == [1]
+    assert index.docs == len(TEXTS) - 1
+    before = [chunk_id for chunk_id, _ in index.search("кошка собака птица", top_k=5)]
+    index.compact()
+    assert [chunk_id for chunk_id, _ in index.search("кошка собака птица", top_k=5)] == before
+    assert [chunk_id for chunk_id, _ in index.search("кошка", exclude={1})] == []
+
+
+# ------------------------
+# 3. Сохранение и загрузка; добавление после загрузки продолжает нумерацию
+# ------------------------
+def test_save_load(tmp_path):
+    index = make_index()
+    index.remove([3])
+    path = str(tmp_path / "articles.index.lexical.npz")
+    index.save(path)
+
+    loaded = LexicalIndex.load(path)
+    assert loaded.search("кошка диван", top_k=5) == index.search("кошка диван", top_k=5)
+    assert loaded.docs == index.docs and loaded.deleted == {3}
+
+    loaded.add(6, ["кошка мурлыкать"])
+    assert len(loaded) == 7
+    assert 6 in [chunk_id for chunk_id, _ in loaded.search("мурлыкать")]
+    with pytest.raises(ValueError):
+        loaded.add(2, ["повтор"])
+
+
+def test_tokenize_matches_query_and_chunk():
+    assert tokenize("E = MC2, кошка!") == ["e", "mc2", "кошка"]
+
+
+# ------------------------
+# 4. Разреженный подсчёт совпадает с BM25 по формуле для каждого чанка
+# ------------------------
+def test_sparse_scores_match_reference():
+    import math
+    import random
+
+    rng = random.Random(0)
+    words = [f"слово{i}" for i in range(40)]
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 30))) for _ in range(300)]
+    index = LexicalIndex()
+    index.add(0, texts)
+    index.remove(range(0, 300, 7))
+
+    live = [i for i in range(300) if i % 7]
+    avg = sum(len(texts[i].split()) for i in live) / len(live)
+    query = "слово1 слово2 слово3"
+
+    def reference(chunk_id):
+        tokens = texts[chunk_id].split()
+        score = 0.0
+        for term in set(query.split()):
+            freq = tokens.count(term)
+            if not freq:
+                continue
+            df = sum(term in texts[i].split() for i in range(300))
+            idf = math.log(1.0 + (len(live) - df + 0.5) / (df + 0.5))
+            score += idf * freq * (index.k1 + 1) / (freq + index.k1 * (1 - index.b + index.b * len(tokens) / avg))
+        return score
+
+    allowed = list(range(0, 300, 2))
+    found = index.search(query, top_k=10, exclude={4}, include=allowed)
+    expected = sorted((i for i in live if i % 2 == 0 and i != 4 and reference(i) > 0), key=lambda i: (-reference(i), i))[:10]
+    assert [chunk_id for chunk_id, _ in found] == expected
+    assert [score for _, score in found] == pytest.approx([reference(i) for i in expected], rel=1e-5)
@@ -0,0 +1,121 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from retrieval.retriever import VectorRetriever
+from retrieval.index_factory import IndexSpec
+from retrieval.sharded import ShardedRetriever
+from retrieval.metadata import filter_key
+from conftest import AUTHORS, DIM, make_chunks, random_vectors
+
+
+def expected(chunks, predicate):
+    return [i for i, chunk in enumerate(chunks) if predicate(chunk)]
+
+
+# ------------------------
+# 1. Выборка по полям: И между полями, ИЛИ внутри поля, диапазоны страниц
+# ------------------------
+def test_select_fields():
+    chunks = make_chunks(40, docs=4, authors=AUTHORS)
+    retriever = VectorRetriever(dim=DIM)
+    retriever.add_embeddings(random_vectors(40), chunks)
+
+    assert list(retriever.select({"file_path": "doc1.txt"})) == expected(chunks, lambda c: c.file_path == "doc1.txt")
+    assert list(retriever.select({"authors": "Сидоров"})) == expected(chunks, lambda c: "Сидоров" in c.authors)
+    assert list(retriever.select({"file_path": ["doc0.txt", "doc2.txt"], "page": (3, 5)})) == expected(
+        chunks, lambda c: c.file_path in ("doc0.txt", "doc2.txt") and 3 <= c.page <= 5
+    )
+    assert list(retriever.select({"page": (None, 2)})) == list(range(8))
+    assert len(retriever.select({"authors": "Нет такого"})) == 0
+
+    # добавленные позже чанки попадают в выборку, удалённые — нет
+    retriever.add_embeddings(random_vectors(4, seed=1), make_chunks(4, docs=4, authors=AUTHORS))
+    retriever.remove_chunks([1])
+    assert list(retriever.select({"file_path": "doc1.txt"})) == [5, 9, 13, 17, 21, 25, 29, 33, 37, 41]
+
+    with pytest.raises(ValueError):
+        retriever.select({"year": 2020})
+    assert filter_key({"page": (1, 2), "file_path": "a"}) == filter_key({"file_path": ["a"], "page": [1, 2]})
+
+
+# ------------------------
+# 2. Точный перебор и IDSelector дают одну и ту же выдачу
+# ------------------------
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivf_flat"])
+def test_filtered_search_paths(kind):
+    vectors, chunks = random_vectors(600), make_chunks(600, docs=4, authors=AUTHORS)
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec(kind, nlist=8, train_size=600))
+    retriever.add_embeddings(vectors, chunks)
+    flt = {"file_path": "doc2.txt", "page": (10, 120)}
+    allowed = set(retriever.select(flt))
+
+    exact = retriever.search_batch(vectors[:10], top_k=5, nprobe=8, ef_search=128, filter=flt)
+    retriever.exact_filter_max = retriever.exact_filter_fraction = 0
+    selected = retriever.search_batch(vectors[:10], top_k=5, nprobe=8, ef_search=128, filter=flt)
+    for row_exact, row_sel in zip(exact, selected):
+        assert len(row_exact) == 5 and {r["chunk_id"] for r in row_exact} <= allowed
+        assert {r["chunk_id"] for r in row_sel} <= allowed
+        assert row_exact[0]["chunk_id"] == row_sel[0]["chunk_id"]
+
+    # подходящий чанк находит сам себя на обоих путях
+    own = sorted(allowed)[:5]
+    for limit in (0, 8192):
+        retriever.exact_filter_max = limit
+        found = retriever.search_batch(vectors[own], top_k=1, nprobe=8, ef_search=128, filter=flt)
+        assert [row[0]["chunk_id"] for row in found] == own
+
+    assert retriever.search_batch(vectors[:2], top_k=5, filter={"authors": "Нет такого"}) == [[], []]
+
+
+# ------------------------
+# 3. Метки: фильтр, сохранение и загрузка, шарды
+# ------------------------
+def test_tags_persist_and_shard(tmp_path):
+    vectors, chunks = random_vectors(300), make_chunks(300, docs=10, authors=AUTHORS)
+    retriever = VectorRetriever(dim=DIM)
+    retriever.add_embeddings(vectors, chunks)
+    version = retriever.version
+    retriever.tag(range(0, 300, 3), "избранное")
+    retriever.tag([1, 2], "черновик")
+    retriever.untag([2], "черновик")
+    assert retriever.version > version
+    assert retriever.tags_of([1, 4]) == {"черновик"} and retriever.tags_of([3]) == {"избранное"}
+
+    retriever.save(str(tmp_path / "a.index"), str(tmp_path / "chunks"))
+    loaded = VectorRetriever.load(str(tmp_path / "a.index"), str(tmp_path / "chunks"))
+    assert list(loaded.select({"tags": "черновик"})) == [1]
+    found = loaded.search_batch(vectors[:5], top_k=3, filter={"tags": "избранное"})
+    assert all(r["chunk_id"] % 3 == 0 for row in found for r in row)
+
+    sharded = ShardedRetriever(dim=DIM, shards=3)
+    sharded.add_embeddings(vectors, chunks)
+    sharded.tag(range(0, 300, 3), "избранное")
+    assert list(sharded.select({"tags": "избранное", "file_path": "doc3.txt"})) == list(range(3, 300, 30))
+    assert list(sharded.select({"ids": [5, 7, 299]})) == [5, 7, 299]
+    found = sharded.search_batch(vectors[:5], top_k=4, filter={"tags": "избранное", "page": (1, 10)})
+    assert all(r["chunk_id"] % 3 == 0 and r["page"] <= 10 for row in found for r in row)
+    assert found[3][0]["chunk_id"] == 3
+    assert sharded.tags_of([3, 4]) == {"избранное"}
+
+
+# ------------------------
+# 4. Сильный фильтр на HNSW: IDSelector добирает top_k повторными поисками
+# ------------------------
+def test_selective_filter_fills_top_k():
+    vectors, chunks = random_vectors(20000), make_chunks(20000, docs=40, authors=AUTHORS)
+    retriever = VectorRetriever(dim=DIM)
+    retriever.add_embeddings(vectors, chunks)
+    retriever.exact_filter_max = retriever.exact_filter_fraction = 0
+    flt = {"file_path": "doc7.txt"}
+    allowed = set(retriever.select(flt))
+    assert len(allowed) == 500
+
+    found = retriever.search_batch(random_vectors(50, seed=3), top_k=50, filter=flt)
+    assert all(len(row) == 50 and {r["chunk_id"] for r in row} <= allowed for row in found)
+
+    # доля индекса меньше exact_filter_fraction — точный перебор, даже если список длинный
+    retriever.exact_filter_fraction = 0.05
+    exact = retriever.search_batch(random_vectors(5, seed=4), top_k=50, filter=flt)
+    assert all(len(row) == 50 for row in exact)
@@ -0,0 +1,115 @@
+import sys
+import os
+import io
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from resources.metrics import COUNT_BUCKETS, Metrics, json_log_sink, metrics
+
+
+@pytest.fixture
+def global_metrics():
+    """Включённый общий реестр на время теста; после него — чистый и выключенный, как по умолчанию."""
+    was_enabled = metrics.enabled
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.enable(was_enabled)
+    metrics.reset()
+
+
+# ------------------------
+# 1. Выключенный реестр ничего не копит
+# ------------------------
+def test_disabled_is_noop():
+    registry = Metrics(enabled=False)
+    with registry.timer("stage_seconds", stage="x"):
+        registry.inc("calls_total")
+        registry.observe("size", 3)
+    assert list(registry.timed_iter([1, 2], "wait_seconds")) == [1, 2]
+    assert registry.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+# ------------------------
+# 2. Счётчики, гистограммы и формат Prometheus
+# ------------------------
+def test_counters_histograms_prometheus():
+    registry = Metrics(enabled=True)
+    registry.set_buckets("chunks_per_document", COUNT_BUCKETS)
+    registry.inc("documents_total", 2, status="added")
+    registry.inc("documents_total", status="added")
+    registry.set("chunks", 10)
+    for value in (1, 3, 70):
+        registry.observe("chunks_per_document", value)
+    with registry.timer("stage_seconds", stage="encode"):
+        pass
+    registry.add_collector(lambda m: m.set("index_vectors", 7))
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == {'documents_total{status="added"}': 3}
+    assert snapshot["gauges"] == {"chunks": 10, "index_vectors": 7}
+    histogram = snapshot["histograms"]["chunks_per_document"]
+    assert histogram["count"] == 3 and histogram["sum"] == 74
+    assert histogram["buckets"]["1"] == 1 and histogram["buckets"]["5"] == 2 and histogram["buckets"]["+Inf"] == 3
+    assert snapshot["histograms"]['stage_seconds{stage="encode"}']["count"] == 1
+
+    text = registry.prometheus()
+    assert "# TYPE text2sci_documents_total counter" in text
+    assert 'text2sci_documents_total{status="added"} 3' in text
+    assert 'text2sci_stage_seconds_bucket{stage="encode",le="+Inf"} 1' in text
+    assert "text2sci_chunks_per_document_count 3" in text
+
+
+# ------------------------
+# 3. Подписчики получают события таймеров, timed_iter меряет ожидание элементов
+# ------------------------
+def test_sinks_and_timed_iter():
+    registry = Metrics(enabled=True)
+    stream = io.StringIO()
+    registry.add_sink(json_log_sink(stream))
+    assert list(registry.timed_iter(iter("ab"), "wait_seconds", source="queue")) == ["a", "b"]
+    with pytest.raises(ValueError):
+        with registry.timer("stage_seconds", stage="boom"):
+            raise ValueError("boom")
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    # два элемента и завершение итератора
+    assert [e["metric"] for e in events] == ["wait_seconds"] * 3 + ["stage_seconds"]
+    assert events[0]["source"] == "queue" and events[-1]["error"] == "ValueError"
+
+
+# ------------------------
+# 4. Загрузка документов и поиск пишут метрики этапов
+# ------------------------
+def test_ingest_and_query_are_instrumented(tmp_path, global_metrics):
+    from data_manager.data_manager import DatabaseManager
+    from embedding.hash_embedder import HashEmbedder
+    from seeker.seeker import Seeker
+    from seeker.query_cache import QueryCache
+
+    folder = tmp_path / "src"
+    folder.mkdir()
+    (folder / "cats.txt").write_text("Кошка спит на диване. Кошка ловит мышей по ночам.", encoding="utf-8")
+    (folder / "dogs.txt").write_text("Собака охраняет дом. Собака бежит по улице.", encoding="utf-8")
+    db = DatabaseManager(data_path=str(tmp_path / "data"), embedder=HashEmbedder(dim=64))
+    report = db.ingest_folder(str(folder))
+    seeker = Seeker(retriever=db.retriever, embedder=db.embedder, preprocessor=db.preprocessor, cache=QueryCache())
+    seeker.search_many(["кошка спит"], top_k=1)
+    seeker.search_many(["кошка спит"], top_k=1)
+    global_metrics.add_collector(seeker.collect_metrics)
+    try:
+        snapshot = global_metrics.snapshot()
+    finally:
+        global_metrics.remove_collector(seeker.collect_metrics)
+
+    stages = {series for series in snapshot["histograms"] if series.startswith("stage_seconds")}
+    for stage in ("prepare", "lemmatize", "encode", "index_add", "lexical_add", "save", "faiss_search", "query_encode"):
+        assert f'stage_seconds{{stage="{stage}"}}' in stages
+    assert snapshot["counters"]['documents_total{status="added"}'] == len(report.added)
+    assert snapshot["counters"]["chunks_added_total"] == report.total_chunks
+    assert snapshot["counters"]['queries_total{mode="dense"}'] == 2
+    assert snapshot["counters"]["query_cache_hits_total"] == 1
+    assert snapshot["histograms"]["chunks_per_document"]["count"] == len(report.added)
+    assert snapshot["gauges"]["chunks"] == report.total_chunks
+    assert snapshot["gauges"]['cache_hit_rate{cache="query_results"}'] == 0.5
@@ -0,0 +1,60 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from resources.registry import ResourceRegistry, registry
+from preprocess.chunker import TextPreprocessor
+from extract.text_extractor import DocumentExtractor
+
+
+# ------------------------
+# 1. Ленивое создание и переиспользование
+# ------------------------
+def test_lazy_and_shared():
+    reg = ResourceRegistry()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    assert not reg.is_loaded("thing")
+    first = reg._get(("thing",), factory)
+    second = reg._get(("thing",), factory)
+    assert first is second
+    assert len(calls) == 1
+    assert reg.is_loaded("thing")
+
+
+# ------------------------
+# 2. Подмена ресурса
+# ------------------------
+def test_set_overrides_resource():
+    reg = ResourceRegistry()
+    fake = object()
+    reg.set("embedder", fake)
+    assert reg.embedder() is fake
+
+    reg.clear()
+    assert not reg.is_loaded("embedder")
+
+
+# ------------------------
+# 3. Кеш лемм общий для препроцессоров
+# ------------------------
+def test_preprocessors_share_lemma_cache():
+    a = TextPreprocessor(use_lemmatization=False)
+    b = TextPreprocessor(use_lemmatization=True)
+    assert a._lemma_cache is b._lemma_cache is registry.lemma_cache()
+
+
+# ------------------------
+# 4. Без лемматизации и OCR тяжёлые модели не грузятся
+# ------------------------
+def test_heavy_models_not_loaded_eagerly():
+    reg_before = registry.is_loaded("morph"), registry.is_loaded("ocr_reader")
+    pre = TextPreprocessor(use_lemmatization=False)
+    DocumentExtractor()
+    assert pre.process("Первое предложение. Второе предложение.") == ["первое предложение. второе предложение."]
+    assert (registry.is_loaded("morph"), registry.is_loaded("ocr_reader")) == reg_before
@@ -0,0 +1,178 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from retrieval.retriever import VectorRetriever
+from retrieval.index_factory import IndexSpec
+from conftest import DIM, make_chunks, random_vectors
+
+
+
+
+# ------------------------
+# 1. Каждый тип индекса находит сам себя
+# ------------------------
+@pytest.mark.parametrize("kind", IndexSpec.KINDS)
+def test_index_kinds_find_self(kind):
+    spec = IndexSpec(kind, nlist=8, pq_m=8, pq_bits=4, train_size=600)
+    retriever = VectorRetriever(dim=DIM, spec=spec)
+    vectors = random_vectors(1000)
+    retriever.add_embeddings(vectors, make_chunks(1000))
+    assert retriever.index.is_trained and retriever.index.ntotal == 1000
+
+    results = retriever.search_batch(vectors[:20], top_k=5, nprobe=8, ef_search=64)
+    hits = sum(row[0]["chunk_id"] == i for i, row in enumerate(results))
+    assert hits >= 15
+
+
+# ------------------------
+# 2. Эмбеддинги копятся до обучения
+# ------------------------
+def test_training_waits_for_sample(tmp_path):
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec("ivf_flat", nlist=4, train_size=200))
+    retriever.add_embeddings(random_vectors(150), make_chunks(150))
+    assert not retriever.index.is_trained
+    # до обучения поиск идёт по накопленным эмбеддингам
+    assert len(retriever.search(random_vectors(1)[0], top_k=3)) == 3
+
+    retriever.add_embeddings(random_vectors(100, seed=1), make_chunks(100))
+    assert retriever.index.is_trained and retriever.index.ntotal == 250
+
+    # сохранение обучает индекс на том, что есть
+    small = VectorRetriever(dim=DIM, spec=IndexSpec("ivf_flat", nlist=4, train_size=200))
+    small.add_embeddings(random_vectors(50), make_chunks(50))
+    small.save(str(tmp_path / "a.index"), str(tmp_path / "chunks"))
+    loaded = VectorRetriever.load(str(tmp_path / "a.index"), str(tmp_path / "chunks"))
+    assert loaded.index.ntotal == 50 == len(loaded.collector)
+
+
+# ------------------------
+# 3. Строка фабрики FAISS
+# ------------------------
+def test_factory_string():
+    spec = IndexSpec(factory="IVF4,Flat", train_size=100)
+    assert spec.factory_string() == "IVF4,Flat"
+    retriever = VectorRetriever(dim=DIM, spec=spec)
+    retriever.add_embeddings(random_vectors(120), make_chunks(120))
+    assert retriever.index.ntotal == 120
+    with pytest.raises(ValueError):
+        IndexSpec("lsh")
+
+
+# ------------------------
+# 4. Удаление: IVF удаляет сразу, HNSW оставляет надгробия до перестройки
+# ------------------------
+@pytest.mark.parametrize("kind", ["flat", "ivf_flat", "hnsw"])
+def test_remove_chunks(kind, tmp_path):
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec(kind, nlist=4, train_size=100), compact_threshold=1.0)
+    vectors = random_vectors(300)
+    retriever.add_embeddings(vectors, make_chunks(300))
+    retriever.remove_chunks(range(0, 20))
+
+    results = retriever.search_batch(vectors[:20], top_k=3, nprobe=4)
+    assert all(r["chunk_id"] >= 20 for row in results for r in row)
+    assert all(len(row) == 3 for row in results)
+    if kind == "hnsw":
+        assert len(retriever.tombstones) == 20 and retriever.index.ntotal == 300
+    else:
+        assert not retriever.tombstones and retriever.index.ntotal == 280
+
+    retriever.save(str(tmp_path / "a.index"), str(tmp_path / "chunks"))
+    loaded = VectorRetriever.load(str(tmp_path / "a.index"), str(tmp_path / "chunks"))
+    assert loaded.tombstones == retriever.tombstones
+    assert loaded.search(vectors[25], top_k=1, nprobe=4)[0]["chunk_id"] == 25
+
+
+# ------------------------
+# 5. Перестройка сохраняет номера чанков и переносит добавленное во время неё
+# ------------------------
+def test_compaction_keeps_ids():
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec("hnsw"), compact_threshold=0.1)
+    vectors = random_vectors(200)
+    retriever.add_embeddings(vectors, make_chunks(200))
+    retriever.remove_chunks(range(50))
+    retriever.add_embeddings(random_vectors(10, seed=3), make_chunks(10, prefix="new"))
+    retriever.wait_for_compaction()
+
+    assert not retriever.tombstones
+    assert retriever.index.ntotal == 160
+    assert retriever.search(vectors[120], top_k=1)[0]["chunk_id"] == 120
+    assert retriever.search(random_vectors(10, seed=3)[4], top_k=1)[0]["chunk_id"] == 204
+
+
+# ------------------------
+# 6. Маленькая IVF-база сохраняется необученной, IndexSpec переживает загрузку
+# ------------------------
+def test_small_ivf_save_keeps_pending(tmp_path):
+    index_path, chunks_path = str(tmp_path / "a.index"), str(tmp_path / "chunks")
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec("ivf_flat"))
+    vectors = random_vectors(50)
+    retriever.add_embeddings(vectors, make_chunks(50))
+    # 50 векторов на 1024 центроида не обучить: индекс сохраняется как есть
+    retriever.save(index_path, chunks_path)
+    loaded = VectorRetriever.load(index_path, chunks_path)
+    assert loaded.spec == IndexSpec("ivf_flat") and loaded.pending == 50 and not loaded.index.is_trained
+    with pytest.raises(ValueError):
+        loaded.train()
+
+    spec = IndexSpec("ivf_flat", nlist=8, train_size=100)
+    small = VectorRetriever(dim=DIM, spec=spec)
+    small.add_embeddings(vectors, make_chunks(50))
+    small.save(index_path, chunks_path)
+    loaded = VectorRetriever.load(index_path, chunks_path)
+    assert loaded.spec == spec and loaded.index.is_trained and loaded.index.ntotal == 50
+
+    flat = VectorRetriever(dim=DIM, spec=IndexSpec("flat"))
+    flat.add_embeddings(vectors, make_chunks(50))
+    flat.save(index_path, chunks_path)
+    assert VectorRetriever.load(index_path, chunks_path).spec == IndexSpec("flat")
+
+
+
+# ------------------------
+# 7. Необученный IVF ищет по буферу ожидания точным перебором
+# ------------------------
+def test_untrained_ivf_searches_pending(tmp_path):
+    index_path, chunks_path = str(tmp_path / "a.index"), str(tmp_path / "chunks")
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec("ivf_flat", nlist=64))
+    vectors = random_vectors(40)
+    retriever.add_embeddings(vectors[:20], make_chunks(20))
+    retriever.add_embeddings(vectors[20:], make_chunks(20))
+    assert not retriever.index.is_trained and retriever.pending == 40
+
+    found = retriever.search_batch(vectors[[3, 25]], top_k=3)
+    assert [row[0]["chunk_id"] for row in found] == [3, 25] and all(len(row) == 3 for row in found)
+    retriever.remove_chunks([3])
+    assert 3 not in {r["chunk_id"] for r in retriever.search(vectors[3], top_k=40)}
+    assert len(retriever.search(vectors[3], top_k=100)) == 39
+    assert [r["chunk_id"] for r in retriever.search(vectors[0], top_k=5, filter={"ids": [7, 30]})] in ([7, 30], [30, 7])
+
+    retriever.save(index_path, chunks_path)
+    loaded = VectorRetriever.load(index_path, chunks_path)
+    assert loaded.search(vectors[25], top_k=1)[0]["chunk_id"] == 25
+
+
+# ------------------------
+# 8. Удаление из IVF не запускает дозапросы: короткую строку даёт малый nprobe, а не надгробия
+# ------------------------
+def test_ivf_deletion_does_not_refetch():
+    from resources.metrics import metrics
+
+    retriever = VectorRetriever(dim=DIM, spec=IndexSpec("ivf_flat", nlist=64, train_size=4000))
+    vectors = random_vectors(4000)
+    retriever.add_embeddings(vectors, make_chunks(4000))
+    before = retriever.search_batch(vectors[:5], top_k=100, nprobe=1)
+    assert any(len(row) < 100 for row in before)
+    retriever.remove_chunks([4])
+
+    was_enabled = metrics.enabled
+    metrics.reset()
+    metrics.enable()
+    try:
+        after = retriever.search_batch(vectors[:5], top_k=100, nprobe=1)
+        assert "faiss_refetch_total" not in metrics.snapshot()["counters"]
+    finally:
+        metrics.enable(was_enabled)
+        metrics.reset()
+    assert [[r["chunk_id"] for r in row] for row in after] == [[r["chunk_id"] for r in row if r["chunk_id"] != 4] for row in before]
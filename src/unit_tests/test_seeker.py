@@ -0,0 +1,232 @@
+import sys
+import os
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+import pytest
+from retrieval.retriever import VectorRetriever, Chunk
+from preprocess.chunker import TextPreprocessor
+from seeker.seeker import Seeker
+from seeker.query_cache import QueryCache
+
+DIM = 16
+
+
+class CountingEmbedder:
+    """Детерминированный эмбеддер без модели: вектор зависит только от текста."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(DIM) for t in texts
+        ]).astype("float32") if texts else np.zeros((0, DIM), dtype="float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+
+TEXTS = ["кошка спит на диване", "собака бежит по улице", "птица поет на ветке", "рыба плавает в пруду"]
+
+
+def make_seeker(cache=None):
+    embedder = CountingEmbedder()
+    retriever = VectorRetriever(dim=DIM)
+    retriever.add_embeddings(embedder.encode(TEXTS), [Chunk(text=t, file_path=f"{i}.txt") for i, t in enumerate(TEXTS)])
+    embedder.calls = 0
+    preprocessor = TextPreprocessor(use_lemmatization=False)
+    return Seeker(retriever=retriever, embedder=embedder, preprocessor=preprocessor, cache=cache), embedder
+
+
+# ------------------------
+# 1. Без кеша каждый запрос кодируется
+# ------------------------
+def test_without_cache_encodes_every_time():
+    seeker, embedder = make_seeker()
+    seeker.get_raw_answer("кошка спит на диване", 2)
+    seeker.get_raw_answer("кошка спит на диване", 2)
+    assert embedder.calls == 2
+    assert seeker.cache_stats() == {}
+
+
+# ------------------------
+# 2. Повторный запрос берётся из кеша
+# ------------------------
+def test_repeat_query_hits_cache():
+    seeker, embedder = make_seeker(QueryCache(maxsize=10))
+    first = seeker.get_raw_answer("Кошка спит на диване", 2)
+    second = seeker.get_raw_answer("кошка   спит на диване", 2)
+    assert first == second
+    assert embedder.calls == 1
+    assert seeker.cache_stats()["results"]["hits"] == 1
+
+
+# ------------------------
+# 3. Изменение индекса сбрасывает результаты, но не эмбеддинги
+# ------------------------
+def test_index_change_invalidates_results():
+    seeker, embedder = make_seeker(QueryCache(maxsize=10))
+    seeker.get_raw_answer("кошка спит на диване", 2)
+
+    seeker.retriever.add_embeddings(embedder.encode(["кошка спит на диване"]), [Chunk(text="дубль", file_path="new.txt")])
+    embedder.calls = 0
+
+    text, paths, _ = seeker.get_raw_answer("кошка спит на диване", 2)
+    assert embedder.calls == 0
+    assert "new.txt" in paths
+    assert seeker.cache_stats()["embeddings"]["hits"] == 1
+
+
+# ------------------------
+# 4. Пакетный поиск совпадает с поиском по одному запросу
+# ------------------------
+def test_search_many_matches_single_queries():
+    seeker, embedder = make_seeker()
+    batch = seeker.search_many(TEXTS, top_k=2)
+    assert embedder.calls == 1
+    assert len(batch) == len(TEXTS)
+    for i, (query, results) in enumerate(zip(TEXTS, batch)):
+        assert results[0]["chunk_id"] == i
+        assert [r["chunk_id"] for r in results] == [r["chunk_id"] for r in seeker.retriever.search(embedder.encode([query]), top_k=2)]
+
+
+# ------------------------
+# 5. Пакетный поиск использует кеш
+# ------------------------
+def test_search_many_uses_cache():
+    seeker, embedder = make_seeker(QueryCache(maxsize=10))
+    seeker.search_many(TEXTS[:2], top_k=2)
+    embedder.calls = 0
+    batch = seeker.search_many(TEXTS[:3], top_k=2)
+    assert embedder.calls == 1
+    assert batch[2][0]["file_path"] == "2.txt"
+
+
+QUERY = "Кошка спит на диване. Рыба плавает в пруду."
+
+
+def make_seeker_with_sentences():
+    """Индекс, в котором каждое предложение QUERY совпадает со своим чанком."""
+    seeker, embedder = make_seeker()
+    sentences = seeker.preprocessor.process_querry(QUERY)
+    seeker.retriever.add_embeddings(embedder.encode(sentences), [Chunk(text=s, file_path=p) for s, p in zip(sentences, ["a.txt", "b.txt"])])
+    embedder.calls = 0
+    return seeker, embedder
+
+
+# ------------------------
+# 6. Запрос из нескольких предложений использует все предложения
+# ------------------------
+@pytest.mark.parametrize("fusion", ["max", "rrf"])
+def test_multi_sentence_query_uses_every_sentence(fusion):
+    seeker, embedder = make_seeker_with_sentences()
+    seeker.fusion = fusion
+    results = seeker.search_many([QUERY], top_k=2)[0]
+    assert embedder.calls == 1
+    assert {r["file_path"] for r in results} == {"a.txt", "b.txt"}
+    assert len({r["chunk_id"] for r in results}) == len(results)
+
+
+def test_mean_fusion_single_search():
+    seeker, embedder = make_seeker_with_sentences()
+    results = seeker.search_many([QUERY], top_k=4)[0]
+    assert embedder.calls == 1
+    assert {r["file_path"] for r in results[:2]} == {"a.txt", "b.txt"}
+
+
+def test_unknown_fusion_rejected():
+    with pytest.raises(ValueError):
+        Seeker(retriever=VectorRetriever(dim=DIM), embedder=CountingEmbedder(), preprocessor=TextPreprocessor(use_lemmatization=False), fusion="sum")
+
+
+# ------------------------
+# Ссылки и контекст без повторного разбора документа
+# ------------------------
+def test_citations_and_context():
+    seeker, _ = make_seeker()
+    citations = seeker.get_citations("кошка спит на диване", top_k=1)
+    assert citations[0]["file_path"] == "0.txt" and citations[0]["chunk_id"] == 0
+    assert {"page", "section", "char_start", "char_end", "title", "authors"} <= set(citations[0])
+    # соседние чанки — из других файлов, поэтому контекст состоит из одного чанка
+    assert [c["chunk_id"] for c in seeker.get_context(0, window=2)] == [0]
+
+
+def make_hybrid_seeker(mode):
+    from retrieval.lexical import LexicalIndex
+
+    seeker, embedder = make_seeker()
+    lexical = LexicalIndex()
+    lexical.add(0, [seeker.preprocessor.process_querry(text)[0] for text in TEXTS])
+    return Seeker(retriever=seeker.retriever, embedder=embedder, preprocessor=seeker.preprocessor, lexical=lexical, mode=mode), embedder
+
+
+# ------------------------
+# Лексический режим не вызывает модель, гибридный сливает обе выдачи
+# ------------------------
+def test_lexical_mode_skips_encoder():
+    seeker, embedder = make_hybrid_seeker("lexical")
+    results = seeker.search_many(["Где плавает рыба?"], top_k=2)[0]
+    assert embedder.calls == 0
+    assert results[0]["file_path"] == "3.txt" and results[0]["distance"] is None and results[0]["bm25"] > 0
+
+
+def test_hybrid_mode_fuses_dense_and_lexical():
+    seeker, embedder = make_hybrid_seeker("hybrid")
+    # плотный поиск по случайному вектору слова не находит, лексический — находит
+    results = seeker.search_many(["ветке"], top_k=len(TEXTS))[0]
+    assert embedder.calls == 1
+    assert results[0]["file_path"] == "2.txt"
+    assert results[0]["bm25"] > 0 and results[0]["distance"] is not None
+    assert len({r["chunk_id"] for r in results}) == len(results)
+    assert all("score" in r for r in results)
+
+
+def test_lexical_mode_requires_index():
+    with pytest.raises(ValueError):
+        Seeker(retriever=VectorRetriever(dim=DIM), embedder=CountingEmbedder(), preprocessor=TextPreprocessor(use_lemmatization=False), mode="lexical")
+
+
+# ------------------------
+# Фильтр по метаданным во всех режимах и в ключе кеша
+# ------------------------
+@pytest.mark.parametrize("mode", ["dense", "lexical", "hybrid"])
+def test_filter_restricts_results(mode):
+    seeker, _ = make_hybrid_seeker(mode) if mode != "dense" else make_seeker()
+    seeker.retriever.tag([1, 3], "вода_и_улица")
+    results = seeker.search_many(["Где плавает рыба?", "ветке"], top_k=4, filter={"tags": "вода_и_улица"})
+    assert all(r["file_path"] in ("1.txt", "3.txt") for row in results for r in row)
+    if mode != "dense":
+        assert results[0][0]["file_path"] == "3.txt"
+    only = seeker.search_many(["Где плавает рыба?"], top_k=4, filter={"file_path": "0.txt"})[0]
+    assert [r["file_path"] for r in only] == ([] if mode == "lexical" else ["0.txt"])
+
+
+def test_filter_is_part_of_cache_key():
+    seeker, embedder = make_seeker(cache=QueryCache())
+    unfiltered = seeker.search_many(["кошка спит на диване"], top_k=4)[0]
+    filtered = seeker.search_many(["кошка спит на диване"], top_k=4, filter={"file_path": ["1.txt", "2.txt"]})[0]
+    assert len(unfiltered) == 4 and len(filtered) == 2
+    assert embedder.calls == 1
+
+
+def test_manifest_filters(tmp_path):
+    from data_manager.manifest import DocumentManifest
+
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    for i in range(len(TEXTS)):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(TEXTS[i], encoding="utf-8")
+        manifest.record(str(path), f"hash{i}", str(path), [i], "model").added_at = 1000.0 * (i + 1)
+    seeker, _ = make_seeker(cache=QueryCache())
+    with pytest.raises(ValueError):
+        seeker.search_many(["кошка"], top_k=4, filter={"added": (None, 2500)})
+
+    seeker.manifest = manifest
+    by_time = seeker.search_many(["кошка"], top_k=4, filter={"added": (None, 2500)})[0]
+    assert {r["chunk_id"] for r in by_time} == {0, 1}
+    by_document = seeker.search_many(["кошка"], top_k=4, filter={"documents": [str(tmp_path / "3.txt")], "added": (2000, None)})[0]
+    assert [r["chunk_id"] for r in by_document] == [3]
+    # явный None — без ограничения
+    assert len(seeker.search_many(["кошка"], top_k=4, filter={"added": None})[0]) == 4
+    assert len(seeker.search_many(["кошка"], top_k=4, filter={"documents": None, "added": None, "ids": [1, 2]})[0]) == 2
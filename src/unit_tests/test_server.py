@@ -0,0 +1,151 @@
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import numpy as np
+import pytest
+from server.batcher import MicroBatcher
+
+
+class FakeSeeker:
+    """Запоминает батчи; результат — по top_k словарей с текстом запроса."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = []
+        self.filters = []
+        self.delay = delay
+        self.fail = fail
+        self.retriever = type("R", (), {"collector": [], "version": 0})()
+
+    def search_many(self, queries, top_k=5, filter=None):
+        self.calls.append((list(queries), top_k))
+        self.filters.append(filter)
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError("boom")
+        return [[{"text": q, "rank": r, "distance": np.float32(r)} for r in range(top_k)] for q in queries]
+
+    def cache_stats(self):
+        return {}
+
+
+# ------------------------
+# 1. Одновременные запросы уходят одним батчем
+# ------------------------
+def test_concurrent_requests_are_batched():
+    seeker = FakeSeeker()
+
+    async def scenario():
+        batcher = MicroBatcher(seeker.search_many, max_batch=16, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(f"q{i}", top_k=1 + i % 3) for i in range(10)))
+        await batcher.close()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert seeker.calls == [([f"q{i}" for i in range(10)], 3)]
+    assert [len(r) for r in results] == [1 + i % 3 for i in range(10)]
+    assert all(r[0]["text"] == f"q{i}" for i, r in enumerate(results))
+    assert stats["batches"] == 1 and stats["largest_batch"] == 10
+
+
+# ------------------------
+# 2. Ограничение размера батча и ошибки поиска
+# ------------------------
+def test_batch_limit_and_errors():
+    seeker = FakeSeeker()
+
+    async def scenario():
+        batcher = MicroBatcher(seeker.search_many, max_batch=4, max_wait_ms=50)
+        await asyncio.gather(*(batcher.submit(f"q{i}") for i in range(10)))
+        seeker.fail = True
+        with pytest.raises(ValueError):
+            await batcher.submit("bad")
+        await batcher.close()
+        return batcher.stats()
+
+    stats = asyncio.run(scenario())
+    assert [len(queries) for queries, _ in seeker.calls] == [4, 4, 2, 1]
+    assert stats["errors"] == 1
+
+
+# ------------------------
+# 3. HTTP-эндпоинты
+# ------------------------
+def test_app_endpoints():
+    testclient = pytest.importorskip("fastapi.testclient")
+    from server.app import create_app
+
+    from resources.metrics import metrics
+
+    seeker = FakeSeeker()
+    was_enabled = metrics.enabled
+    with testclient.TestClient(create_app(lambda: seeker, max_wait_ms=1)) as client:
+        assert metrics.enabled
+        assert client.get("/health").json()["status"] == "ok"
+        response = client.post("/search", json={"query": "кошка", "top_k": 2})
+        assert response.status_code == 200
+        assert [r["distance"] for r in response.json()["results"]] == [0.0, 1.0]
+        assert client.post("/search", json={"query": "x", "top_k": 0}).status_code == 422
+        assert client.get("/metrics").json()["batcher"]["requests"] == 1
+        prometheus = client.get("/metrics", params={"format": "prometheus"})
+        assert prometheus.headers["content-type"].startswith("text/plain")
+        assert "text2sci_batcher_requests 1" in prometheus.text
+    # после остановки общий реестр снова в прежнем состоянии
+    assert metrics.enabled == was_enabled
+
+
+# ------------------------
+# 4. Запросы с разными фильтрами ищутся разными вызовами
+# ------------------------
+def test_filters_split_batches():
+    seeker = FakeSeeker()
+
+    async def scenario():
+        batcher = MicroBatcher(seeker.search_many, max_batch=16, max_wait_ms=50)
+        filters = [None, {"tags": "a"}, {"tags": ["a"]}, {"file_path": "x.txt"}, None]
+        results = await asyncio.gather(*(batcher.submit(f"q{i}", 2, flt) for i, flt in enumerate(filters)))
+        await batcher.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert sorted(seeker.calls) == [(["q0", "q4"], 2), (["q1", "q2"], 2), (["q3"], 2)]
+    assert {None, ("tags",), ("file_path",)} == {tuple(f) if f else None for f in seeker.filters}
+    assert [r[0]["text"] for r in results] == [f"q{i}" for i in range(5)]
+
+
+# ------------------------
+# 5. Фильтры по манифесту (documents, added) доступны через /search
+# ------------------------
+def test_search_manifest_filters(tmp_path):
+    testclient = pytest.importorskip("fastapi.testclient")
+    from server.app import create_app
+    from data_manager.manifest import DocumentManifest
+    from preprocess.chunker import TextPreprocessor
+    from retrieval.retriever import VectorRetriever, Chunk
+    from seeker.seeker import Seeker
+
+    class Embedder:
+        def encode(self, texts):
+            return np.ones((len(texts), 8), dtype="float32")
+
+    retriever = VectorRetriever(dim=8)
+    retriever.add_embeddings(np.eye(8, dtype="float32")[:6], [Chunk(text=f"t{i}", file_path=f"{i // 2}.txt") for i in range(6)])
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    for doc in range(3):
+        path = tmp_path / f"{doc}.txt"
+        path.write_text("x", encoding="utf-8")
+        manifest.record(str(path), f"hash{doc}", str(path), [2 * doc, 2 * doc + 1], "model").added_at = 100.0 * doc
+    seeker = Seeker(retriever=retriever, embedder=Embedder(), preprocessor=TextPreprocessor(use_lemmatization=False), manifest=manifest)
+
+    with testclient.TestClient(create_app(lambda: seeker, max_wait_ms=1)) as client:
+        response = client.post("/search", json={"query": "q", "top_k": 6, "filter": {"documents": str(tmp_path / "1.txt")}})
+        assert response.status_code == 200
+        assert sorted(r["chunk_id"] for r in response.json()["results"]) == [2, 3]
+        response = client.post("/search", json={"query": "q", "top_k": 6, "filter": {"added": [150, None]}})
+        assert sorted(r["chunk_id"] for r in response.json()["results"]) == [4, 5]
+        response = client.post("/search", json={"query": "q", "top_k": 6, "filter": {"documents": None}})
+        assert response.status_code == 200 and len(response.json()["results"]) == 6
+        assert client.post("/search", json={"query": "q", "filter": {"added": None}}).status_code == 200
+        assert client.post("/search", json={"query": "q", "filter": {"year": 2020}}).status_code == 400
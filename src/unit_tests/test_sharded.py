@@ -0,0 +1,87 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from retrieval.retriever import VectorRetriever
+from retrieval.sharded import ShardedRetriever, load_retriever
+from conftest import DIM, make_chunks, random_vectors
+
+
+def build(vectors, chunks, shards=3):
+    retriever = ShardedRetriever(dim=DIM, shards=shards)
+    for start in range(0, len(vectors), 100):
+        retriever.add_embeddings(vectors[start:start + 100], chunks[start:start + 100])
+    return retriever
+
+
+# ------------------------
+# 1. Глобальные номера и выдача совпадают с одним индексом
+# ------------------------
+def test_sharded_matches_single_index():
+    vectors, chunks = random_vectors(500), make_chunks(500, docs=10)
+    sharded = build(vectors, chunks)
+    single = VectorRetriever(dim=DIM)
+    single.add_embeddings(vectors, chunks)
+
+    assert len(sharded.collector) == 500 == sharded.ntotal
+    assert all(len(shard.collector) for shard in sharded.shards)
+    # чанки одного документа лежат в одном шарде
+    paths = [{c.file_path for c in shard.collector} for shard in sharded.shards]
+    assert sum(len(p) for p in paths) == len(set().union(*paths)) == 10
+    assert sharded.collector[137].text == "chunk 137"
+
+    queries = random_vectors(20, seed=1)
+    for got, expected in zip(sharded.search_batch(queries, top_k=5, ef_search=128), single.search_batch(queries, top_k=5, ef_search=128)):
+        assert [r["chunk_id"] for r in got] == [r["chunk_id"] for r in expected]
+        assert got[0]["text"] == f"chunk {got[0]['chunk_id']}"
+
+
+# ------------------------
+# 2. Удаление, сохранение и загрузка по шардам
+# ------------------------
+def test_sharded_remove_save_load(tmp_path):
+    vectors, chunks = random_vectors(300), make_chunks(300, docs=10)
+    sharded = build(vectors, chunks)
+    sharded.remove_chunks([5, 6, 7])
+    assert sharded.collector.deleted == {5, 6, 7}
+    assert sharded.search(vectors[5], top_k=1)[0]["chunk_id"] != 5
+
+    index_path, collector_path = str(tmp_path / "a.index"), str(tmp_path / "chunks")
+    sharded.save(index_path, collector_path)
+    assert os.path.exists(index_path + ".2") and os.path.isdir(collector_path + ".2")
+
+    loaded = load_retriever(index_path, collector_path)
+    assert isinstance(loaded, ShardedRetriever)
+    assert loaded.collector.deleted == {5, 6, 7}
+    assert loaded.search(vectors[42], top_k=1)[0]["chunk_id"] == 42
+    loaded.add_embeddings(random_vectors(10, seed=2), make_chunks(10, docs=10))
+    assert loaded.search(random_vectors(10, seed=2)[3], top_k=1)[0]["chunk_id"] == 303
+
+
+# ------------------------
+# 3. Упавший шард не оставляет маршрутов в пустоту
+# ------------------------
+def test_failed_shard_add_keeps_routes_consistent():
+    vectors, chunks = random_vectors(200), make_chunks(200, docs=10)
+    sharded = build(vectors[:100], chunks[:100])
+    broken = sharded.shards[1]
+
+    def fail(*args):
+        raise RuntimeError("boom")
+
+    broken.add_embeddings, add = fail, broken.add_embeddings
+    with pytest.raises(RuntimeError):
+        sharded.add_embeddings(vectors[100:], chunks[100:])
+    broken.add_embeddings = add
+
+    # номера получили только чанки, принятые другими шардами, и они удалены
+    assert len(sharded.collector) == sum(len(shard.collector) for shard in sharded.shards)
+    new_ids = set(range(100, len(sharded.collector)))
+    assert new_ids and sharded.collector.deleted == new_ids
+    results = sharded.search_batch(vectors[100:110], top_k=3)
+    assert all(r["chunk_id"] < 100 for row in results for r in row)
+
+    start = len(sharded.collector)
+    sharded.add_embeddings(vectors[100:], chunks[100:])
+    assert sharded.search(vectors[150], top_k=1)[0]["chunk_id"] == start + 50
@@ -170,3 +170,59 @@ def test_only_picture_file(ext):
     print(f"Совпадение {ext.upper()} с расшифровкой: {sim:.2f}%")
 
     assert sim >= 80, f"Текст из {ext} сильно отличается от расшифровки ({sim:.2f}%)"
+
+
+# ------------------------
+# 9. OCR страниц без текстового слоя
+# ------------------------
+class FakeReader:
+    def __init__(self):
+        self.calls = 0
+
+    def readtext(self, image, detail=0, paragraph=True):
+        self.calls += 1
+        return [f"распознанная страница {self.calls}"]
+
+
+def make_scanned_pdf(path, scanned_pages=1):
+    import fitz
+
+    pix = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 64, 64), False)
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Regular page with a text layer.")
+    for i in range(scanned_pages):
+        pix.clear_with(100 + i)
+        doc.new_page().insert_image(fitz.Rect(72, 72, 300, 300), stream=pix.tobytes("png"))
+    doc.save(path)
+
+
+def test_pdf_ocr_fallback(tmp_path):
+    from extract.ocr import PageOCR
+
+    path = str(tmp_path / "scan.pdf")
+    make_scanned_pdf(path, scanned_pages=3)
+    reader = FakeReader()
+    ocr = PageOCR(dpi=50, cache_dir=str(tmp_path / "ocr"), reader_factory=lambda: reader)
+
+    text = DocumentExtractor(ocr=ocr).extract(path)
+    assert text.splitlines()[0].startswith("Regular page")
+    assert "распознанная страница 3" in text and reader.calls == 3
+
+    # повторное извлечение берёт страницы из кеша
+    assert DocumentExtractor(ocr=ocr).extract(path) == text and reader.calls == 3
+
+    assert "распознанная" not in DocumentExtractor(ocr=ocr, use_ocr=False).extract(path)
+
+
+def test_pdf_ocr_limits(tmp_path):
+    from extract.ocr import PageOCR
+
+    path = str(tmp_path / "scan.pdf")
+    make_scanned_pdf(path, scanned_pages=3)
+    reader = FakeReader()
+    DocumentExtractor(ocr=PageOCR(dpi=50, max_pages=2, reader_factory=lambda: reader)).extract(path)
+    assert reader.calls == 2
+
+    reader = FakeReader()
+    text = DocumentExtractor(ocr=PageOCR(dpi=50, time_budget=0, reader_factory=lambda: reader)).extract(path)
+    assert reader.calls == 0 and text.startswith("Regular page")